@@ -1,95 +1,1128 @@
 #!/usr/bin/env python3
 import argparse
+import copy
 import glob
 import os
+import random
+import sqlite3
+import sys
+import time
+
+# `plan` only reads manifests and file headers: answer it before the stage
+# imports below pull in librosa, Basic Pitch and the separation models
+if __name__ == "__main__" and sys.argv[1:2] == ["plan"]:
+    from utils.batch_plan import main as _plan_main
+    raise SystemExit(_plan_main(sys.argv[2:]))
+
+import numpy as np
 from tqdm import tqdm
 
-from steps.separate import separate_track
-from steps.beats_meter import estimate_tempo_downbeats_meter
+from steps.ingest import check_duplicates, link_duplicate_outputs
+from steps.separate import separate_track, ensure_stems
+from steps.user_stems import (
+    find_user_stems,
+    use_user_stems,
+    batch_songs,
+    song_path,
+    source_audio as user_stems_source,
+    source_signature as user_stems_signature,
+)
+from steps.beats_meter import estimate_tempo_downbeats_meter, meter_info_from_manifest
 from steps.transcribe_melodic import transcribe_pitched_tracks
 from steps.transcribe_drums import transcribe_drums_to_midi
 from steps.assign_parts import assign_seven_classes
-from steps.key_normalize import detect_and_normalize_key
+from steps.key_normalize import detect_and_normalize_key, detect_key
 from steps.meter_apply import insert_time_signatures
 from steps.clean_quantize import gentle_cleanup
 from steps.write_midi import assemble_and_write_midi
-from steps.qc_render import review_pending_items
-from utils.manifest import load_config, read_manifest, write_manifest, song_id_from_path
+from steps import qc_render
+from utils.manifest import (
+    load_config,
+    read_manifest,
+    write_manifest,
+    song_id_from_path,
+    configure_corpus_index,
+    merge_config,
+    timed,
+)
+from utils import corpus_index
+from utils.lease_queue import LeaseQueue
+from utils.watch_queue import WatchQueue, make_waiter
+from utils.supervise import StageFailed, run_stage_supervised
+from utils.midi_utils import load_drum_track
+from utils.note_store import note_store_path, save_notes, load_notes, notes_from_midi
+from utils import corpus_stats
+from utils import decode_cache
+from utils import shm_transport
+from utils import batch_plan
+
+# spawned stage children re-import this module in the caller's working directory,
+# which may be an evaluate workspace without a config.yaml of its own
+CFG = load_config("config.yaml" if os.path.exists("config.yaml")
+                  else os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+
+INDEX_CFG = CFG.get("corpus_index") or {}
+if INDEX_CFG.get("enabled", True):
+    configure_corpus_index(INDEX_CFG.get("path", "data/index/corpus.sqlite"))
+
+decode_cache.configure(CFG.get("decode_cache"))
+
+
+def _audio_duration(audio_path: str, manifest: dict) -> float:
+    d = (manifest.get("ingest") or {}).get("duration")
+    if d:
+        return float(d)
+    try:
+        import soundfile as sf
+        return float(sf.info(audio_path).duration)
+    except Exception:
+        return 0.0
 
-CFG = load_config("config.yaml")
 
+def _run_stage(stage: str, fn, args, manifest: dict, manifest_path: str, duration_s: float, cfg: dict = None):
+    """
+    Call a heavy stage fn(*args) (manifest is args[-1]). With `isolation.enabled`
+    it runs in a supervised child with a duration-scaled timeout and retries;
+    a final failure is written to the manifest before StageFailed propagates.
+    """
+    icfg = (CFG if cfg is None else cfg).get("isolation") or {}
+    if not icfg.get("enabled", False):
+        return fn(*args)
+    try:
+        return run_stage_supervised(stage, fn, args, manifest, icfg, duration_s)
+    except StageFailed:
+        write_manifest(manifest_path, manifest)
+        raise
 
-def process_one(audio_path: str, normalize_key: bool = False):
+
+def process_one(audio_path: str, normalize_key: bool = False, profile: str = "full", queue_full=None,
+                cfg: dict = None):
+    """
+    Run the whole pipeline on one song. `cfg` replaces the module config for
+    this run (stages get it explicitly; evaluate passes its presets this way).
+    """
+    if profile == "preview":
+        return process_preview(audio_path, normalize_key=normalize_key, queue_full=queue_full, cfg=cfg)
+    if profile != "full":
+        raise ValueError(f"unknown profile {profile!r} (expected 'full' or 'preview')")
+
+    cfg = CFG if cfg is None else cfg
+    audio_path = song_path(audio_path)
+    user_stems = find_user_stems(audio_path, cfg)
     sid = song_id_from_path(audio_path)
     os.makedirs(f"data/midi/{sid}", exist_ok=True)
     manifest_path = f"manifests/{sid}.json"
     manifest = read_manifest(manifest_path)
     manifest.setdefault("song_id", sid)
-    manifest.setdefault("source_audio", audio_path)
+    if user_stems:
+        # the supplied mix (or the sum of the stems) stands in for the source
+        source = user_stems_source(user_stems, cfg)
+        manifest["source_audio"] = source
+        manifest["source_signature"] = user_stems_signature(user_stems)
+    else:
+        source = audio_path
+        manifest.setdefault("source_audio", audio_path)
+        st = os.stat(audio_path)
+        manifest["source_signature"] = [st.st_size, int(st.st_mtime)]
+    out_mid = f"data/midi/{sid}/{sid}.mid"
+    # notes stored before this (see _store_notes) belong to an earlier run
+    manifest["run_started_at"] = time.time()
+
+    # 0) content dedup: re-sends of finished songs are linked, not recomputed
+    with timed(manifest, "ingest"):
+        dup_of = check_duplicates(source, sid, cfg, manifest)
+    write_manifest(manifest_path, manifest)
+    if dup_of:
+        linked = link_duplicate_outputs(dup_of, out_mid, manifest, normalize_key)
+        write_manifest(manifest_path, manifest)
+        if linked or _finish_duplicate(dup_of, out_mid, manifest, manifest_path, normalize_key, cfg):
+            return out_mid, manifest_path
 
-    # 1) separation
-    stems = separate_track(audio_path, CFG, manifest)
+    duration_s = _audio_duration(source, manifest)
+
+    # with isolation, stages 1-3 share decoded stems across processes
+    # (utils/shm_transport.py); the scope is removed when they finish
+    with shm_transport.stage_scope(sid, cfg):
+        # 1) separation
+        with timed(manifest, "separation"):
+            if user_stems:
+                stems = use_user_stems(user_stems, cfg, manifest)
+            else:
+                stems = _run_stage(
+                    "separation", separate_track, (audio_path, cfg, manifest),
+                    manifest, manifest_path, duration_s, cfg,
+                )
+        write_manifest(manifest_path, manifest)
+
+        # 2) tempo/downbeats/meter
+        with timed(manifest, "beats_meter"):
+            meter_info = _run_stage(
+                "beats_meter", estimate_tempo_downbeats_meter, (stems, cfg, manifest),
+                manifest, manifest_path, duration_s, cfg,
+            )
+        write_manifest(manifest_path, manifest)
+
+        # 3) transcription
+        with timed(manifest, "transcribe_pitched"):
+            pitched = _run_stage(
+                "transcribe_pitched", transcribe_pitched_tracks, (stems, cfg, manifest),
+                manifest, manifest_path, duration_s, cfg,
+            )
+        with timed(manifest, "transcribe_drums"):
+            drums = _run_stage(
+                "transcribe_drums", transcribe_drums_to_midi, (stems.get("drums"), cfg, manifest),
+                manifest, manifest_path, duration_s, cfg,
+            )
+    _store_notes(pitched, drums, manifest, cfg=cfg)
     write_manifest(manifest_path, manifest)
 
-    # 2) tempo/downbeats/meter
-    meter_info = estimate_tempo_downbeats_meter(stems, CFG, manifest)
+    # 4-8) symbolic stages
+    with timed(manifest, "symbolic"):
+        finish_song(pitched, drums, stems, meter_info, out_mid, manifest, manifest_path, normalize_key, cfg)
+    _retire_preview(manifest, out_mid)
+    write_manifest(manifest_path, manifest)
+    return out_mid, manifest_path
+
+
+def _preview_config(pcfg: dict, base: dict) -> dict:
+    """
+    `base` with the preview profile's cheaper settings applied.
+    """
+    cfg = merge_config(base, {
+        "sample_rate": int(pcfg.get("sr", 22050)),
+        "meter_key": {"beat_window_s": pcfg.get("beat_window_s")},
+    })
+    model = pcfg.get("separation", "none")
+    if model and model != "none":
+        cfg = merge_config(cfg, {"separation": {"demucs_model": model, "shifts": 0}})
+    return merge_config(cfg, pcfg.get("overrides") or {})
+
+
+def _queue_full_run(audio_path: str, sid: str, normalize_key: bool):
+    """
+    Start the full-quality run in a detached `worker` process. It claims the
+    song through the lease queue, so it never overlaps a worker/watcher that
+    already has it.
+    """
+    import subprocess
+    import sys
+
+    log_dir = (CFG.get("preview") or {}).get("log_dir", "data/logs")
+    os.makedirs(log_dir, exist_ok=True)
+    cmd = [sys.executable, os.path.abspath(__file__), "worker", glob.escape(audio_path)]
+    if normalize_key:
+        cmd.append("--normalize-key")
+    with open(os.path.join(log_dir, f"{sid}.full.log"), "ab") as log:
+        proc = subprocess.Popen(
+            cmd, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, start_new_session=True
+        )
+    return proc.pid
+
+
+def process_preview(audio_path: str, normalize_key: bool = False, queue_full=None, cfg: dict = None):
+    """
+    Draft MIDI in seconds: the mix is decoded once at a low rate and stays in
+    memory; separation is skipped (each class is transcribed from the mix) or
+    done by a lighter model; beats are tracked over a bounded window; only the
+    classes in preview.stems are transcribed. Writes data/midi/<sid>/<sid>.preview.mid
+    and manifest["preview"]; the full run later replaces it. `cfg` replaces
+    the module config, as in process_one; the queued full run is a separate
+    `worker` process and reads config.yaml.
+    """
+    from pipeline_api import run_in_memory
+    from steps.separate import separate_in_memory
+    from utils.audio_utils import AudioArray, load_audio_mono
+
+    base = CFG if cfg is None else cfg
+    pcfg = base.get("preview") or {}
+    if queue_full is None:
+        queue_full = bool(pcfg.get("queue_full", False))
+    cfg = _preview_config(pcfg, base)
+
+    audio_path = song_path(audio_path)
+    sid = song_id_from_path(audio_path)
+    os.makedirs(f"data/midi/{sid}", exist_ok=True)
+    manifest_path = f"manifests/{sid}.json"
+    draft_mid = f"data/midi/{sid}/{sid}.preview.mid"
+    user_stems = find_user_stems(audio_path, base)
+    t0 = time.perf_counter()
+
+    sr = int(pcfg.get("sr", 22050))
+    y, sr = load_audio_mono(user_stems_source(user_stems, base) if user_stems else audio_path, sr=sr)
+    mix = AudioArray(y, sr, name="mix")
+    wanted = list(pcfg.get("stems") or ["other", "drums"])
+    model = pcfg.get("separation", "none")
+    if user_stems:
+        # the session's own stems: each role summed in memory at the preview rate
+        model = "user"
+        stems = {}
+        for k in wanted:
+            ys = [load_audio_mono(p, sr=sr)[0] for p in user_stems["inputs"].get(k) or []]
+            if not ys:
+                stems[k] = None
+                continue
+            acc = np.zeros(max(len(v) for v in ys), dtype=np.float32)
+            for v in ys:
+                acc[: len(v)] += v
+            stems[k] = AudioArray(acc, sr, name=k)
+    elif model and model != "none":
+        sep = separate_in_memory(mix, cfg, {})
+        stems = {k: sep.get(k) for k in wanted}
+    else:
+        stems = {k: mix for k in wanted}
+
+    result = run_in_memory(
+        y, sr, CFG=cfg, song_id=sid, normalize_key=normalize_key,
+        stems=stems, midi_path=draft_mid,
+    )
+    pm = result["manifest"]
+    preview = {
+        "status": "draft",
+        "midi": draft_mid,
+        "created_at": time.time(),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "separation": model or "none",
+        "stems": sorted(k for k, v in stems.items() if v is not None),
+        "sr": sr,
+        "beat_window_s": pcfg.get("beat_window_s"),
+        "tempo": result["tempo_map"]["tempo"],
+        "notes": {name: int(len(arr)) for name, arr in result["notes"].items()},
+        "timings": pm.get("timings"),
+        "full_run": None,
+    }
+
+    manifest = read_manifest(manifest_path)
+    manifest.setdefault("song_id", sid)
+    manifest.setdefault("source_audio", audio_path)
+    if queue_full:
+        if base is not CFG:
+            print(f"[preview] {sid}: the queued full run uses config.yaml, not the config passed in")
+        preview["full_run"] = {"status": "queued", "pid": _queue_full_run(audio_path, sid, normalize_key)}
+    manifest["preview"] = preview
     write_manifest(manifest_path, manifest)
+    print(f"[preview] {sid}: draft in {preview['elapsed_s']:.1f}s -> {draft_mid}")
+    return draft_mid, manifest_path
+
 
-    # 3) transcription
-    pitched = transcribe_pitched_tracks(stems, CFG, manifest)
-    drums = transcribe_drums_to_midi(stems.get("drums"), CFG, manifest)
+def _finish_duplicate(orig_sid: str, out_mid: str, manifest: dict, manifest_path: str, normalize_key: bool,
+                      cfg: dict = None):
+    """
+    A duplicate whose original was written with the other key setting: steps
+    4-8 from the original's stored notes. False if it has none (full run).
+    """
+    notes_path = (read_manifest(f"manifests/{orig_sid}.json").get("notes") or {}).get("path")
+    if not notes_path or not os.path.exists(notes_path):
+        print(f"[ingest] '{orig_sid}' has no stored notes; processing in full")
+        return False
+    pitched, drums = load_notes(notes_path)
+    _store_notes(pitched, drums, manifest, source=f"duplicate:{orig_sid}", cfg=cfg)
+    write_manifest(manifest_path, manifest)
+    stems = (manifest.get("separation") or {}).get("stems") or {}
+    with timed(manifest, "symbolic"):
+        finish_song(pitched, drums, stems, meter_info_from_manifest(manifest), out_mid, manifest, manifest_path,
+                    normalize_key, cfg)
     write_manifest(manifest_path, manifest)
+    return True
 
+
+def _retire_preview(manifest: dict, out_mid: str):
+    """
+    The full run replaces the draft: drop the preview MIDI, keep the record.
+    """
+    preview = manifest.get("preview")
+    if not preview or preview.get("status") != "draft":
+        return
+    draft = preview.get("midi")
+    if draft and draft != out_mid and os.path.exists(draft):
+        os.remove(draft)
+    preview["status"] = "replaced"
+    preview["replaced_by"] = out_mid
+    preview["replaced_at"] = time.time()
+
+
+def _store_notes(pitched, drums, manifest, source="transcription", cfg: dict = None):
+    """
+    Persist the transcription output (input of steps 4-8) for `refinish`.
+    """
+    path = note_store_path(CFG if cfg is None else cfg, manifest["song_id"])
+    n = save_notes(path, pitched, drums)
+    manifest["notes"] = {"path": path, "count": n, "source": source, "at": time.time()}
+
+
+def finish_song(pitched, drums, stems, meter_info, out_mid, manifest, manifest_path, normalize_key=False,
+                cfg: dict = None):
+    """
+    Steps 4-8 (everything after transcription). Shared by process_one and the
+    commands that re-run only the symbolic stages.
+    """
+    cfg = CFG if cfg is None else cfg
     # 4) assign 7 classes
-    assigned = assign_seven_classes(pitched, drums, stems, CFG, manifest)
+    assigned = assign_seven_classes(pitched, drums, stems, cfg, manifest)
     write_manifest(manifest_path, manifest)
 
-    # 5) key normalize (optional)
+    # 5) key normalize (optional); the key is detected either way, for the review queue
     if normalize_key:
-        normalized = detect_and_normalize_key(assigned, CFG, manifest)
+        normalized = detect_and_normalize_key(assigned, cfg, manifest)
     else:
+        try:
+            detect_key(assigned, manifest)
+        except ImportError as e:
+            print(f"[key] key detection skipped: {e}")
         # mark explicitly that we skipped normalization
         key_info = manifest.setdefault("key", {})
-        key_info.setdefault("normalized", False)
-        key_info.setdefault("transpose_semitones", 0)
-        key_info.setdefault("target", None)
+        # cleared, not setdefault: this MIDI is untransposed whatever an earlier run did
+        key_info["normalized"] = False
+        key_info["transpose_semitones"] = 0
+        key_info["target"] = None
         key_info["reason"] = "key normalization disabled via CLI"
         normalized = assigned
     write_manifest(manifest_path, manifest)
 
     # 6) meter insertion (optional, based on meter_info)
-    with_meter = insert_time_signatures(normalized, meter_info, CFG, manifest)
+    with_meter = insert_time_signatures(normalized, meter_info, cfg, manifest)
     write_manifest(manifest_path, manifest)
 
     # 7) cleanup
-    cleaned = gentle_cleanup(with_meter, CFG, manifest)
+    cleaned = gentle_cleanup(with_meter, cfg, manifest)
     write_manifest(manifest_path, manifest)
 
     # 8) write MIDI
-    out_mid = f"data/midi/{sid}/{sid}.mid"
-    assemble_and_write_midi(cleaned, meter_info, out_mid, CFG, manifest)
+    assemble_and_write_midi(cleaned, meter_info, out_mid, cfg, manifest)
     write_manifest(manifest_path, manifest)
 
-    return out_mid, manifest_path
 
+def _batch_files(pattern: str):
+    """
+    Songs matching a batch glob: audio files and stem folders, without the
+    role-mapping sidecars of bring-your-own-stems songs.
+    """
+    return batch_songs(glob.glob(pattern), CFG)
 
-def cmd_run_batch(pattern: str, normalize_key: bool = False):
-    files = sorted(glob.glob(pattern))
+
+def cmd_run_batch(pattern: str, normalize_key: bool = False, profile: str = "full", queue_full=None):
+    files = _batch_files(pattern)
     if not files:
         print(f"No files match: {pattern}")
         return 1
 
     for f in tqdm(files, desc="Processing files"):
         try:
-            out_mid, mani = process_one(f, normalize_key=normalize_key)
+            out_mid, mani = process_one(f, normalize_key=normalize_key, profile=profile, queue_full=queue_full)
             print(f"[OK] {f} -> {out_mid}  (manifest: {mani})")
         except Exception as e:
             print(f"[ERR] {f}: {e}")
     return 0
 
 
-def cmd_review_pending():
-    review_pending_items()
+def _queue_state(sid: str) -> dict:
+    return read_manifest(f"manifests/{sid}.json").get("queue") or {}
+
+
+def _record_queue_result(sid: str, entry: dict):
+    manifest_path = f"manifests/{sid}.json"
+    manifest = read_manifest(manifest_path)
+    manifest.setdefault("song_id", sid)
+    manifest["queue"] = {**(manifest.get("queue") or {}), **entry}
+    write_manifest(manifest_path, manifest)
+
+
+def _attempts_exhausted(sid: str, state: dict, max_attempts: int, leases) -> bool:
+    """
+    True once a song has used up its `max_attempts` claims, whatever its status.
+    Attempts are counted at claim time, so a worker that was OOM-killed or
+    crashed natively (leaving the song "running") still uses one up; once its
+    lease has expired the run is recorded as an error.
+    """
+    if state.get("status") == "done" or int(state.get("attempts", 0)) < max_attempts:
+        return False
+    if state.get("status") == "running" and not leases.is_leased(sid):
+        error = f"worker {state.get('worker')} died during attempt {state.get('attempts')}"
+        _record_queue_result(sid, {"status": "error", "finished_at": time.time(), "error": error})
+        print(f"[queue] {sid}: giving up ({error})")
+    return True
+
+
+def _lease_queue():
+    qcfg = CFG.get("queue", {})
+    return LeaseQueue(
+        qcfg.get("lease_dir", "data/leases"),
+        ttl_s=qcfg.get("lease_ttl_s", 300),
+        heartbeat_s=qcfg.get("heartbeat_s", 30),
+    )
+
+
+def _run_leased(f: str, sid: str, lease, worker: str, attempts: int, normalize_key: bool) -> bool:
+    """
+    process_one() under a held lease, recording progress in manifest["queue"].
+    Always releases the lease. Returns True on success.
+    """
+    _record_queue_result(sid, {
+        "status": "running",
+        "worker": worker,
+        "attempts": attempts,
+        "started_at": time.time(),
+    })
+    try:
+        out_mid, mani = process_one(f, normalize_key=normalize_key)
+        _record_queue_result(sid, {
+            "status": "done",
+            "finished_at": time.time(),
+            "lease_lost": lease.lost,
+            "error": None,
+        })
+        print(f"[OK] {f} -> {out_mid}  (manifest: {mani})")
+        return True
+    except Exception as e:
+        _record_queue_result(sid, {
+            "status": "error",
+            "finished_at": time.time(),
+            "lease_lost": lease.lost,
+            "error": str(e),
+        })
+        print(f"[ERR] {f}: {e}")
+        return False
+    finally:
+        lease.release()
+
+
+def cmd_worker(pattern: str, normalize_key: bool = False, forever: bool = False):
+    """
+    Claim and process songs from a shared glob until nothing is left.
+
+    Any number of workers (on any host that mounts the same data/ and manifests/)
+    can run this concurrently; coordination happens purely through lease files.
+    Per-song results land in manifest["queue"].
+    """
+    qcfg = CFG.get("queue", {})
+    queue = _lease_queue()
+    poll_s = float(qcfg.get("poll_s", 15))
+    max_attempts = int(qcfg.get("max_attempts", 2))
+    print(f"[worker] {queue.worker} started on {pattern!r}")
+
+    n_done = 0
+    while True:
+        files = _batch_files(pattern)
+        # rotate so concurrent workers don't all fight over the same first file
+        if files:
+            k = random.randrange(len(files))
+            files = files[k:] + files[:k]
+
+        claimed_any = False
+        outstanding = 0
+        for f in files:
+            sid = song_id_from_path(f)
+            state = _queue_state(sid)
+            if state.get("status") == "done":
+                continue
+            if _attempts_exhausted(sid, state, max_attempts, queue):
+                continue
+            outstanding += 1
+
+            lease = queue.try_claim(sid)
+            if lease is None:
+                continue
+            claimed_any = True
+
+            # Re-read after claiming: another worker may have finished it (or used
+            # up its last attempt) meanwhile.
+            state = _queue_state(sid)
+            if state.get("status") == "done" or int(state.get("attempts", 0)) >= max_attempts:
+                lease.release()
+                _attempts_exhausted(sid, state, max_attempts, queue)
+                outstanding -= 1
+                continue
+
+            attempts = int(state.get("attempts", 0)) + 1
+            if _run_leased(f, sid, lease, queue.worker, attempts, normalize_key):
+                n_done += 1
+                outstanding -= 1
+            elif attempts >= max_attempts:
+                outstanding -= 1
+
+        if outstanding == 0 and not forever:
+            print(f"[worker] {queue.worker} finished; processed {n_done} song(s)")
+            return 0
+        if not claimed_any:
+            # Everything left is leased by others (or nothing new yet); wait for
+            # them to finish or for their leases to expire.
+            time.sleep(poll_s)
+
+
+def cmd_watch(watch_dir: str, normalize_key: bool = False):
+    """
+    Continuously ingest files dropped into `watch_dir`.
+
+    Files are enqueued once their size/mtime have been stable for `settle_s`,
+    flagged and short songs first. A song is skipped when its manifest shows a
+    finished (or given-up) run of the same file version. Claims go through the
+    same lease files as `worker`, so several watchers can share one folder.
+    """
+    wcfg = CFG.get("watch", {})
+    qcfg = CFG.get("queue", {})
+    max_attempts = int(qcfg.get("max_attempts", 2))
+    leases = _lease_queue()
+    wq = WatchQueue(
+        watch_dir,
+        settle_s=wcfg.get("settle_s", 10),
+        priority_songs=wcfg.get("priority_songs"),
+    )
+    wait = make_waiter(watch_dir)
+    poll_s = float(wcfg.get("poll_s", 5))
+    finished = {}  # path -> signature known to be finished, saves manifest reads
+
+    def is_done(path, size, mtime):
+        sig = [int(size), int(mtime)]
+        if finished.get(path) == sig:
+            return True
+        m = read_manifest(f"manifests/{song_id_from_path(path)}.json")
+        q = m.get("queue") or {}
+        out_mid = (m.get("output") or {}).get("midi")
+        if "source_signature" in m:
+            if m["source_signature"] != sig:
+                return False
+            done = q.get("status") == "done" or _attempts_exhausted(
+                song_id_from_path(path), q, max_attempts, leases
+            ) or (not q and bool(out_mid) and os.path.exists(out_mid))
+        else:
+            # produced before signatures were recorded: trust a MIDI newer than the source
+            done = bool(out_mid) and os.path.exists(out_mid) and os.path.getmtime(out_mid) >= mtime
+        if done:
+            finished[path] = sig
+        return done
+
+    print(f"[watch] {leases.worker} watching {watch_dir} (settle {wq.settle_s:.0f}s)")
+    while True:
+        if wq.scan(is_done):
+            print(f"[watch] {len(wq)} file(s) queued")
+        item = wq.pop()
+        if item is None:
+            wait(poll_s)
+            continue
+
+        f, (size, mtime) = item
+        sid = song_id_from_path(f)
+        lease = leases.try_claim(sid)
+        if lease is None:
+            continue
+        # another watcher may have finished it between our scan and the claim
+        if is_done(f, size, mtime):
+            lease.release()
+            continue
+        m = read_manifest(f"manifests/{sid}.json")
+        same_version = m.get("source_signature") == [int(size), int(mtime)]
+        attempts = int((m.get("queue") or {}).get("attempts", 0)) + 1 if same_version else 1
+        _run_leased(f, sid, lease, leases.worker, attempts, normalize_key)
+
+
+def _parse_overrides(pairs):
+    """
+    ["vocals.onset_threshold=0.55", "default.frame_threshold=0.25"]
+      -> {"vocals": {"onset_threshold": 0.55}, "default": {"frame_threshold": 0.25}}
+    """
+    out = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        stem, _, param = key.partition(".")
+        if not value or not param:
+            raise SystemExit(f"Bad --set {pair!r}; expected <stem>.<param>=<value>")
+        out.setdefault(stem, {})[param] = float(value)
+    return out
+
+
+def cmd_redecode(pattern: str, overrides=None, normalize_key: bool = False):
+    """
+    Re-decode pitched notes from cached Basic Pitch posteriors and re-pick
+    drum hits from cached ADTOF activations with new thresholds, then re-run
+    steps 4-8. No neural inference; songs without cached drum activations
+    keep the drums from their current MIDI.
+    """
+    cfg = copy.deepcopy(CFG)
+    bp_cfg = cfg.setdefault("transcription", {}).setdefault("basic_pitch", {})
+    drum_cfg = cfg["transcription"].setdefault("drums", {})
+    for stem, params in _parse_overrides(overrides).items():
+        if stem == "drums":
+            # drums.<gm_pitch>=threshold, drums.min_ioi_s=seconds
+            for k, v in params.items():
+                if k == "min_ioi_s":
+                    drum_cfg["min_ioi_s"] = v
+                else:
+                    drum_cfg.setdefault("thresholds", {})[int(k)] = v
+            continue
+        bp_cfg.setdefault(stem, {}).update(params)
+
+    manifests = sorted(glob.glob(pattern))
+    if not manifests:
+        print(f"No manifests match: {pattern}")
+        return 1
+
+    for manifest_path in tqdm(manifests, desc="Re-decoding"):
+        manifest = read_manifest(manifest_path)
+        sid = manifest.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+        out_mid = f"data/midi/{sid}/{sid}.mid"
+        try:
+            # the bass silence filter, lead f0 and drum velocities read the stems:
+            # regenerate evicted ones rather than decode differently without them
+            stems = ensure_stems(manifest, cfg)
+            meter_info = meter_info_from_manifest(manifest)
+            previous_mid = (manifest.get("output") or {}).get("midi")
+            pitched = transcribe_pitched_tracks(stems, cfg, manifest, redecode=True)
+            drums = transcribe_drums_to_midi(stems.get("drums"), cfg, manifest, repick=True)
+            if manifest["transcription"].get("drums") == "missing_activations":
+                drums = load_drum_track(previous_mid)
+                manifest["transcription"]["drums"] = True if drums is not None else "no_notes"
+            _store_notes(pitched, drums, manifest)
+            write_manifest(manifest_path, manifest)
+            song_normalize = normalize_key or bool((manifest.get("key") or {}).get("normalized"))
+            finish_song(pitched, drums, stems, meter_info, out_mid, manifest, manifest_path, song_normalize)
+            print(f"[OK] {sid} -> {out_mid}")
+        except Exception as e:
+            print(f"[ERR] {sid}: {e}")
+    return 0
+
+
+def _refinish_one(manifest_path: str, normalize_key: bool = False):
+    """
+    Re-run steps 4-8 for one song from its stored notes. Songs processed
+    before the note store existed are bootstrapped from their MIDI when that
+    is still the raw transcription (i.e. not key-normalized). A song that was
+    key-normalized stays normalized.
+    Returns (sid, ok, message).
+    """
+    manifest = read_manifest(manifest_path)
+    sid = manifest.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+    manifest.setdefault("song_id", sid)
+    out_mid = f"data/midi/{sid}/{sid}.mid"
+    normalize_key = normalize_key or bool((manifest.get("key") or {}).get("normalized"))
+    try:
+        notes_path = (manifest.get("notes") or {}).get("path") or note_store_path(CFG, sid)
+        if os.path.exists(notes_path):
+            pitched, drums = load_notes(notes_path)
+        else:
+            previous_mid = (manifest.get("output") or {}).get("midi")
+            if not previous_mid or not os.path.exists(previous_mid):
+                return sid, False, "no stored notes and no MIDI"
+            if (manifest.get("key") or {}).get("transpose_semitones"):
+                return sid, False, "no stored notes and MIDI is key-normalized; re-run redecode first"
+            pitched, drums = notes_from_midi(previous_mid)
+            _store_notes(pitched, drums, manifest, source="midi")
+
+        # steps 4-8 never read stem audio (the paths are bookkeeping only), so
+        # evicted stems are not regenerated here
+        stems = (manifest.get("separation") or {}).get("stems") or {}
+        with timed(manifest, "symbolic"):
+            finish_song(
+                pitched, drums, stems, meter_info_from_manifest(manifest),
+                out_mid, manifest, manifest_path, normalize_key,
+            )
+        write_manifest(manifest_path, manifest)
+        return sid, True, out_mid
+    except Exception as e:
+        return sid, False, str(e)
+
+
+def cmd_refinish(pattern: str = "manifests/*.json", workers=None, normalize_key: bool = False):
+    """
+    Re-run only the symbolic stages (assignment, key, meter, cleanup, MIDI
+    writing) for every manifest, in parallel worker processes.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    manifests = sorted(glob.glob(pattern))
+    if not manifests:
+        print(f"No manifests match: {pattern}")
+        return 1
+    workers = int(workers or (CFG.get("refinish") or {}).get("workers") or os.cpu_count() or 1)
+
+    fn = partial(_refinish_one, normalize_key=normalize_key)
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(fn, manifests, chunksize=max(1, min(64, len(manifests) // (workers * 8))))
+    else:
+        pool, results = None, map(fn, manifests)
+
+    n_ok = 0
+    try:
+        for sid, ok, msg in tqdm(results, total=len(manifests), desc="Refinishing"):
+            if ok:
+                n_ok += 1
+            else:
+                print(f"[ERR] {sid}: {msg}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"[refinish] {n_ok}/{len(manifests)} songs refinished with {workers} worker(s)")
+    return 0 if n_ok == len(manifests) else 1
+
+
+_TRACK_STEM = {"voxlead": "vocals", "voxbg": "vocals", "bass": "bass", "guitar": "guitar", "other": "other"}
+
+
+def _failed(status) -> bool:
+    return isinstance(status, str) and status.startswith("error")
+
+
+def _retry_plan(manifest: dict):
+    """
+    What a song needs redone, from its manifest. None when nothing failed;
+    {"full": reason} when nothing before transcription is reusable; else
+    {"meter": bool, "stems": [stems to re-transcribe], "drums": bool, "finish": True}.
+    """
+    failures = manifest.get("failures") or {}
+    sep = manifest.get("separation") or {}
+    if (manifest.get("ingest") or {}).get("duplicate_of") or manifest.get("in_memory"):
+        return None
+    if "separation" in failures or not sep.get("stems"):
+        # only songs whose run actually failed (not e.g. preview-only ones)
+        if "separation" in failures:
+            return {"full": "separation failed"}
+        if (manifest.get("queue") or {}).get("status") == "error" and manifest.get("source_audio"):
+            return {"full": "run failed before separation finished"}
+        return None
+
+    trans = manifest.get("transcription") or {}
+    pitched = trans.get("pitched")
+    stems_known = set(sep.get("stems") or {})
+    plan = {"meter": "beats_meter" in failures or not (manifest.get("meter_key") or {}).get("tempo"),
+            "stems": set(), "drums": False, "finish": True}
+
+    if "transcribe_pitched" in failures or pitched is None:
+        plan["stems"] = {st for st in _TRACK_STEM.values() if st in stems_known}
+    else:
+        for track, status in pitched.items():
+            stem = _TRACK_STEM.get(track)
+            # missing_stem is only worth a retry if the stem is there now
+            if _failed(status) or (status == "missing_stem" and stem in stems_known):
+                plan["stems"].add(stem)
+
+    drums = trans.get("drums")
+    if (
+        "transcribe_drums" in failures or drums is None or _failed(drums)
+        or drums == "missing_activations" or (drums == "missing_stem" and "drums" in stems_known)
+    ):
+        plan["drums"] = True
+
+    notes = manifest.get("notes") or {}
+    if (
+        not notes or not os.path.exists(notes.get("path") or "")
+        or notes.get("at", 0) < manifest.get("run_started_at", 0)
+    ):
+        # the run failed before storing its notes, so the store (if any) is from
+        # an earlier run: every stem again (cheap when its posteriors are cached)
+        plan["stems"] = {st for st in _TRACK_STEM.values() if st in stems_known}
+        plan["drums"] = True
+
+    out_mid = (manifest.get("output") or {}).get("midi")
+    complete = out_mid and os.path.exists(out_mid) and notes
+    if complete and not (plan["meter"] or plan["stems"] or plan["drums"]):
+        return None
+    plan["stems"] = sorted(plan["stems"])
+    return plan
+
+
+def _retry_one(manifest_path: str, normalize_key: bool = False):
+    """
+    Re-run only the failed/missing work of one song (stem transcriptions,
+    beats) plus steps 4-8, reusing every successful result.
+    Returns (sid, ok, message).
+    """
+    manifest = read_manifest(manifest_path)
+    sid = manifest.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+    manifest.setdefault("song_id", sid)
+    plan = _retry_plan(manifest)
+    if plan is None:
+        return sid, True, "nothing to retry"
+    normalize_key = normalize_key or bool((manifest.get("key") or {}).get("normalized"))
+    try:
+        if "full" in plan:
+            src = manifest.get("source_audio")
+            if not src or not os.path.exists(src):
+                return sid, False, f"{plan['full']} and source audio is gone"
+            out_mid, _ = process_one(src, normalize_key=normalize_key)
+            return sid, True, f"full run ({plan['full']}) -> {out_mid}"
+
+        out_mid = f"data/midi/{sid}/{sid}.mid"
+        duration_s = float((manifest.get("ingest") or {}).get("duration") or 0.0)
+        stems = ensure_stems(manifest, CFG)
+        with shm_transport.stage_scope(sid, CFG):
+            if plan["meter"]:
+                with timed(manifest, "beats_meter"):
+                    meter_info = _run_stage(
+                        "beats_meter", estimate_tempo_downbeats_meter, (stems, CFG, manifest),
+                        manifest, manifest_path, duration_s,
+                    )
+            else:
+                meter_info = meter_info_from_manifest(manifest)
+
+            notes_path = (manifest.get("notes") or {}).get("path") or note_store_path(CFG, sid)
+            pitched, drums = load_notes(notes_path) if os.path.exists(notes_path) else ({}, None)
+
+            if plan["stems"]:
+                before = dict((manifest.get("transcription") or {}).get("pitched") or {})
+                subset = {k: (v if k in plan["stems"] else None) for k, v in stems.items()}
+                with timed(manifest, "transcribe_pitched"):
+                    fresh = _run_stage(
+                        "transcribe_pitched", transcribe_pitched_tracks, (subset, CFG, manifest),
+                        manifest, manifest_path, duration_s,
+                    )
+                # the subset run marks every other track missing_stem: keep their results
+                status = manifest["transcription"]["pitched"]
+                retried = [t for t, st in _TRACK_STEM.items() if st in plan["stems"]]
+                manifest["transcription"]["pitched"] = {
+                    **before, **{t: status[t] for t in retried if t in status}
+                }
+                pitched = {k: v for k, v in pitched.items() if k not in retried}
+                pitched.update({t: fresh[t] for t in retried if t in fresh})
+
+            if plan["drums"]:
+                with timed(manifest, "transcribe_drums"):
+                    drums = _run_stage(
+                        "transcribe_drums", transcribe_drums_to_midi, (stems.get("drums"), CFG, manifest),
+                        manifest, manifest_path, duration_s,
+                    )
+
+        # without isolation a stage records no success of its own
+        for stage, redone in (("beats_meter", plan["meter"]), ("transcribe_pitched", plan["stems"]),
+                              ("transcribe_drums", plan["drums"])):
+            if redone:
+                manifest.get("failures", {}).pop(stage, None)
+        _store_notes(pitched, drums, manifest, source="retry")
+        manifest["retry"] = {
+            "at": time.time(),
+            "meter": plan["meter"],
+            "stems": plan["stems"],
+            "drums": plan["drums"],
+        }
+        write_manifest(manifest_path, manifest)
+        with timed(manifest, "symbolic"):
+            finish_song(pitched, drums, stems, meter_info, out_mid, manifest, manifest_path, normalize_key)
+        if (manifest.get("queue") or {}).get("status") == "error":
+            manifest["queue"] = {**manifest["queue"], "status": "done", "error": None, "finished_at": time.time()}
+        write_manifest(manifest_path, manifest)
+        trans = manifest.get("transcription") or {}
+        still = [t for t, st in (trans.get("pitched") or {}).items() if _failed(st)]
+        if _failed(trans.get("drums")):
+            still.append("drums")
+        if still:
+            return sid, False, f"still failing: {', '.join(still)}"
+        return sid, True, out_mid
+    except Exception as e:
+        write_manifest(manifest_path, manifest)
+        return sid, False, str(e)
+
+
+def cmd_retry_failed(pattern: str = "manifests/*.json", workers=None, normalize_key: bool = False,
+                     dry_run: bool = False):
+    """
+    Re-run only what failed (per-stem transcriptions, beats, whole songs whose
+    separation failed) and the steps downstream of it, in parallel across songs.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    todo = []
+    for manifest_path in sorted(glob.glob(pattern)):
+        plan = _retry_plan(read_manifest(manifest_path))
+        if plan is not None:
+            todo.append((manifest_path, plan))
+    if not todo:
+        print(f"[retry] nothing to retry in {pattern}")
+        return 0
+    for manifest_path, plan in todo:
+        sid = os.path.splitext(os.path.basename(manifest_path))[0]
+        if "full" in plan:
+            what = f"full run ({plan['full']})"
+        else:
+            what = ", ".join(
+                (["beats"] if plan["meter"] else []) + plan["stems"] + (["drums"] if plan["drums"] else [])
+            ) or "steps 4-8 only"
+        print(f"[retry] {sid}: {what}")
+    if dry_run:
+        return 0
+
+    workers = int(workers or (CFG.get("retry") or {}).get("workers") or os.cpu_count() or 1)
+    workers = max(1, min(workers, len(todo)))
+    paths = [p for p, _ in todo]
+    fn = partial(_retry_one, normalize_key=normalize_key)
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(fn, paths)
+    else:
+        pool, results = None, map(fn, paths)
+
+    n_ok = 0
+    try:
+        for sid, ok, msg in tqdm(results, total=len(paths), desc="Retrying"):
+            if ok:
+                n_ok += 1
+                print(f"[OK] {sid}: {msg}")
+            else:
+                print(f"[ERR] {sid}: {msg}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"[retry] {n_ok}/{len(paths)} songs recovered with {workers} worker(s)")
+    return 0 if n_ok == len(paths) else 1
+
+
+def _stats_one(manifest_path: str, stats_dir: str):
+    try:
+        sid, part, computed = corpus_stats.cached_partial(manifest_path, CFG, stats_dir)
+        return sid, part, computed, None
+    except Exception as e:
+        return os.path.basename(manifest_path), None, True, str(e)
+
+
+def cmd_stats(pattern: str = "manifests/*.json", workers=None, out=None):
+    """
+    Corpus statistics over the stored notes: each song is mapped to an
+    additive partial in a worker process (cached per song, so re-runs only map
+    new or changed songs), partials are summed, and a compact JSON summary is
+    written.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    import json
+
+    stats_cfg = CFG.get("stats") or {}
+    stats_dir = stats_cfg.get("dir", "data/stats")
+    out = out or os.path.join(stats_dir, "summary.json")
+
+    manifests = sorted(glob.glob(pattern))
+    if not manifests:
+        print(f"No manifests match: {pattern}")
+        return 1
+    workers = int(workers or stats_cfg.get("workers") or os.cpu_count() or 1)
+
+    fn = partial(_stats_one, stats_dir=stats_dir)
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(fn, manifests, chunksize=max(1, min(256, len(manifests) // (workers * 8))))
+    else:
+        pool, results = None, map(fn, manifests)
+
+    total = corpus_stats.empty_partial()
+    sids, n_mapped, n_empty, n_err = [], 0, 0, 0
+    try:
+        for sid, part, computed, err in tqdm(results, total=len(manifests), desc="Stats"):
+            if err:
+                n_err += 1
+                print(f"[ERR] {sid}: {err}")
+                continue
+            sids.append(sid)
+            n_mapped += int(computed)
+            if part is None:
+                n_empty += 1
+            else:
+                total = corpus_stats.merge(total, part)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # only drop stale partials when the whole corpus was scanned
+    if pattern == "manifests/*.json":
+        corpus_stats.prune_partials(stats_dir, sids)
+
+    summary = corpus_stats.summarize(total)
+    summary["pattern"] = pattern
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    tmp = out + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(summary, f, separators=(",", ":"))
+    os.replace(tmp, out)
+
+    print(
+        f"[stats] {summary['songs']} songs ({summary['duration_h']} h), {n_mapped} mapped, "
+        f"{len(sids) - n_mapped} cached, {n_empty} without notes, {n_err} errors -> {out}"
+    )
+    if summary["tempo"]:
+        print(f"[stats] tempo mean {summary['tempo']['mean']} BPM ({summary['tempo']['min']:.0f}-{summary['tempo']['max']:.0f})")
+    for name, tr in summary["tracks"].items():
+        pitch = tr["pitch"] or {}
+        dens = tr["density_notes_per_s"] or {}
+        print(
+            f"[stats] {name:8s} songs={tr['songs']:<6d} notes={tr['notes']:<9d} "
+            f"pitch={pitch.get('min', 0):.0f}-{pitch.get('max', 0):.0f} density={dens.get('mean', 0)}/s"
+        )
+    return 0 if not n_err else 1
+
+
+def cmd_query(what: str):
+    try:
+        cols, rows = corpus_index.run_query(
+            INDEX_CFG.get("path", "data/index/corpus.sqlite"), what, CFG
+        )
+    except (FileNotFoundError, ValueError, sqlite3.Error) as e:
+        print(f"[query] {e}")
+        return 2
+    print("\t".join(cols))
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+    print(f"({len(rows)} rows)")
+    return 0
+
+
+def cmd_index_rebuild(pattern: str):
+    db_path = INDEX_CFG.get("path", "data/index/corpus.sqlite")
+    n = corpus_index.rebuild(db_path, pattern)
+    print(f"[corpus_index] Indexed {n} manifest(s) into {db_path}")
+    return 0
+
+
+def _process_with_cfg(audio_path: str, cfg: dict):
+    """
+    process_one() with a preset's config; the module config is left alone.
+    """
+    return process_one(audio_path, cfg=cfg)
+
+
+def cmd_evaluate(pattern: str, presets=None, out_dir=None):
+    from steps import evaluate
+
+    ecfg = CFG.get("eval") or {}
+    files = sorted(glob.glob(pattern))
+    if not files:
+        print(f"No files match: {pattern}")
+        return 1
+    all_presets = ecfg.get("presets") or {"default": {}}
+    names = presets.split(",") if presets else list(all_presets)
+    unknown = [n for n in names if n not in all_presets]
+    if unknown:
+        print(f"Unknown preset(s): {', '.join(unknown)} (configured: {', '.join(all_presets)})")
+        return 2
+    out_dir = out_dir or ecfg.get("out_dir", "data/eval")
+
+    # eval runs must not show up in the production corpus index
+    configure_corpus_index(None)
+    rows = evaluate.run_matrix(
+        files, {n: all_presets[n] or {} for n in names}, CFG, _process_with_cfg, out_dir=out_dir
+    )
+    table = evaluate.summarize(rows)
+    print(evaluate.format_table(table))
+    print(f"[evaluate] Wrote {evaluate.write_report(rows, table, out_dir)} (* = Pareto-optimal on rtf vs note_f1)")
+    return 0
+
+
+def cmd_review_pending(pattern: str = "manifests/*.json", limit=None, serve=None, export=None,
+                       mode: str = "ab", mark=None, note=None):
+    """
+    The low-confidence review queue: list it, A/B it in the browser (--serve),
+    write its clips (--export), or record a verdict for one song (--mark).
+    """
+    if mark:
+        sid, status = mark
+        review = qc_render.mark_reviewed(f"manifests/{sid}.json", status, note)
+        print(f"[QC] {sid}: marked {review['status']}")
+        return 0
+    queue = qc_render.review_pending_items(CFG, pattern, limit=limit or None)
+    if not queue:
+        return 0
+    if export:
+        n = qc_render.export_clips(queue, CFG, export, limit=limit or None, mode=mode)
+        print(f"[QC] wrote {n} clip(s) to {export}")
+    if serve is not None:
+        qc_render.serve(queue, CFG, port=serve or None)
+    return 0
 
 
 def cmd_export_midi(out_dir: str):
@@ -103,6 +1136,32 @@ def cmd_export_midi(out_dir: str):
         print(f"Exported: {dst}")
 
 
+def _add_runtime_args(p):
+    p.add_argument(
+        "--bp-backend",
+        choices=["auto", "tf", "tflite", "onnx", "coreml"],
+        help="Basic Pitch runtime (default: transcription.basic_pitch_runtime.backend)",
+    )
+    p.add_argument("--bp-threads", type=int, help="Basic Pitch runtime thread count (0 = default)")
+    p.add_argument(
+        "--autotune",
+        action="store_true",
+        help="Benchmark available Basic Pitch runtimes now and cache the fastest for this host",
+    )
+
+
+def _apply_runtime_args(args):
+    rcfg = CFG.setdefault("transcription", {}).setdefault("basic_pitch_runtime", {})
+    if getattr(args, "bp_backend", None):
+        rcfg["backend"] = args.bp_backend
+    if getattr(args, "bp_threads", None) is not None:
+        rcfg["threads"] = args.bp_threads
+    if getattr(args, "autotune", False):
+        from utils.bp_backends import autotune
+        autotune(CFG)
+        rcfg["backend"] = "auto"
+
+
 def main():
     ap = argparse.ArgumentParser()
     sub = ap.add_subparsers(dest="cmd")
@@ -115,12 +1174,149 @@ def main():
         action="store_true",
         help="Normalize pitched tracks to Cmaj/Amin",
     )
+    r.add_argument(
+        "--profile",
+        choices=["full", "preview"],
+        default="full",
+        help="preview: fast draft MIDI (no/light separation, subset of classes; see `preview` in config.yaml)",
+    )
+    r.add_argument(
+        "--queue-full",
+        action="store_true",
+        default=None,
+        help="With --profile preview: start the full-quality run in the background to replace the draft",
+    )
+    _add_runtime_args(r)
+
+    # worker
+    w = sub.add_parser(
+        "worker",
+        help="Claim songs from a shared glob via lease files (run one per core/host)",
+    )
+    w.add_argument("pattern", help='e.g., "data/raw/*.wav"')
+    w.add_argument(
+        "--normalize-key",
+        action="store_true",
+        help="Normalize pitched tracks to Cmaj/Amin",
+    )
+    w.add_argument(
+        "--forever",
+        action="store_true",
+        help="Keep polling for new files instead of exiting when the queue drains",
+    )
+    _add_runtime_args(w)
+
+    # watch
+    wt = sub.add_parser(
+        "watch",
+        help="Continuously process files dropped into a folder (debounced, prioritized)",
+    )
+    wt.add_argument("watch_dir", nargs="?", default="data/raw")
+    wt.add_argument(
+        "--normalize-key",
+        action="store_true",
+        help="Normalize pitched tracks to Cmaj/Amin",
+    )
+    _add_runtime_args(wt)
+
+    # redecode
+    rd = sub.add_parser(
+        "redecode",
+        help="Re-decode notes from cached Basic Pitch/ADTOF outputs and re-run steps 4-8",
+    )
+    rd.add_argument("pattern", nargs="?", default="manifests/*.json", help="manifest glob")
+    rd.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        metavar="STEM.PARAM=VALUE",
+        help="Override a decode threshold, e.g. vocals.onset_threshold=0.55, "
+        "drums.38=0.3 or drums.min_ioi_s=0.04 (repeatable)",
+    )
+    rd.add_argument(
+        "--normalize-key",
+        action="store_true",
+        help="Normalize pitched tracks to Cmaj/Amin",
+    )
+
+    # refinish
+    rf = sub.add_parser(
+        "refinish",
+        help="Re-run steps 4-8 (assign, key, meter, cleanup, MIDI) from stored notes, in parallel",
+    )
+    rf.add_argument("pattern", nargs="?", default="manifests/*.json", help="manifest glob")
+    rf.add_argument("--workers", type=int, help="worker processes (default: refinish.workers or #cores)")
+    rf.add_argument(
+        "--normalize-key",
+        action="store_true",
+        help="Normalize pitched tracks to Cmaj/Amin",
+    )
+
+    # retry-failed
+    rt = sub.add_parser(
+        "retry-failed",
+        help="Re-run only failed/missing stem transcriptions (and steps downstream), in parallel across songs",
+    )
+    rt.add_argument("pattern", nargs="?", default="manifests/*.json", help="manifest glob")
+    rt.add_argument("--workers", type=int, help="worker processes (default: retry.workers or #cores)")
+    rt.add_argument("--dry-run", action="store_true", help="Only list what would be retried")
+    rt.add_argument(
+        "--normalize-key",
+        action="store_true",
+        help="Normalize pitched tracks to Cmaj/Amin (songs normalized before stay normalized)",
+    )
+
+    # stats
+    st = sub.add_parser(
+        "stats",
+        help="Corpus note statistics (pitch/range/density per class, tempo, key, drum hits), incremental",
+    )
+    st.add_argument("pattern", nargs="?", default="manifests/*.json", help="manifest glob")
+    st.add_argument("--workers", type=int, help="worker processes (default: stats.workers or #cores)")
+    st.add_argument("--out", help="summary JSON (default: <stats.dir>/summary.json)")
+
+    # query
+    q = sub.add_parser(
+        "query",
+        help="Query the SQLite corpus index (preset name or SELECT statement)",
+    )
+    q.add_argument(
+        "what",
+        help=f"one of: {', '.join(corpus_index.PRESETS)}; or a SELECT over songs/stem_status/outputs/timings",
+    )
+
+    # index-rebuild
+    ir = sub.add_parser(
+        "index-rebuild",
+        help="Rebuild the SQLite corpus index from the JSON manifests",
+    )
+    ir.add_argument("pattern", nargs="?", default="manifests/*.json", help="manifest glob")
+
+    # evaluate
+    ev = sub.add_parser(
+        "evaluate",
+        help="Score speed presets on rendered ground-truth MIDI and print a speed/quality Pareto table",
+    )
+    ev.add_argument("pattern", help='MIDI glob, e.g. "data/eval/midi/*.mid"')
+    ev.add_argument("--presets", help="comma-separated preset names from eval.presets (default: all)")
+    ev.add_argument("--out", help="output dir (default: eval.out_dir)")
 
     # review-pending
-    sub.add_parser(
+    rv = sub.add_parser(
         "review-pending",
-        help="Open quick-review UI for low-confidence items",
+        help="Queue low-confidence songs and A/B each track's stem against a synth render of its notes",
+    )
+    rv.add_argument("pattern", nargs="?", default="manifests/*.json", help="manifest glob")
+    rv.add_argument("--limit", type=int, help="only the first N songs of the queue")
+    rv.add_argument(
+        "--serve", type=int, nargs="?", const=0, metavar="PORT",
+        help="serve the review page on localhost (default port: qc.port)",
     )
+    rv.add_argument("--export", metavar="DIR", help="write one clip per track to DIR/<song>/<track>.<mode>.wav")
+    rv.add_argument("--mode", choices=list(qc_render.MODES), default="ab",
+                    help="ab = stem left / render right (default), seq = stem then render")
+    rv.add_argument("--mark", nargs=2, metavar=("SONG_ID", "STATUS"), help="record a verdict, e.g. ok or fix")
+    rv.add_argument("--note", help="free-text note stored with --mark")
 
     # export-midi
     e = sub.add_parser(
@@ -130,11 +1326,34 @@ def main():
     e.add_argument("--out", required=True)
 
     args = ap.parse_args()
+    _apply_runtime_args(args)
 
     if args.cmd == "run-batch":
-        return cmd_run_batch(args.pattern, normalize_key=args.normalize_key)
+        return cmd_run_batch(
+            args.pattern, normalize_key=args.normalize_key, profile=args.profile, queue_full=args.queue_full
+        )
+    elif args.cmd == "worker":
+        return cmd_worker(args.pattern, normalize_key=args.normalize_key, forever=args.forever)
+    elif args.cmd == "watch":
+        return cmd_watch(args.watch_dir, normalize_key=args.normalize_key)
+    elif args.cmd == "redecode":
+        return cmd_redecode(args.pattern, overrides=args.overrides, normalize_key=args.normalize_key)
+    elif args.cmd == "refinish":
+        return cmd_refinish(args.pattern, workers=args.workers, normalize_key=args.normalize_key)
+    elif args.cmd == "retry-failed":
+        return cmd_retry_failed(args.pattern, workers=args.workers, normalize_key=args.normalize_key,
+                                dry_run=args.dry_run)
+    elif args.cmd == "stats":
+        return cmd_stats(args.pattern, workers=args.workers, out=args.out)
+    elif args.cmd == "query":
+        return cmd_query(args.what)
+    elif args.cmd == "index-rebuild":
+        return cmd_index_rebuild(args.pattern)
+    elif args.cmd == "evaluate":
+        return cmd_evaluate(args.pattern, presets=args.presets, out_dir=args.out)
     elif args.cmd == "review-pending":
-        return cmd_review_pending()
+        return cmd_review_pending(args.pattern, limit=args.limit, serve=args.serve, export=args.export,
+                                  mode=args.mode, mark=args.mark, note=args.note)
     elif args.cmd == "export-midi":
         return cmd_export_midi(args.out)
     else:
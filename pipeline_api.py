@@ -0,0 +1,132 @@
+"""
+Library entry point: run the pipeline on an audio array, entirely in memory.
+
+    from pipeline_api import run_in_memory
+    result = run_in_memory(y, sr)
+    result["notes"]["bass"]      # structured array: start, end, pitch, velocity
+    result["tempo_map"]          # tempo, downbeats, time signature
+    result["manifest"]           # same fields process_one() records
+
+Stems are passed between stages as in-memory buffers (AudioArray). Nothing is
+written unless asked (midi_path / manifest_path): no stem WAVs, no posterior
+or activation caches, no manifest rewrites. The one exception is ADTOF, which
+only reads files; the drum stem is handed to it through a RAM-backed temp file.
+
+Models (Demucs, Basic Pitch) stay loaded between calls, so a data-generation
+job should call this repeatedly from one process.
+"""
+import os
+import time
+
+import numpy as np
+
+from steps.separate import separate_in_memory
+from steps.beats_meter import estimate_tempo_downbeats_meter
+from steps.transcribe_melodic import transcribe_pitched_tracks
+from steps.transcribe_drums import transcribe_drums_to_midi
+from steps.assign_parts import assign_seven_classes
+from steps.key_normalize import detect_and_normalize_key
+from steps.meter_apply import insert_time_signatures
+from steps.clean_quantize import gentle_cleanup
+from steps.write_midi import assemble_and_write_midi
+from utils.audio_utils import AudioArray
+from utils.manifest import load_config, write_manifest, timed
+
+NOTE_DTYPE = np.dtype([("start", "f8"), ("end", "f8"), ("pitch", "u1"), ("velocity", "u1")])
+
+_DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+
+
+def _as_audio(y, sr, name):
+    if isinstance(y, AudioArray):
+        return y
+    y = np.asarray(y, dtype=np.float32)
+    # accept soundfile's (frames, channels) layout as well as (channels, frames)
+    if y.ndim == 2 and y.shape[1] <= 8 < y.shape[0]:
+        y = y.T
+    if y.ndim not in (1, 2):
+        raise ValueError(f"{name}: expected a 1-D or 2-D audio array, got shape {y.shape}")
+    return AudioArray(y, sr, name=name)
+
+
+def _note_array(inst):
+    notes = getattr(inst, "notes", None) or []
+    arr = np.zeros(len(notes), dtype=NOTE_DTYPE)
+    if notes:
+        arr["start"] = [n.start for n in notes]
+        arr["end"] = [n.end for n in notes]
+        arr["pitch"] = [n.pitch for n in notes]
+        arr["velocity"] = [n.velocity for n in notes]
+        arr.sort(order=("start", "pitch"))
+    return arr
+
+
+def run_in_memory(y, sr: int, CFG: dict = None, song_id: str = "in_memory", normalize_key: bool = False,
+                  stems: dict = None, midi_path: str = None, manifest_path: str = None):
+    """
+    y: mix as float array [n], [channels, n] or [n, channels]; sr: its rate.
+    stems: optional {"vocals"|"drums"|"bass"|"guitar"|"other": array or
+           AudioArray} to skip separation (arrays are taken at `sr`).
+    midi_path / manifest_path: write the MIDI / manifest there as well.
+
+    Returns {"notes": {track: NOTE_DTYPE array}, "programs": {track: int},
+             "tempo_map": {...}, "manifest": dict}.
+    """
+    CFG = CFG if CFG is not None else load_config(_DEFAULT_CONFIG)
+    mix = _as_audio(y, sr, "mix")
+    manifest = {"song_id": song_id, "source_audio": None, "in_memory": True}
+    t0 = time.perf_counter()
+
+    # 1) separation
+    with timed(manifest, "separation"):
+        if stems:
+            stems = {k: _as_audio(v, sr, k) for k, v in stems.items() if v is not None}
+            manifest["separation"] = {"model": None, "in_memory": sorted(stems), "user_supplied": True}
+        else:
+            stems = separate_in_memory(mix, CFG, manifest)
+
+    # 2) tempo/downbeats/meter
+    with timed(manifest, "beats_meter"):
+        meter_info = estimate_tempo_downbeats_meter(stems, CFG, manifest, mix=mix)
+
+    # 3) transcription
+    with timed(manifest, "transcribe_pitched"):
+        pitched = transcribe_pitched_tracks(stems, CFG, manifest)
+    with timed(manifest, "transcribe_drums"):
+        drums = transcribe_drums_to_midi(stems.get("drums"), CFG, manifest)
+
+    # 4-7) symbolic stages, as in pipeline.finish_song()
+    with timed(manifest, "symbolic"):
+        assigned = assign_seven_classes(pitched, drums, stems, CFG, manifest)
+        if normalize_key:
+            assigned = detect_and_normalize_key(assigned, CFG, manifest)
+        else:
+            key_info = manifest.setdefault("key", {})
+            key_info["normalized"] = False
+            key_info["transpose_semitones"] = 0
+            key_info["target"] = None
+            key_info["reason"] = "key normalization disabled"
+        with_meter = insert_time_signatures(assigned, meter_info, CFG, manifest)
+        cleaned = gentle_cleanup(with_meter, CFG, manifest)
+
+    # 8) MIDI only on request
+    if midi_path:
+        assemble_and_write_midi(cleaned, meter_info, midi_path, CFG, manifest)
+
+    manifest["timings"]["total"] = round(time.perf_counter() - t0, 3)
+    if manifest_path:
+        write_manifest(manifest_path, manifest)
+
+    meter = meter_info.get("meter") or {}
+    tempo_map = {
+        "tempo": float(meter_info.get("tempo") or 120.0),
+        "downbeats": np.asarray(meter_info.get("downbeats") or [], dtype=np.float64),
+        "time_signature": (int(meter.get("numerator", 4)), int(meter.get("denominator", 4))),
+        "meter_confidence": float(meter.get("confidence", 0.0)),
+    }
+    return {
+        "notes": {name: _note_array(inst) for name, inst in cleaned.items()},
+        "programs": {name: (None if inst.is_drum else int(inst.program)) for name, inst in cleaned.items()},
+        "tempo_map": tempo_map,
+        "manifest": manifest,
+    }
@@ -0,0 +1,209 @@
+import os
+
+import numpy as np
+import soundfile as sf
+from scipy.ndimage import maximum_filter1d
+
+from utils.audio_utils import AudioArray, is_in_memory
+
+_READ_BLOCK_S = 30.0
+
+
+def _gate_cfg(CFG: dict) -> dict:
+    return CFG.get("activity") or {}
+
+
+def energy_envelope(path, hop_s: float = 0.05):
+    """
+    Mono RMS envelope in dBFS, one value per `hop_s` (non-overlapping frames).
+    Streams the file in blocks (or walks an in-memory stem); no resampling.
+    """
+    if is_in_memory(path):
+        sr = path.sr
+        blocks = [path.mono()]
+    else:
+        sr = sf.info(path).samplerate
+    hop = max(1, int(round(hop_s * sr)))
+    block = hop * max(1, int(_READ_BLOCK_S / hop_s))
+    if not is_in_memory(path):
+        blocks = (y.mean(axis=1) for y in sf.blocks(path, blocksize=block, always_2d=True, dtype="float32"))
+
+    env = []
+    for y in blocks:
+        n = len(y) // hop
+        if n == 0:
+            continue
+        frames = y[: n * hop].reshape(n, hop)
+        env.append(np.sqrt(np.mean(frames * frames, axis=1) + 1e-12))
+    env = np.concatenate(env) if env else np.zeros(0, dtype=np.float32)
+    return 20.0 * np.log10(env + 1e-12), hop / float(sr), sr
+
+
+def active_regions(env_db, step_s: float, thresh_db: float = -50.0,
+                   pad_s: float = 0.5, min_gap_s: float = 2.0):
+    """
+    [(start_s, end_s), ...] where the envelope is above threshold, padded by
+    `pad_s` on both sides and with gaps shorter than `min_gap_s` bridged.
+    """
+    active = env_db > thresh_db
+    if not active.any():
+        return []
+
+    pad = int(np.ceil(pad_s / step_s))
+    if pad > 0:
+        active = maximum_filter1d(active.astype(np.uint8), size=2 * pad + 1) > 0
+
+    edges = np.diff(np.concatenate([[0], active.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # bridge short gaps
+    gaps = starts[1:] - ends[:-1]
+    keep = np.concatenate([[True], gaps * step_s >= min_gap_s])
+    starts = starts[keep]
+    ends = np.concatenate([ends[:-1][keep[1:]], ends[-1:]])
+
+    return [(float(s * step_s), float(e * step_s)) for s, e in zip(starts, ends)]
+
+
+def gate_stem(path: str, CFG: dict, manifest: dict, stem: str):
+    """
+    Decide whether (and where) a stem is worth transcribing.
+
+    Returns {"silent": bool, "regions": [(s, e), ...] or None, "active_ratio": float}.
+    regions is None when the stem should be transcribed whole (mostly active,
+    or gating disabled). Recorded under manifest["activity"][stem].
+    """
+    gcfg = _gate_cfg(CFG)
+    if not gcfg.get("enabled", True):
+        return {"silent": False, "regions": None, "active_ratio": 1.0}
+
+    env_db, step_s, _ = energy_envelope(path, hop_s=float(gcfg.get("hop_s", 0.05)))
+    duration = len(env_db) * step_s
+    thresh_db = float(gcfg.get("thresh_db", -50.0))
+
+    raw_active_s = float((env_db > thresh_db).sum()) * step_s
+    regions = active_regions(
+        env_db,
+        step_s,
+        thresh_db=thresh_db,
+        pad_s=float(gcfg.get("pad_s", 0.5)),
+        min_gap_s=float(gcfg.get("min_gap_s", 2.0)),
+    )
+    covered = sum(e - s for s, e in regions)
+    ratio = covered / duration if duration > 0 else 0.0
+
+    silent = raw_active_s < float(gcfg.get("min_active_s", 0.5))
+    if silent:
+        regions = []
+    elif 1.0 - ratio < float(gcfg.get("min_saving", 0.2)):
+        regions = None  # not enough silence to be worth cutting
+
+    manifest.setdefault("activity", {})[stem] = {
+        "silent": silent,
+        "active_ratio": round(ratio, 4),
+        "regions": regions,
+    }
+    return {"silent": silent, "regions": regions, "active_ratio": ratio}
+
+
+def _compact_in_memory(audio: AudioArray, regions, gap_s: float):
+    y_all = audio.mono()
+    sr = audio.sr
+    gap = np.zeros(int(round(gap_s * sr)), dtype=np.float32)
+    parts, segments, pos = [], [], 0
+    for s, e in regions:
+        a = int(s * sr)
+        b = min(len(y_all), int(np.ceil(e * sr)))
+        if b <= a:
+            continue
+        if segments:
+            parts.append(gap)
+            pos += len(gap)
+        segments.append((pos / sr, a / sr, (b - a) / sr))
+        parts.append(y_all[a:b])
+        pos += b - a
+    y = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return AudioArray(y, sr, name=audio.name), np.asarray(segments, dtype=np.float64).reshape(-1, 3)
+
+
+def compact_audio(path, regions, out_path, gap_s: float = 0.5):
+    """
+    Write only the active `regions` of `path` (mono) to `out_path`, separated by
+    `gap_s` of silence so notes can't smear across a cut.
+
+    Returns segments: float array [N, 3] of (compact_start_s, orig_start_s, dur_s).
+    For an in-memory stem nothing is written; returns (AudioArray, segments).
+    """
+    if is_in_memory(path):
+        return _compact_in_memory(path, regions, gap_s)
+    info = sf.info(path)
+    sr = info.samplerate
+    gap = np.zeros(int(round(gap_s * sr)), dtype=np.float32)
+
+    segments = []
+    pos = 0
+    with sf.SoundFile(out_path, "w", samplerate=sr, channels=1, subtype="FLOAT") as out:
+        for s, e in regions:
+            a = int(s * sr)
+            b = min(info.frames, int(np.ceil(e * sr)))
+            if b <= a:
+                continue
+            y, _ = sf.read(path, start=a, stop=b, dtype="float32", always_2d=True)
+            y = y.mean(axis=1)
+            if segments:
+                out.write(gap)
+                pos += len(gap)
+            segments.append((pos / sr, a / sr, len(y) / sr))
+            out.write(y)
+            pos += len(y)
+    return np.asarray(segments, dtype=np.float64).reshape(-1, 3)
+
+
+def remap_times(times, segments):
+    """
+    Map times on the compacted timeline back to the original stem.
+    Times falling in an inserted gap snap to the end of the preceding segment.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if segments is None or len(segments) == 0:
+        return times
+    idx = np.clip(np.searchsorted(segments[:, 0], times, side="right") - 1, 0, len(segments) - 1)
+    offset = times - segments[idx, 0]
+    offset = np.clip(offset, 0.0, segments[idx, 2])
+    return segments[idx, 1] + offset
+
+
+def remap_events(events, segments):
+    """
+    [(start, end, pitch, vel), ...] on the compacted timeline -> original timeline.
+    A note's end is clipped to the segment its onset belongs to.
+    """
+    if not events or segments is None or len(segments) == 0:
+        return events
+    arr = np.asarray([(s, e) for s, e, _, _ in events], dtype=np.float64)
+    idx = np.clip(np.searchsorted(segments[:, 0], arr[:, 0], side="right") - 1, 0, len(segments) - 1)
+    seg_start, orig_start, dur = segments[idx, 0], segments[idx, 1], segments[idx, 2]
+    starts = orig_start + np.clip(arr[:, 0] - seg_start, 0.0, dur)
+    ends = orig_start + np.clip(arr[:, 1] - seg_start, 0.0, dur)
+    return [
+        (float(s), float(e), p, v)
+        for (s, e), (_, _, p, v) in zip(zip(starts, ends), events)
+        if e > s
+    ]
+
+
+def expand_frames(act, segments, fps: float, n_frames: int):
+    """
+    Paste frame-wise activations computed on the compacted audio back into a
+    zero-filled [n_frames, C] array on the original timeline.
+    """
+    full = np.zeros((n_frames, act.shape[1]), dtype=act.dtype)
+    for compact_start, orig_start, dur in segments:
+        a = int(round(compact_start * fps))
+        b = min(len(act), a + int(round(dur * fps)))
+        o = int(round(orig_start * fps))
+        n = min(b - a, n_frames - o)
+        if n > 0:
+            full[o:o + n] = act[a:a + n]
+    return full
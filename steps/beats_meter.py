@@ -1,6 +1,8 @@
 import librosa
 import numpy as np
 
+from utils.audio_utils import AudioArray, load_audio_mono, audio_duration
+
 DEFAULT_SR = 44100
 
 
@@ -50,9 +52,10 @@ def _normalize_tempo(bpm: float) -> float:
     return float(best)
 
 
-def estimate_tempo_downbeats_meter(stems, CFG, manifest):
+def estimate_tempo_downbeats_meter(stems, CFG, manifest, mix=None):
     """
-    Estimate global tempo & downbeats from the original mix.
+    Estimate global tempo & downbeats from the original mix (`mix`, a path or
+    in-memory AudioArray, else manifest["source_audio"]).
 
     Returns:
         {
@@ -63,14 +66,18 @@ def estimate_tempo_downbeats_meter(stems, CFG, manifest):
         }
 
     Also sets manifest["meter_key"]["tempo"] to the normalized tempo.
+
+    With meter_key.beat_window_s set, only that much audio is beat-tracked and
+    the beat grid is extended to the end of the song at the tracked period
+    (a constant-tempo assumption; used by the preview profile).
     """
     # Prefer original source audio
-    audio_path = manifest.get("source_audio")
+    audio_path = mix or manifest.get("source_audio")
 
     # Fallback: any available stem
     if not audio_path:
         for v in stems.values():
-            if isinstance(v, str):
+            if isinstance(v, (str, AudioArray)):
                 audio_path = v
                 break
 
@@ -88,7 +95,8 @@ def estimate_tempo_downbeats_meter(stems, CFG, manifest):
 
     # Load audio
     sr = CFG.get("sample_rate", DEFAULT_SR)
-    y, sr = librosa.load(audio_path, sr=sr, mono=True)
+    window = float((CFG.get("meter_key") or {}).get("beat_window_s") or 0.0)
+    y, sr = load_audio_mono(audio_path, sr=sr, duration=window or None)
 
     # Beat tracking in frames
     raw_tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr, units="frames")
@@ -97,6 +105,15 @@ def estimate_tempo_downbeats_meter(stems, CFG, manifest):
     # Beats -> times
     beat_times = librosa.frames_to_time(beat_frames, sr=sr)
 
+    if window and len(beat_times) >= 2:
+        try:
+            total = audio_duration(audio_path)
+        except Exception:
+            total = 0.0
+        if total > window:
+            period = float(np.median(np.diff(beat_times)))
+            beat_times = np.concatenate([beat_times, np.arange(beat_times[-1] + period, total, period)])
+
     # Naive 4/4: every 4th beat is a downbeat
     if len(beat_times) >= 4:
         downbeats = beat_times[::4].tolist()
@@ -118,6 +135,10 @@ def estimate_tempo_downbeats_meter(stems, CFG, manifest):
 
     mk = manifest.setdefault("meter_key", {})
     mk["tempo"] = float(norm_tempo)
+    mk["downbeats"] = info["downbeats"]
+    mk["meter"] = info["meter"]
+    if window:
+        mk["beat_window_s"] = window
 
     print(
         f"[beats_meter] raw_tempo={raw_tempo:.3f}, "
@@ -126,3 +147,22 @@ def estimate_tempo_downbeats_meter(stems, CFG, manifest):
     )
 
     return info
+
+
+def meter_info_from_manifest(manifest):
+    """
+    Rebuild the meter_info dict returned by estimate_tempo_downbeats_meter
+    from a saved manifest, so later stages can be re-run without audio.
+    """
+    mk = manifest.get("meter_key") or {}
+    meter = mk.get("meter") or {}
+    return {
+        "tempo": float(mk.get("tempo") or 120.0),
+        "downbeats": [float(t) for t in (mk.get("downbeats") or [])],
+        "meter": {
+            "numerator": int(meter.get("numerator", 4)),
+            "denominator": int(meter.get("denominator", 4)),
+            "confidence": float(meter.get("confidence", 0.0)),
+        },
+        "time_signature_written": bool(mk.get("time_signature_written", False)),
+    }
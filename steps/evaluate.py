@@ -0,0 +1,256 @@
+"""
+Speed/quality evaluation on synthesized ground truth.
+
+Known MIDI files are rendered to audio (utils.synth), the full pipeline runs on
+the renders under each preset in CFG["eval"]["presets"] (each preset is a set
+of config overrides: Demucs shifts/segment, Basic Pitch backend, analysis
+sample rate, activity gating, ...), and the output MIDI is scored against the
+source with mir_eval:
+
+  note_f1        pitched notes, onset + pitch (50 ms, 50 cents), offsets ignored
+  note_f1_off    same, also requiring offsets (mir_eval's default offset rule)
+  drum_onset_f1  drum hits, onset only (drum class ignored)
+  tempo_err      |est - ref| / ref, plus whether it is within 4% up to x2 / x0.5
+
+Every preset runs in its own fresh workspace so no caches leak between presets.
+"""
+import csv
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pretty_midi
+import soundfile as sf
+import mir_eval
+
+from utils.manifest import merge_config
+from utils.synth import render_instruments
+
+_ONSET_TOL_S = 0.05
+_TEMPO_TOL = 0.04
+
+
+def preset_config(CFG: dict, overrides: dict) -> dict:
+    """
+    Base config + preset overrides, with the settings that would make runs
+    non-comparable forced off (dedup would link renders to each other) and
+    shared caches made absolute so they survive the workspace chdir.
+    """
+    cfg = merge_config(CFG, overrides)
+    cfg.setdefault("dedup", {})["enabled"] = False
+    rcfg = cfg.setdefault("transcription", {}).setdefault("basic_pitch_runtime", {})
+    rcfg["autotune_cache_dir"] = os.path.abspath(rcfg.get("autotune_cache_dir", "data/cache"))
+    return cfg
+
+
+# ---------------------------------------------------------------------------
+# Ground truth
+# ---------------------------------------------------------------------------
+
+def _note_arrays(notes):
+    if not notes:
+        return np.zeros((0, 2)), np.zeros(0)
+    iv = np.array([[n.start, max(n.end, n.start + 1e-3)] for n in notes], dtype=np.float64)
+    hz = pretty_midi.note_number_to_hz(np.array([n.pitch for n in notes], dtype=np.float64))
+    return iv, hz
+
+
+def _split_notes(pm: pretty_midi.PrettyMIDI):
+    pitched, drums = [], []
+    for inst in pm.instruments:
+        (drums if inst.is_drum else pitched).extend(inst.notes)
+    pitched.sort(key=lambda n: (n.start, n.pitch))
+    drums.sort(key=lambda n: n.start)
+    return pitched, drums
+
+
+def load_reference(midi_path: str) -> dict:
+    pm = pretty_midi.PrettyMIDI(midi_path)
+    pitched, drums = _split_notes(pm)
+    _, tempi = pm.get_tempo_changes()
+    return {
+        "pitched": _note_arrays(pitched),
+        "drums": np.array([n.start for n in drums], dtype=np.float64),
+        "tempo": float(tempi[0]) if len(tempi) else None,
+        "duration": float(pm.get_end_time()),
+    }
+
+
+def render_reference(midi_path: str, out_path: str, sr: int = 44100) -> str:
+    """
+    Render `midi_path` to a mono wav (reused while newer than the MIDI).
+    """
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(midi_path):
+        return out_path
+    pm = pretty_midi.PrettyMIDI(midi_path)
+    mix, _ = render_instruments(pm.instruments, sr=sr)
+    peak = float(np.max(np.abs(mix))) if len(mix) else 0.0
+    if peak > 0:
+        mix = 0.5 * mix / peak
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    sf.write(out_path, mix, sr)
+    return out_path
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def _note_f1(ref, est, offset_ratio):
+    (ref_iv, ref_hz), (est_iv, est_hz) = ref, est
+    if not len(ref_iv) or not len(est_iv):
+        return 0.0 if len(ref_iv) or len(est_iv) else 1.0
+    _, _, f, _ = mir_eval.transcription.precision_recall_f1_overlap(
+        ref_iv, ref_hz, est_iv, est_hz,
+        onset_tolerance=_ONSET_TOL_S, pitch_tolerance=50.0, offset_ratio=offset_ratio,
+    )
+    return float(f)
+
+
+def _onset_f1(ref_onsets, est_onsets):
+    if not len(ref_onsets) or not len(est_onsets):
+        return 0.0 if len(ref_onsets) or len(est_onsets) else 1.0
+    f, _, _ = mir_eval.onset.f_measure(np.sort(ref_onsets), np.sort(est_onsets), window=_ONSET_TOL_S)
+    return float(f)
+
+
+def score(ref: dict, est_midi_path: str, manifest: dict) -> dict:
+    if est_midi_path and os.path.exists(est_midi_path):
+        pitched, drums = _split_notes(pretty_midi.PrettyMIDI(est_midi_path))
+    else:
+        pitched, drums = [], []
+    est_drums = np.array([n.start for n in drums], dtype=np.float64)
+
+    out = {
+        "note_f1": _note_f1(ref["pitched"], _note_arrays(pitched), offset_ratio=None),
+        "note_f1_off": _note_f1(ref["pitched"], _note_arrays(pitched), offset_ratio=0.2),
+        "drum_onset_f1": _onset_f1(ref["drums"], est_drums) if len(ref["drums"]) else None,
+        "tempo_err": None,
+        "tempo_ok": None,
+    }
+    est_tempo = (manifest.get("meter_key") or {}).get("tempo")
+    if ref["tempo"] and est_tempo:
+        ratio = float(est_tempo) / ref["tempo"]
+        out["tempo_err"] = abs(ratio - 1.0)
+        out["tempo_ok"] = any(abs(ratio / m - 1.0) <= _TEMPO_TOL for m in (0.5, 1.0, 2.0))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Matrix + Pareto table
+# ---------------------------------------------------------------------------
+
+def run_matrix(midi_files, presets: dict, CFG: dict, run_fn, out_dir: str = "data/eval"):
+    """
+    run_fn(audio_path, cfg) -> (out_mid, manifest_path) runs the pipeline with
+    `cfg` in the current directory. Returns one row per (preset, file).
+    """
+    out_dir = os.path.abspath(out_dir)
+    sr = int((CFG.get("eval") or {}).get("render_sr", 44100))
+    refs = {}
+    for midi_path in midi_files:
+        name = os.path.splitext(os.path.basename(midi_path))[0]
+        audio = render_reference(midi_path, os.path.join(out_dir, "audio", f"{name}.wav"), sr=sr)
+        refs[midi_path] = (audio, load_reference(midi_path))
+
+    rows = []
+    cwd = os.getcwd()
+    for preset, overrides in presets.items():
+        cfg = preset_config(CFG, overrides)
+        work = os.path.join(out_dir, "runs", preset)
+        shutil.rmtree(work, ignore_errors=True)
+        os.makedirs(work)
+        os.chdir(work)
+        try:
+            for midi_path, (audio, ref) in refs.items():
+                row = {"preset": preset, "file": os.path.basename(midi_path), "duration": ref["duration"]}
+                t0 = time.perf_counter()
+                try:
+                    out_mid, manifest_path = run_fn(audio, cfg)
+                    row["seconds"] = time.perf_counter() - t0
+                    with open(manifest_path, "r") as f:
+                        manifest = json.load(f)
+                    row.update(score(ref, out_mid, manifest))
+                    row["timings"] = manifest.get("timings") or {}
+                except Exception as e:
+                    row["seconds"] = time.perf_counter() - t0
+                    row["error"] = f"{type(e).__name__}: {e}"
+                    print(f"[evaluate] {preset} / {row['file']}: {row['error']}")
+                rows.append(row)
+                print(f"[evaluate] {preset} / {row['file']}: {row['seconds']:.1f}s "
+                      f"note_f1={row.get('note_f1', 0.0):.3f}")
+        finally:
+            os.chdir(cwd)
+    return rows
+
+
+def _mean(vals):
+    vals = [float(v) for v in vals if v is not None]
+    return sum(vals) / len(vals) if vals else None
+
+
+def summarize(rows):
+    """
+    One line per preset: mean quality metrics, runtime as seconds per audio
+    second (RTF), and whether the preset is on the speed/note-F1 Pareto front.
+    """
+    by_preset = {}
+    for r in rows:
+        by_preset.setdefault(r["preset"], []).append(r)
+
+    table = []
+    for preset, rs in by_preset.items():
+        ok = [r for r in rs if "error" not in r]
+        audio_s = sum(r["duration"] for r in rs) or 1.0
+        table.append({
+            "preset": preset,
+            "files": len(rs),
+            "errors": len(rs) - len(ok),
+            "rtf": sum(r["seconds"] for r in rs) / audio_s,
+            "note_f1": _mean(r.get("note_f1") for r in ok) or 0.0,
+            "note_f1_off": _mean(r.get("note_f1_off") for r in ok),
+            "drum_onset_f1": _mean(r.get("drum_onset_f1") for r in ok),
+            "tempo_err": _mean(r.get("tempo_err") for r in ok),
+            "tempo_ok": _mean(r.get("tempo_ok") for r in ok),
+        })
+
+    for row in table:
+        row["pareto"] = not any(
+            o["rtf"] <= row["rtf"] and o["note_f1"] >= row["note_f1"]
+            and (o["rtf"] < row["rtf"] or o["note_f1"] > row["note_f1"])
+            for o in table
+        )
+    table.sort(key=lambda r: r["rtf"])
+    return table
+
+
+_COLUMNS = ("preset", "rtf", "note_f1", "note_f1_off", "drum_onset_f1", "tempo_err", "tempo_ok", "errors", "pareto")
+
+
+def format_table(table) -> str:
+    def cell(v):
+        if v is None:
+            return "-"
+        if isinstance(v, bool):
+            return "*" if v else ""
+        if isinstance(v, float):
+            return f"{v:.3f}"
+        return str(v)
+
+    lines = [[c for c in _COLUMNS]] + [[cell(r.get(c)) for c in _COLUMNS] for r in table]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(_COLUMNS))]
+    return "\n".join("  ".join(v.ljust(w) for v, w in zip(line, widths)) for line in lines)
+
+
+def write_report(rows, table, out_dir: str = "data/eval"):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "results.json"), "w") as f:
+        json.dump({"runs": rows, "summary": table, "created_at": time.time()}, f, indent=2, default=float)
+    csv_path = os.path.join(out_dir, "pareto.csv")
+    with open(csv_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(_COLUMNS) + ["files"], extrasaction="ignore")
+        w.writeheader()
+        w.writerows(table)
+    return csv_path
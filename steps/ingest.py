@@ -0,0 +1,111 @@
+import os
+import shutil
+
+from utils.content_index import ContentIndex, audio_fingerprint, file_hash
+from utils.manifest import read_manifest
+
+# Manifest sections that describe a finished run and can be shared by exact duplicates.
+_LINKED_SECTIONS = ["separation", "meter_key", "transcription", "assignment", "key", "cleanup"]
+
+
+def _index_from_cfg(CFG):
+    dcfg = CFG.get("dedup", {})
+    return ContentIndex(dcfg.get("index_dir", "data/index"))
+
+
+def check_duplicates(audio_path: str, sid: str, CFG: dict, manifest: dict):
+    """
+    Hash + fingerprint the source before separation and register it in the
+    content index.
+
+    Records under manifest["ingest"]:
+      - hash / duration
+      - duplicate_of:       song with byte-identical audio (if any)
+      - near_duplicates:    [(song_id, similarity)] from the coarse fingerprint
+      - id_collision:       another file already uses this song ID
+
+    Returns the song ID whose finished outputs can be linked instead of
+    recomputed, or None.
+    """
+    dcfg = CFG.get("dedup", {})
+    if not dcfg.get("enabled", True):
+        return None
+
+    index = _index_from_cfg(CFG)
+    digest = file_hash(audio_path)
+    ingest = manifest["ingest"] = {}
+    ingest["hash"] = digest
+
+    # ID collision: same song ID, different content from a different file.
+    prev = index.lookup_song(sid)
+    if prev and prev.get("hash") != digest and os.path.abspath(prev.get("source_audio", "")) != os.path.abspath(audio_path):
+        ingest["id_collision"] = {
+            "previous_source": prev.get("source_audio"),
+            "previous_hash": prev.get("hash"),
+        }
+        print(
+            f"[ingest] WARNING: song ID '{sid}' collides: {audio_path} vs {prev.get('source_audio')} "
+            f"(outputs will overwrite each other)"
+        )
+
+    owner = index.lookup_hash(digest)
+    if owner and owner["song_id"] == sid:
+        # re-run of a file we've already indexed
+        ingest["duration"] = owner.get("duration")
+        return None
+    if owner:
+        orig = owner["song_id"]
+        ingest["duplicate_of"] = orig
+        ingest["duration"] = owner.get("duration")
+        index.register(digest, sid, audio_path, owner.get("duration"))
+        orig_manifest = read_manifest(f"manifests/{orig}.json")
+        orig_mid = (orig_manifest.get("output") or {}).get("midi")
+        if orig_mid and os.path.exists(orig_mid):
+            print(f"[ingest] {audio_path} is identical to '{orig}'; linking outputs")
+            return orig
+        print(f"[ingest] {audio_path} is identical to '{orig}', but '{orig}' has no finished output yet")
+        return None
+
+    fp, duration = audio_fingerprint(audio_path, sr=int(dcfg.get("fingerprint_sr", 8000)))
+    ingest["duration"] = duration
+    index.save_fingerprint(digest, fp)
+    near = index.near_duplicates(
+        digest, fp, duration, threshold=float(dcfg.get("near_dup_threshold", 0.85))
+    )
+    near = [(s, round(sim, 3)) for s, sim in near if s != sid]
+    if near:
+        ingest["near_duplicates"] = near
+        print(f"[ingest] {audio_path} closely matches: {near}")
+    index.register(digest, sid, audio_path, duration)
+    return None
+
+
+def _link_or_copy(src: str, dst: str):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def link_duplicate_outputs(orig_sid: str, out_mid: str, manifest: dict, normalize_key: bool = False):
+    """
+    Reuse a finished run of `orig_sid`: copy its result sections (stem paths
+    keep pointing at the original's stems) and hard-link its MIDI to `out_mid`.
+    The MIDI is only linked if it was written with the same `normalize_key`;
+    otherwise returns None and the caller re-runs steps 4-8 from the notes.
+    """
+    orig = read_manifest(f"manifests/{orig_sid}.json")
+    for section in _LINKED_SECTIONS:
+        if section in orig:
+            manifest[section] = orig[section]
+    if bool((orig.get("key") or {}).get("normalized")) != bool(normalize_key):
+        manifest["ingest"]["linked"] = False
+        return None
+
+    os.makedirs(os.path.dirname(out_mid), exist_ok=True)
+    _link_or_copy(orig["output"]["midi"], out_mid)
+    manifest.setdefault("output", {})["midi"] = out_mid
+    manifest["ingest"]["linked"] = True
+    return out_mid
@@ -1,7 +1,6 @@
 import math
 
 import pretty_midi
-from music21 import stream, note, chord, analysis
 
 MAJOR_LIKE = {"major", "ionian", "maj"}
 MINOR_LIKE = {"minor", "aeolian", "min"}
@@ -26,10 +25,13 @@ def _collect_pitches(instruments):
 def _detect_key_music21(pitches):
     """
     Use music21's key analyzer on a synthetic stream built
-    from our MIDI pitches. Returns (tonic_str, mode_str) or (None, None).
+    from our MIDI pitches. Returns (tonic_str, mode_str, correlation) or
+    (None, None, None).
     """
     if not pitches:
-        return None, None
+        return None, None, None
+
+    from music21 import stream, note
 
     s = stream.Stream()
     # Use dummy quarter notes at pitch classes; we only care about distribution.
@@ -40,17 +42,19 @@ def _detect_key_music21(pitches):
             continue
 
     if len(s.notes) < 4:
-        return None, None
+        return None, None, None
 
     try:
         k = s.analyze("KrumhanslSchmuckler")  # standard profile-based key finder
     except Exception:
-        return None, None
+        return None, None, None
 
     tonic = (k.tonic.name if hasattr(k, "tonic") else None)
     mode = (k.mode.lower() if hasattr(k, "mode") and k.mode else None)
 
-    return tonic, mode
+    corr = getattr(k, "correlationCoefficient", None)
+
+    return tonic, mode, corr
 
 
 def _compute_transpose_semitones(tonic, mode):
@@ -149,6 +153,22 @@ def _transpose_instruments(instruments, semitones):
     return out
 
 
+def detect_key(instruments, manifest):
+    """
+    Detect the global key of the pitched tracks and record it under
+    manifest['key'] (detected_tonic, detected_mode, confidence), whether or
+    not the song is then normalized. Returns (tonic, mode).
+    """
+    pitches = _collect_pitches(instruments)
+    tonic, mode, corr = _detect_key_music21(pitches)
+
+    key_info = manifest.setdefault("key", {})
+    key_info["detected_tonic"] = tonic
+    key_info["detected_mode"] = mode
+    key_info["confidence"] = None if corr is None else round(float(corr), 4)
+    return tonic, mode
+
+
 def detect_and_normalize_key(assigned_instruments, CFG, manifest):
     """
     1. Detect global key from current assigned instruments (ignoring drums).
@@ -158,12 +178,8 @@ def detect_and_normalize_key(assigned_instruments, CFG, manifest):
     3. Update manifest['key'] with detection + transpose info.
     4. Return the (possibly) transposed instruments dict.
     """
-    pitches = _collect_pitches(assigned_instruments)
-    tonic, mode = _detect_key_music21(pitches)
-
-    key_info = manifest.setdefault("key", {})
-    key_info["detected_tonic"] = tonic
-    key_info["detected_mode"] = mode
+    tonic, mode = detect_key(assigned_instruments, manifest)
+    key_info = manifest["key"]
 
     semitones, target = _compute_transpose_semitones(tonic, mode)
 
@@ -1,3 +1,458 @@
-def review_pending_items():
-    # Stub: In a real app, launch a Gradio/Flask UI to A/B key/meter/vocal choices.
-    print("[QC] No UI wired yet. This stub is a placeholder for quick human-in-the-loop checks.")
+"""
+Quick human-in-the-loop review: A/B each track's transcription against its stem.
+
+  - queue:  songs whose meter or key confidence is below meter_key.*_threshold,
+            most doubtful first (a heap over the manifests), minus songs already
+            reviewed since their MIDI was last written.
+  - render: each track of the final MIDI through utils/synth.py (NumPy voices,
+            no FluidSynth), transposition undone so it lines up with the stem.
+            Renders are cached as .npy under qc.cache_dir, keyed by a hash of
+            the note data, so a track is rendered once until its notes change;
+            clips are then slices of a memory-mapped file.
+  - clips:  stem and render cut from the same window at qc.sr, level-matched,
+            as stereo A/B (stem left, render right), back-to-back, or alone.
+
+`python pipeline.py review-pending` lists the queue; --serve starts a small
+local web page that plays the clips and records ok/fix per song in the
+manifest (manifest["review"]); --export writes the clips as WAV files.
+"""
+import glob
+import hashlib
+import heapq
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pretty_midi
+import soundfile as sf
+
+from utils.manifest import read_manifest, write_manifest
+from utils.synth import _as_note_array, render_notes, track_names
+
+# bump when utils/synth.py changes how notes sound, to invalidate cached renders
+RENDER_VERSION = 1
+MODES = ("ab", "seq", "stem", "render")
+
+# final MIDI track -> stem it was transcribed from
+TRACK_STEM = {
+    "drums": "drums",
+    "voxlead": "vocals",
+    "voxbg": "vocals",
+    "bass": "bass",
+    "guitar": "guitar",
+    "keys": "other",
+    "other": "other",
+}
+
+
+def _qcfg(CFG: dict) -> dict:
+    return CFG.get("qc") or {}
+
+
+# ----------------------------------------------------------------------
+# queue
+# ----------------------------------------------------------------------
+def review_reasons(manifest: dict, CFG: dict):
+    """
+    ([reason strings], priority) for a song; priority 0 = nothing to review.
+    Each confidence below its threshold adds its relative shortfall.
+    """
+    mk_cfg = CFG.get("meter_key") or {}
+    reasons, score = [], 0.0
+    meter = (manifest.get("meter_key") or {}).get("meter") or {}
+    m_thr = float(mk_cfg.get("meter_conf_threshold", 0.58))
+    m_conf = meter.get("confidence")
+    if m_conf is not None and float(m_conf) < m_thr:
+        reasons.append(f"meter {meter.get('numerator', '?')}/{meter.get('denominator', '?')} conf {float(m_conf):.2f}")
+        score += (m_thr - float(m_conf)) / m_thr
+    key = manifest.get("key") or {}
+    k_thr = float(mk_cfg.get("key_conf_threshold", 0.55))
+    k_conf = key.get("confidence")
+    if k_conf is not None and float(k_conf) < k_thr:
+        name = " ".join(str(p) for p in (key.get("detected_tonic"), key.get("detected_mode")) if p) or "?"
+        reasons.append(f"key {name} conf {float(k_conf):.2f}")
+        score += (k_thr - float(k_conf)) / k_thr
+    return reasons, round(score, 4)
+
+
+def _reviewed(manifest: dict) -> bool:
+    review = manifest.get("review") or {}
+    mid = (manifest.get("output") or {}).get("midi")
+    if not review.get("status") or not mid or not os.path.exists(mid):
+        return False
+    return review.get("at", 0) >= os.path.getmtime(mid)
+
+
+def build_queue(CFG: dict, pattern: str = "manifests/*.json", include_reviewed: bool = False) -> list:
+    """
+    Songs to review, highest priority first:
+        [{"song_id", "manifest", "priority", "reasons", "midi", "tracks"}]
+    """
+    heap = []
+    for manifest_path in glob.glob(pattern):
+        m = read_manifest(manifest_path)
+        mid = (m.get("output") or {}).get("midi")
+        if not mid or not os.path.exists(mid):
+            continue
+        reasons, score = review_reasons(m, CFG)
+        if not score or (_reviewed(m) and not include_reviewed):
+            continue
+        sid = m.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+        item = {
+            "song_id": sid,
+            "manifest": manifest_path,
+            "priority": score,
+            "reasons": reasons,
+            "midi": mid,
+            "tracks": (m.get("assignment") or {}).get("tracks") or [],
+        }
+        heapq.heappush(heap, (-score, sid, item))
+    return [heapq.heappop(heap)[2] for _ in range(len(heap))]
+
+
+def mark_reviewed(manifest_path: str, status: str, note: str = None) -> dict:
+    """
+    Record a reviewer's verdict; the song leaves the queue until its MIDI is rewritten.
+    """
+    manifest = read_manifest(manifest_path)
+    if not manifest:
+        raise FileNotFoundError(manifest_path)
+    manifest["review"] = {"status": status, "note": note, "at": time.time()}
+    write_manifest(manifest_path, manifest)
+    return manifest["review"]
+
+
+# ----------------------------------------------------------------------
+# renders
+# ----------------------------------------------------------------------
+def _track_notes(midi_path: str, transpose: int = 0) -> dict:
+    """
+    {track: (notes [N, 4], is_drum)} from the final MIDI, pitched tracks
+    shifted back by the key normalization's `transpose` semitones. A repeated
+    track name gets a -2, -3, ... suffix (see synth.track_names).
+    """
+    pm = pretty_midi.PrettyMIDI(midi_path)
+    out = {}
+    for name, inst in zip(track_names(pm.instruments), pm.instruments):
+        arr = _as_note_array(inst.notes)
+        if transpose and not inst.is_drum:
+            arr[:, 2] = np.clip(arr[:, 2] - transpose, 0, 127)
+        out[name] = (arr, bool(inst.is_drum))
+    return out
+
+
+def render_key(notes, is_drum: bool, sr: int) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((RENDER_VERSION, bool(is_drum), int(sr))).encode("utf-8"))
+    h.update(np.ascontiguousarray(notes, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def cached_render(notes, is_drum: bool, CFG: dict):
+    """
+    The render of `notes` at qc.sr as a read-only memory-mapped array,
+    rendered and stored on first use.
+    """
+    qcfg = _qcfg(CFG)
+    sr = int(qcfg.get("sr", 22050))
+    cache_dir = qcfg.get("cache_dir", "data/review/renders")
+    path = os.path.join(cache_dir, render_key(notes, is_drum, sr) + ".npy")
+    if os.path.exists(path):
+        os.utime(path)  # last use, for prune_renders
+        return np.load(path, mmap_mode="r")
+    y = render_notes(notes, sr=sr, is_drum=is_drum)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.partial.npy"
+    np.save(tmp, y.astype(np.float32), allow_pickle=False)
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r")
+
+
+def prune_renders(CFG: dict) -> int:
+    """
+    Delete least recently used renders beyond qc.cache_max_mb. Returns the number removed.
+    """
+    qcfg = _qcfg(CFG)
+    cache_dir = qcfg.get("cache_dir", "data/review/renders")
+    max_bytes = float(qcfg.get("cache_max_mb", 4096)) * 1e6
+    if not max_bytes or not os.path.isdir(cache_dir):
+        return 0
+    entries = sorted(
+        (e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(cache_dir) if e.name.endswith(".npy")
+    )
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+class SongReview:
+    """
+    One queued song: its tracks' notes, stems and cached renders.
+    """
+
+    def __init__(self, item: dict, CFG: dict):
+        self.item = item
+        self.CFG = CFG
+        self.sr = int(_qcfg(CFG).get("sr", 22050))
+        self.manifest = read_manifest(item["manifest"])
+        transpose = int((self.manifest.get("key") or {}).get("transpose_semitones") or 0)
+        self.notes = _track_notes(item["midi"], transpose)
+        self._stems = None
+
+    @property
+    def tracks(self) -> list:
+        return [t for t, (arr, _) in self.notes.items() if len(arr)]
+
+    def stems(self) -> dict:
+        if self._stems is None:
+            # evicted stems are regenerated here, not at queue-building time
+            from steps.separate import ensure_stems
+            self._stems = ensure_stems(self.manifest, self.CFG) or {}
+        return self._stems
+
+    def render(self, track: str):
+        arr, is_drum = self.notes[track]
+        return cached_render(arr, is_drum, self.CFG)
+
+    def busiest_start(self, track: str, clip_s: float) -> float:
+        """
+        Start of the `clip_s` window holding the most note onsets of `track`.
+        """
+        onsets = self.notes[track][0][:, 0]
+        if not len(onsets):
+            return 0.0
+        counts = np.histogram(onsets, bins=np.arange(0.0, onsets.max() + 1.0, 1.0))[0]
+        width = max(1, int(round(clip_s)))
+        if len(counts) <= width:
+            return 0.0
+        return float(np.argmax(np.convolve(counts, np.ones(width), mode="valid")))
+
+    def stem_clip(self, track: str, start_s: float, clip_s: float):
+        base = track if track in TRACK_STEM else track.rsplit("-", 1)[0]
+        path = self.stems().get(TRACK_STEM.get(base, "other"))
+        n_out = int(round(clip_s * self.sr))
+        if not path or not os.path.exists(path):
+            return np.zeros(n_out, dtype=np.float32)
+        info = sf.info(path)
+        y, _ = sf.read(
+            path, start=int(start_s * info.samplerate), frames=int(np.ceil(clip_s * info.samplerate)),
+            dtype="float32", always_2d=True,
+        )
+        y = y.mean(axis=1)
+        if info.samplerate != self.sr and len(y):
+            import librosa
+            y = librosa.resample(y, orig_sr=info.samplerate, target_sr=self.sr)
+        return _fit(y, n_out)
+
+    def clip(self, track: str, start_s=None, clip_s=None, mode: str = "ab"):
+        """
+        (audio, sr) for `track`: float32 mono, or [n, 2] for mode "ab".
+        """
+        if mode not in MODES:
+            raise ValueError(f"unknown clip mode {mode!r} (expected one of {', '.join(MODES)})")
+        clip_s = float(clip_s or _qcfg(self.CFG).get("clip_s", 12))
+        if start_s is None:
+            start_s = self.busiest_start(track, clip_s)
+        start_s = max(0.0, float(start_s))
+        n = int(round(clip_s * self.sr))
+        a = int(round(start_s * self.sr))
+
+        render = _fit(np.asarray(self.render(track)[a: a + n], dtype=np.float32), n) if mode != "stem" else None
+        stem = self.stem_clip(track, start_s, clip_s) if mode != "render" else None
+        if render is not None:
+            ref = _rms(stem) if stem is not None and _rms(stem) > 1e-4 else 0.1
+            render = render * (ref / max(_rms(render), 1e-6))
+        if mode == "stem":
+            out = stem
+        elif mode == "render":
+            out = render
+        elif mode == "seq":
+            out = np.concatenate([stem, np.zeros(self.sr // 2, dtype=np.float32), render])
+        else:
+            out = np.stack([stem, render], axis=1)
+        peak = float(np.abs(out).max()) if out.size else 0.0
+        if peak > 0.99:
+            out = out * (0.99 / peak)
+        return out.astype(np.float32), self.sr
+
+
+def _fit(y, n: int):
+    if len(y) >= n:
+        return y[:n]
+    return np.pad(y, (0, n - len(y)))
+
+
+def _rms(y) -> float:
+    return float(np.sqrt(np.mean(np.square(y)))) if y is not None and len(y) else 0.0
+
+
+def wav_bytes(y, sr: int) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def prerender(queue: list, CFG: dict, limit: int = None) -> int:
+    """
+    Render (or find cached) every track of the first `limit` queued songs.
+    Returns the number of tracks rendered or found.
+    """
+    n = 0
+    for item in queue[:limit]:
+        try:
+            review = SongReview(item, CFG)
+            for track in review.tracks:
+                review.render(track)
+                n += 1
+        except Exception as e:
+            print(f"[QC] {item['song_id']}: render failed: {e}")
+    prune_renders(CFG)
+    return n
+
+
+def export_clips(queue: list, CFG: dict, out_dir: str, limit: int = None, mode: str = "ab") -> int:
+    """
+    Write one clip per track of the first `limit` queued songs to
+    <out_dir>/<sid>/<track>.<mode>.wav. Returns the number written.
+    """
+    n = 0
+    for item in queue[:limit]:
+        try:
+            review = SongReview(item, CFG)
+            song_dir = os.path.join(out_dir, item["song_id"])
+            os.makedirs(song_dir, exist_ok=True)
+            for track in review.tracks:
+                y, sr = review.clip(track, mode=mode)
+                sf.write(os.path.join(song_dir, f"{track}.{mode}.wav"), y, sr, subtype="PCM_16")
+                n += 1
+        except Exception as e:
+            print(f"[QC] {item['song_id']}: export failed: {e}")
+    prune_renders(CFG)
+    return n
+
+
+# ----------------------------------------------------------------------
+# review page
+# ----------------------------------------------------------------------
+_PAGE = """<!doctype html><meta charset="utf-8"><title>review-pending</title>
+<style>body{font:14px sans-serif;margin:2em}li{margin:.8em 0}audio{height:28px;vertical-align:middle}
+.tr{display:inline-block;margin-right:1em}</style>
+<h3>Review queue (A/B: stem left, render right)</h3><ol id="q"></ol>
+<script>
+async function mark(sid, st, li){await fetch('/mark?song='+encodeURIComponent(sid)+'&status='+st,{method:'POST'});li.remove();}
+fetch('/queue').then(r=>r.json()).then(items=>{const q=document.getElementById('q');
+for(const it of items){const li=document.createElement('li');
+li.innerHTML='<b>'+it.song_id+'</b> '+it.reasons.join('; ')+' ';
+for(const t of it.tracks){const s=document.createElement('span');s.className='tr';
+s.innerHTML=t+' <audio controls preload="none" src="/clip?song='+encodeURIComponent(it.song_id)+'&track='+t+'&mode=ab"></audio>';
+li.appendChild(s);}
+for(const st of ['ok','fix']){const b=document.createElement('button');b.textContent=st;b.onclick=()=>mark(it.song_id,st,li);li.appendChild(b);}
+q.appendChild(li);}});
+</script>"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "review-pending"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code: int, body: bytes, ctype: str):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _review(self, sid: str):
+        app = self.server.app
+        with app["lock"]:
+            if sid not in app["reviews"]:
+                item = next((it for it in app["queue"] if it["song_id"] == sid), None)
+                if item is None:
+                    return None
+                app["reviews"][sid] = SongReview(item, app["CFG"])
+            return app["reviews"][sid]
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        app = self.server.app
+        try:
+            if url.path == "/":
+                return self._send(200, _PAGE.encode("utf-8"), "text/html; charset=utf-8")
+            if url.path == "/queue":
+                items = [{k: it[k] for k in ("song_id", "priority", "reasons", "tracks")} for it in app["queue"]]
+                return self._send(200, json.dumps(items).encode("utf-8"), "application/json")
+            if url.path == "/clip":
+                review = self._review(q.get("song", ""))
+                if review is None or q.get("track") not in review.notes:
+                    return self._send(404, b"unknown song or track", "text/plain")
+                start = float(q["start"]) if q.get("start") else None
+                y, sr = review.clip(q["track"], start_s=start, clip_s=q.get("dur"), mode=q.get("mode", "ab"))
+                return self._send(200, wav_bytes(y, sr), "audio/wav")
+            return self._send(404, b"not found", "text/plain")
+        except Exception as e:
+            return self._send(500, str(e).encode("utf-8"), "text/plain")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        app = self.server.app
+        if url.path != "/mark":
+            return self._send(404, b"not found", "text/plain")
+        item = next((it for it in app["queue"] if it["song_id"] == q.get("song")), None)
+        if item is None:
+            return self._send(404, b"unknown song", "text/plain")
+        mark_reviewed(item["manifest"], q.get("status", "ok"), q.get("note"))
+        with app["lock"]:
+            app["queue"] = [it for it in app["queue"] if it is not item]
+            app["reviews"].pop(item["song_id"], None)
+        print(f"[QC] {item['song_id']}: {q.get('status', 'ok')}")
+        return self._send(200, b"ok", "text/plain")
+
+
+def serve(queue: list, CFG: dict, port: int = None, host: str = "127.0.0.1"):
+    """
+    Serve the review page until interrupted. Upcoming songs are rendered in
+    the background so clips are ready when the reviewer gets to them.
+    """
+    port = int(port or _qcfg(CFG).get("port", 8765))
+    httpd = ThreadingHTTPServer((host, port), _Handler)
+    httpd.app = {"queue": list(queue), "CFG": CFG, "reviews": {}, "lock": threading.Lock()}
+    threading.Thread(
+        target=prerender, args=(queue, CFG, _qcfg(CFG).get("prerender", 20)), daemon=True
+    ).start()
+    print(f"[QC] {len(queue)} song(s) to review at http://{host}:{port}/  (Ctrl-C to stop)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def review_pending_items(CFG: dict, pattern: str = "manifests/*.json", limit: int = None):
+    """
+    Print the review queue; returns it.
+    """
+    queue = build_queue(CFG, pattern)
+    if not queue:
+        print("[QC] Nothing pending review.")
+        return queue
+    for i, item in enumerate(queue[:limit], 1):
+        print(f"[QC] {i:3d}. {item['song_id']}  priority {item['priority']:.2f}  ({'; '.join(item['reasons'])})")
+    if limit and len(queue) > limit:
+        print(f"[QC] ... and {len(queue) - limit} more")
+    return queue
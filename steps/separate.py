@@ -1,3 +1,5 @@
+import math
+import os
 import subprocess
 from pathlib import Path
 
@@ -5,6 +7,11 @@ import numpy as np
 import soundfile as sf
 
 from utils.manifest import song_id_from_path
+from utils.audio_utils import AudioArray
+from utils.stem_store import StemStore, stem_file, has_stems
+
+# Demucs models loaded in this process (in-memory/streaming runs reuse them)
+_DEMUCS_MODELS = {}
 
 
 def _merge_audio(a_path, b_path, out_path):
@@ -43,6 +50,239 @@ def _merge_audio(a_path, b_path, out_path):
     return str(out_path)
 
 
+def _is_fresh(out_path, *inputs):
+    if not os.path.exists(out_path):
+        return False
+    mtime = os.path.getmtime(out_path)
+    return all(os.path.getmtime(p) <= mtime for p in inputs if p)
+
+
+def _mono_stats(audio_path, block=1 << 20):
+    """
+    Mean/std of the mono downmix, streamed (Demucs normalizes by these).
+    """
+    n = 0
+    s1 = 0.0
+    s2 = 0.0
+    for y in sf.blocks(audio_path, blocksize=block, always_2d=True, dtype="float32"):
+        m = y.mean(axis=1).astype(np.float64)
+        n += m.size
+        s1 += float(m.sum())
+        s2 += float(np.dot(m, m))
+    if n == 0:
+        return 0.0, 1.0
+    mean = s1 / n
+    std = math.sqrt(max(s2 / n - mean * mean, 0.0))
+    return mean, (std if std > 1e-8 else 1.0)
+
+
+def _load_demucs(model_name: str):
+    from demucs.pretrained import get_model
+
+    if model_name not in _DEMUCS_MODELS:
+        model = get_model(model_name)
+        model.cpu()
+        model.eval()
+        _DEMUCS_MODELS[model_name] = model
+    return _DEMUCS_MODELS[model_name]
+
+
+def _separate_streaming(audio_path: str, song_out_dir: Path, model_name: str, sep_cfg: dict):
+    """
+    Bounded-memory Demucs: run the model on overlapping chunks of the input,
+    linearly cross-fade the overlaps, and append every stem (plus the merged
+    other+piano stem) to disk as we go. Peak memory depends on chunk_s, not on
+    the input length.
+
+    Stems are 16-bit WAVs (clipped, like Demucs' CLI with --clip-mode clamp);
+    other_merged.wav is float, and is rescaled after the last chunk if its
+    peak is above 1.0, the same as _merge_audio().
+    """
+    import torch as th
+    from demucs.apply import apply_model
+    from demucs.audio import convert_audio
+
+    model = _load_demucs(model_name)
+    sr = int(model.samplerate)
+    channels = int(model.audio_channels)
+
+    info = sf.info(audio_path)
+    sr_in = int(info.samplerate)
+    n_in = int(info.frames)
+
+    # keep chunk/overlap lengths on whole resampling periods so outputs line up exactly
+    q = sr_in // math.gcd(sr_in, sr)
+    overlap_in = max(q, int(float(sep_cfg.get("overlap_s", 5.0)) * sr_in) // q * q)
+    chunk_in = max(2 * overlap_in, int(float(sep_cfg.get("chunk_s", 60.0)) * sr_in) // q * q)
+    overlap_out = overlap_in * sr // sr_in
+
+    mean, std = _mono_stats(audio_path)
+    fade = np.linspace(0.0, 1.0, overlap_out, dtype=np.float32)
+
+    song_out_dir.mkdir(parents=True, exist_ok=True)
+    partial = {}
+    writers = {}
+    for name in model.sources:
+        partial[name] = song_out_dir / f"{name}.wav.partial"
+        writers[name] = sf.SoundFile(
+            str(partial[name]), "w", samplerate=sr, channels=channels, format="WAV", subtype="PCM_16"
+        )
+    merge_names = [n for n in ("other", "piano") if n in model.sources]
+    partial["other_merged"] = song_out_dir / "other_merged.wav.partial"
+    merged = sf.SoundFile(
+        str(partial["other_merged"]), "w", samplerate=sr, channels=1, format="WAV", subtype="FLOAT"
+    )
+
+    merged_peak = [0.0]
+
+    def emit(y):
+        # y: (sources, channels, samples)
+        for i, name in enumerate(model.sources):
+            writers[name].write(np.clip(y[i].T, -1.0, 1.0))
+        if merge_names:
+            idx = [model.sources.index(n) for n in merge_names]
+            mix = y[idx].sum(axis=0).mean(axis=0)
+            if mix.size:
+                merged_peak[0] = max(merged_peak[0], float(np.max(np.abs(mix))))
+            merged.write(mix)
+
+    try:
+        tail = None
+        start = 0
+        n_chunks = 0
+        while True:
+            stop = min(n_in, start + chunk_in)
+            x, _ = sf.read(audio_path, start=start, stop=stop, dtype="float32", always_2d=True)
+            wav = convert_audio(th.from_numpy(x.T.copy()), sr_in, sr, channels)
+            wav = (wav - mean) / std
+            with th.no_grad():
+                y = apply_model(
+                    model,
+                    wav[None],
+                    shifts=int(sep_cfg.get("shifts", 1)),
+                    split=True,
+                    overlap=float(sep_cfg.get("segment_overlap", 0.25)),
+                    device=sep_cfg.get("device", "cpu"),
+                    segment=sep_cfg.get("segment"),
+                )[0]
+            y = (y * std + mean).numpy()
+            n_chunks += 1
+
+            if tail is not None:
+                ov = min(tail.shape[-1], y.shape[-1])
+                y[..., :ov] = tail[..., :ov] * (1.0 - fade[:ov]) + y[..., :ov] * fade[:ov]
+
+            if stop >= n_in:
+                emit(y)
+                break
+            emit(y[..., :-overlap_out])
+            tail = y[..., -overlap_out:].copy()
+            start = stop - overlap_in
+    finally:
+        for w in writers.values():
+            w.close()
+        merged.close()
+
+    if merged_peak[0] > 1.0:
+        # the peak is only known once every chunk is written: rescale in place
+        _scale_wav(partial["other_merged"], 1.0 / merged_peak[0])
+
+    for name, p in partial.items():
+        os.replace(p, song_out_dir / f"{name}.wav")
+    print(f"[separate] Streamed {n_chunks} chunk(s) of {chunk_in / sr_in:.0f}s into {song_out_dir}")
+    return n_chunks
+
+
+def _scale_wav(path, gain, block=1 << 20):
+    """
+    Multiply a float WAV by `gain` in place, `block` frames at a time.
+    """
+    with sf.SoundFile(str(path), "r+") as f:
+        pos = 0
+        while pos < f.frames:
+            f.seek(pos)
+            x = f.read(block, dtype="float32")
+            f.seek(pos)
+            f.write(x * gain)
+            pos += len(x)
+
+
+def _merge_arrays(a, b, name="other"):
+    """
+    In-memory twin of _merge_audio(): mono sum, rescaled only if it would clip.
+    """
+    if a is None or b is None:
+        return a if a is not None else b
+    ya, yb = a.mono(), b.mono()
+    L = max(len(ya), len(yb))
+    mix = np.pad(ya, (0, L - len(ya))) + np.pad(yb, (0, L - len(yb)))
+    maxv = float(np.max(np.abs(mix))) if mix.size else 0.0
+    if maxv > 1.0:
+        mix = mix / maxv
+    return AudioArray(mix, a.sr, name=name)
+
+
+def separate_in_memory(audio: AudioArray, CFG: dict, manifest: dict):
+    """
+    Demucs on an in-memory mix. Returns the same 5-stem layout as
+    separate_track(), with AudioArray values instead of paths; nothing is
+    written to disk. The model stays loaded for the next call.
+    """
+    import torch as th
+    from demucs.apply import apply_model
+    from demucs.audio import convert_audio
+
+    sep_cfg = CFG.get("separation", {})
+    model_name = sep_cfg.get("demucs_model", "htdemucs_6s")
+    model = _load_demucs(model_name)
+    sr = int(model.samplerate)
+
+    x = audio.y if audio.y.ndim == 2 else audio.y[None]
+    wav = convert_audio(th.from_numpy(np.ascontiguousarray(x)), audio.sr, sr, int(model.audio_channels))
+    ref = wav.mean(0)
+    mean, std = float(ref.mean()), float(ref.std())
+    std = std if std > 1e-8 else 1.0
+    with th.no_grad():
+        y = apply_model(
+            model,
+            ((wav - mean) / std)[None],
+            shifts=int(sep_cfg.get("shifts", 1)),
+            split=True,
+            overlap=float(sep_cfg.get("segment_overlap", 0.25)),
+            device=sep_cfg.get("device", "cpu"),
+            segment=sep_cfg.get("segment"),
+        )[0]
+    y = (y * std + mean).numpy()
+
+    raw = {name: AudioArray(np.clip(y[i], -1.0, 1.0), sr, name=name) for i, name in enumerate(model.sources)}
+    stems = {
+        "vocals": raw.get("vocals"),
+        "drums": raw.get("drums"),
+        "bass": raw.get("bass"),
+        "guitar": raw.get("guitar"),
+        # piano folded into other, as in separate_track()
+        "other": _merge_arrays(raw.get("other"), raw.get("piano")),
+    }
+
+    manifest.setdefault("separation", {})
+    manifest["separation"]["model"] = model_name
+    manifest["separation"].pop("stems", None)  # no paths: the stems only live in memory
+    manifest["separation"]["in_memory"] = sorted(k for k, v in stems.items() if v is not None)
+    print(f"[separate] in-memory 5-stem view: {manifest['separation']['in_memory']}")
+    return stems
+
+
+def _use_streaming(audio_path: str, sep_cfg: dict) -> bool:
+    mode = sep_cfg.get("streaming", "auto")
+    if mode is True or mode is False:
+        return mode
+    try:
+        duration = sf.info(audio_path).duration
+    except Exception:
+        return False
+    return duration >= float(sep_cfg.get("streaming_min_s", 900))
+
+
 def separate_track(audio_path: str, CFG: dict, manifest: dict):
     """
     Use Demucs 6-stem under the hood, but expose a 5-stem layout:
@@ -55,16 +295,22 @@ def separate_track(audio_path: str, CFG: dict, manifest: dict):
     """
     sid = song_id_from_path(audio_path)
 
-    base_out_dir = Path("data/stems")
-    base_out_dir.mkdir(parents=True, exist_ok=True)
-
     sep_cfg = CFG.get("separation", {})
+    base_out_dir = Path(sep_cfg.get("out_dir", "data/stems"))
+    base_out_dir.mkdir(parents=True, exist_ok=True)
     model_name = sep_cfg.get("demucs_model", "htdemucs_6s")
+    store = StemStore.from_cfg(CFG)
 
     # Demucs writes: data/stems/<model_name>/<sid>/*.wav
     song_out_dir = base_out_dir / model_name / sid
 
-    if not (song_out_dir.exists() and any(song_out_dir.glob("*.wav"))):
+    streamed = False
+    separated = not has_stems(song_out_dir)
+    if separated:
+        if _use_streaming(audio_path, sep_cfg):
+            _separate_streaming(audio_path, song_out_dir, model_name, sep_cfg)
+            streamed = True
+    if not has_stems(song_out_dir):
         cmd = [
             "python",
             "-m",
@@ -73,8 +319,13 @@ def separate_track(audio_path: str, CFG: dict, manifest: dict):
             model_name,
             "-o",
             str(base_out_dir),
-            audio_path,
         ]
+        # speed knobs (Demucs defaults when unset)
+        if sep_cfg.get("shifts") is not None:
+            cmd += ["--shifts", str(int(sep_cfg["shifts"]))]
+        if sep_cfg.get("segment") is not None:
+            cmd += ["--segment", str(sep_cfg["segment"])]
+        cmd.append(audio_path)
         print(f"[separate] Running: {' '.join(cmd)}")
         subprocess.run(cmd, check=True)
 
@@ -82,8 +333,7 @@ def separate_track(audio_path: str, CFG: dict, manifest: dict):
         raise RuntimeError(f"[separate] Expected stems in {song_out_dir}, but folder is missing.")
 
     def pick(name: str):
-        p = song_out_dir / f"{name}.wav"
-        return str(p) if p.exists() else None
+        return stem_file(song_out_dir, name)
 
     vocals = pick("vocals")
     drums = pick("drums")
@@ -93,8 +343,31 @@ def separate_track(audio_path: str, CFG: dict, manifest: dict):
     other_raw = pick("other")
 
     # Merge piano into other so we don't treat Demucs "piano" as a separate synth stem.
-    merged_other_path = song_out_dir / "other_merged.wav"
-    other = _merge_audio(other_raw, piano, merged_other_path)
+    merged_other = pick("other_merged")
+    remerged = False
+    if other_raw and piano and merged_other and _is_fresh(merged_other, other_raw, piano):
+        other = merged_other
+    else:
+        other = _merge_audio(other_raw, piano, song_out_dir / "other_merged.wav")
+        remerged = other_raw is not None and piano is not None
+
+    if separated or remerged:
+        # FLAC / mono-at-analysis-rate storage
+        if store.compact(song_out_dir):
+            vocals, drums, bass, guitar = pick("vocals"), pick("drums"), pick("bass"), pick("guitar")
+            other = pick("other_merged") or pick("other")
+    if separated:
+        # size + LRU bookkeeping
+        regenerated = store.was_evicted(sid) is not None
+        entry = store.register(sid, model_name, song_out_dir, regenerated=regenerated)
+        if regenerated:
+            print(f"[separate] regenerated evicted stems for {sid}")
+        store.enforce_budget(keep=[sid])
+    else:
+        entry = None
+        if not store.touch(sid):
+            # separated before the store kept a registry: adopt it
+            entry = store.register(sid, model_name, song_out_dir)
 
     stems = {
         "vocals": vocals,
@@ -109,7 +382,41 @@ def separate_track(audio_path: str, CFG: dict, manifest: dict):
     manifest["separation"]["model"] = model_name
     manifest["separation"]["path"] = str(song_out_dir)
     manifest["separation"]["stems"] = {k: v for k, v in stems.items() if v}
+    manifest["separation"]["reused"] = not separated
+    if entry is not None:
+        manifest["separation"]["store"] = {
+            "format": store.fmt,
+            "mono_sr": store.mono_sr,
+            "bytes": entry["bytes"],
+            "regenerations": entry["regenerations"],
+        }
+    if streamed:
+        manifest["separation"]["streaming"] = {
+            "chunk_s": float(sep_cfg.get("chunk_s", 60.0)),
+            "overlap_s": float(sep_cfg.get("overlap_s", 5.0)),
+        }
 
     print(f"[separate] 5-stem view for {sid}: {manifest['separation']['stems']}")
 
     return stems
+
+
+def ensure_stems(manifest: dict, CFG: dict):
+    """
+    Stem paths of an already-separated song for a stage that needs the audio.
+    If the stem store evicted them, separation re-runs from the source audio
+    (recorded as a regeneration); otherwise they are just marked as used.
+    """
+    stems = (manifest.get("separation") or {}).get("stems") or {}
+    if stems and all(os.path.exists(p) for p in stems.values()):
+        StemStore.from_cfg(CFG).touch(manifest.get("song_id") or song_id_from_path(manifest.get("source_audio", "")))
+        return stems
+    sep = manifest.get("separation") or {}
+    if sep.get("user_supplied") and sep.get("path") and os.path.exists(sep["path"]):
+        # bring-your-own stems are never separated: rebuild the summed roles instead
+        from steps.user_stems import find_user_stems, use_user_stems
+        return use_user_stems(find_user_stems(sep["path"], CFG), CFG, manifest)
+    src = manifest.get("source_audio")
+    if not src or not os.path.exists(src):
+        return {k: v for k, v in stems.items() if os.path.exists(v)}
+    return separate_track(src, CFG, manifest)
@@ -1,10 +1,28 @@
+import importlib
 import os
 import tempfile
 import numpy as np
 import pretty_midi
+import soundfile as sf
+from scipy.ndimage import maximum_filter1d
 
-from utils.audio_utils import load_audio_mono
-from adtof_pytorch import transcribe_to_midi as adtof_to_midi
+from utils.audio_utils import load_audio_mono, audio_exists, audio_duration, is_in_memory, as_path, file_signature
+from steps.activity_gate import gate_stem, compact_audio, remap_times, expand_frames
+
+# ADTOF 5-class output order (GM pitches): kick, snare, toms, hi-hat, cymbals
+ADTOF_LABELS = [35, 38, 47, 42, 49]
+ADTOF_FPS = 100.0
+
+# Per-class peak-picking thresholds from the ADTOF paper; overridable in config.
+_DEFAULT_THRESHOLDS = {35: 0.22, 38: 0.24, 47: 0.32, 42: 0.22, 49: 0.30}
+_DEFAULT_MIN_IOI_S = 0.03
+
+# adtof_pytorch only exposes transcribe_to_midi, so by default drums come from
+# ADTOF's own MIDI. transcription.drums.activation_fn ("module:function",
+# audio_path -> [T, C] or ([T, C], fps)) switches to cached activations and
+# our own peak picking.
+
+_HIT_DURATION_S = 0.05
 
 
 def _merge_adtof_output(mid_path: str) -> pretty_midi.Instrument:
@@ -71,7 +89,202 @@ def _drum_hit_velocity(
     return max(1, min(127, vel))
 
 
-def transcribe_drums_to_midi(drum_stem_or_path, CFG, manifest):
+def _drums_cfg(CFG: dict) -> dict:
+    return (CFG.get("transcription") or {}).get("drums") or {}
+
+
+def _activation_cache_path(CFG: dict, manifest: dict) -> str:
+    cache_dir = (CFG.get("transcription") or {}).get("activation_cache_dir", "data/activations")
+    return os.path.join(cache_dir, str(manifest.get("song_id", "unknown")), "drums.npz")
+
+
+def _resolve_activation_fn(CFG: dict):
+    """
+    The configured activation function, or None when activation_fn is unset
+    or "none". Raises if a configured one does not resolve: silently falling
+    back would leave nothing to re-pick.
+    """
+    spec = _drums_cfg(CFG).get("activation_fn")
+    if not spec or str(spec).lower() in ("none", "off"):
+        return None
+    module_name, _, fn_name = str(spec).partition(":")
+    try:
+        fn = getattr(importlib.import_module(module_name), fn_name, None)
+    except ImportError as e:
+        raise RuntimeError(f"transcription.drums.activation_fn {spec!r}: {e}") from e
+    if not callable(fn):
+        raise RuntimeError(f"transcription.drums.activation_fn {spec!r} is not a function")
+    return fn
+
+
+def _drum_activations(drum_path, CFG: dict, manifest: dict, repick: bool = False, regions=None):
+    """
+    Per-class ADTOF activation curves for the drum stem: (act [T, C] float32, fps, labels).
+
+    With `regions` (from the activity gate) the network only sees the active
+    parts; activations are pasted back onto the stem's timeline (zeros elsewhere).
+
+    Cached as float16 .npz per song, tagged with the stem's size+mtime. Returns
+    None when nothing is cached and no activation_fn is configured (callers
+    then fall back to ADTOF's own MIDI output); raises if it does not resolve.
+    In repick mode we only read the cache and never touch torch. In-memory
+    stems (AudioArray) are not cached.
+    """
+    cache_path = None if is_in_memory(drum_path) else _activation_cache_path(CFG, manifest)
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as z:
+            fresh = repick or (
+                drum_path
+                and os.path.exists(drum_path)
+                and np.array_equal(z["stem_signature"], file_signature(drum_path))
+            )
+            if fresh:
+                manifest.setdefault("transcription", {})["drum_activations"] = cache_path
+                return z["act"].astype(np.float32), float(z["fps"]), [int(x) for x in z["labels"]]
+
+    if repick:
+        return None
+
+    fn = _resolve_activation_fn(CFG)
+    if fn is None:
+        return None
+
+    def run(audio):
+        with as_path(audio, "drums.wav") as path:
+            out = fn(path)
+        if isinstance(out, (tuple, list)):
+            act, fps = out[0], float(out[1])
+        else:
+            act, fps = out, ADTOF_FPS
+        act = np.asarray(act, dtype=np.float32)
+        if act.ndim != 2:
+            raise ValueError(f"Unexpected ADTOF activation shape: {act.shape}")
+        if act.shape[1] != len(labels) and act.shape[0] == len(labels):
+            act = act.T
+        return act, fps
+
+    labels = list(_drums_cfg(CFG).get("labels") or ADTOF_LABELS)
+    if regions:
+        if is_in_memory(drum_path):
+            compact, segments = compact_audio(drum_path, regions, None)
+            act, fps = run(compact)
+        else:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                compact_path = os.path.join(tmpdir, "drums_active.wav")
+                segments = compact_audio(drum_path, regions, compact_path)
+                act, fps = run(compact_path)
+        n_frames = int(np.ceil(audio_duration(drum_path) * fps))
+        act = expand_frames(act, segments, fps, n_frames)
+    else:
+        act, fps = run(drum_path)
+
+    if cache_path is None:
+        return act, fps, labels
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(
+        tmp,
+        act=act.astype(np.float16),
+        fps=np.float32(fps),
+        labels=np.asarray(labels, dtype=np.int16),
+        stem_signature=file_signature(drum_path),
+    )
+    os.replace(tmp, cache_path)
+    manifest.setdefault("transcription", {})["drum_activations"] = cache_path
+    return act, fps, labels
+
+
+def pick_drum_peaks(act, fps, labels, thresholds=None, min_ioi_s=None):
+    """
+    Vectorized peak picking over [T, C] activations.
+
+    A frame is a hit for class c if it is >= thresholds[label] and is the
+    maximum within +/- min_ioi of itself; equal-valued plateaus are thinned so
+    consecutive hits of one class are always more than min_ioi apart.
+
+    thresholds: {gm_pitch: value}; min_ioi_s: float or {gm_pitch: seconds}.
+    Returns (times_s, pitches, heights) sorted by time.
+    """
+    thresholds = {**_DEFAULT_THRESHOLDS, **{int(k): float(v) for k, v in (thresholds or {}).items()}}
+    if min_ioi_s is None:
+        min_ioi_s = _DEFAULT_MIN_IOI_S
+    if not isinstance(min_ioi_s, dict):
+        min_ioi_s = {lab: float(min_ioi_s) for lab in labels}
+    else:
+        min_ioi_s = {int(k): float(v) for k, v in min_ioi_s.items()}
+
+    times, pitches, heights = [], [], []
+    for c, lab in enumerate(labels):
+        curve = act[:, c]
+        ioi = max(1, int(round(min_ioi_s.get(lab, _DEFAULT_MIN_IOI_S) * fps)))
+        local_max = maximum_filter1d(curve, size=2 * ioi + 1, mode="constant")
+        idx = np.flatnonzero((curve >= thresholds.get(lab, 0.5)) & (curve == local_max))
+        if idx.size:
+            idx = idx[np.diff(idx, prepend=-ioi - 1) > ioi]
+        times.append(idx / fps)
+        pitches.append(np.full(idx.size, lab, dtype=np.int16))
+        heights.append(curve[idx])
+
+    times = np.concatenate(times) if times else np.zeros(0)
+    pitches = np.concatenate(pitches) if pitches else np.zeros(0, dtype=np.int16)
+    heights = np.concatenate(heights) if heights else np.zeros(0)
+    order = np.argsort(times, kind="stable")
+    return times[order], pitches[order], heights[order]
+
+
+def _kit_from_peaks(times, pitches, heights):
+    kit = pretty_midi.Instrument(program=0, is_drum=True, name="drums")
+    for t, p, h in zip(times, pitches, heights):
+        kit.notes.append(
+            pretty_midi.Note(
+                start=float(t),
+                end=float(t) + _HIT_DURATION_S,
+                pitch=int(p),
+                velocity=int(round(1 + 126 * min(1.0, max(0.0, float(h))))),
+            )
+        )
+    return kit
+
+
+def _adtof_midi_kit(drum_path, manifest, regions=None):
+    """
+    Fallback: let ADTOF do its own peak picking and merge the resulting MIDI.
+    """
+    from adtof_pytorch import transcribe_to_midi as adtof_to_midi
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_mid = os.path.join(tmpdir, "drums_adtof.mid")
+
+        segments = None
+        if regions and is_in_memory(drum_path):
+            drum_path, segments = compact_audio(drum_path, regions, None)
+        elif regions:
+            compact_path = os.path.join(tmpdir, "drums_active.wav")
+            segments = compact_audio(drum_path, regions, compact_path)
+            drum_path = compact_path
+
+        try:
+            with as_path(drum_path, "drums.wav") as path:
+                adtof_to_midi(path, tmp_mid)
+        except Exception as e:
+            manifest.setdefault("transcription", {})["drums"] = f"error:adtof:{e}"
+            return None
+
+        if not os.path.exists(tmp_mid):
+            manifest.setdefault("transcription", {})["drums"] = "error:no_mid_created"
+            return None
+
+        kit = _merge_adtof_output(tmp_mid)
+
+    if segments is not None and kit.notes:
+        starts = remap_times([n.start for n in kit.notes], segments)
+        for n, t in zip(kit.notes, starts):
+            n.end = float(t) + (n.end - n.start)
+            n.start = float(t)
+    return kit
+
+
+def transcribe_drums_to_midi(drum_stem_or_path, CFG, manifest, repick: bool = False):
     """
     Called from pipeline.py:
 
@@ -81,49 +294,80 @@ def transcribe_drums_to_midi(drum_stem_or_path, CFG, manifest):
       - a direct path to the demucs drums stem, or
       - a stems dict (we'll pull ['drums']).
 
+    When ADTOF activations are available they are cached and hits come from
+    pick_drum_peaks() with thresholds/min IOI from CFG["transcription"]["drums"].
+    repick=True uses only cached activations (no inference; the stem may be
+    gone) and returns None with status "missing_activations" if there are none.
+
     Returns:
       - pretty_midi.Instrument(is_drum=True, name="drums") with velocities
       - or None if no stem / no notes.
     """
-    # Normalize input to a path
+    # Normalize input to a path (or in-memory stem)
     if isinstance(drum_stem_or_path, dict):
         drum_path = drum_stem_or_path.get("drums")
     else:
         drum_path = drum_stem_or_path
 
-    if not drum_path or not os.path.exists(drum_path):
+    has_stem = audio_exists(drum_path)
+    if not has_stem and not repick:
         manifest.setdefault("transcription", {})["drums"] = "missing_stem"
         return None
 
-    # 1) Run ADTOF to get a raw drum MIDI
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmp_mid = os.path.join(tmpdir, "drums_adtof.mid")
-
+    # 0) Activity gate: skip silent kits, only send active regions to ADTOF
+    regions = None
+    if repick:
+        if ((manifest.get("activity") or {}).get("drums") or {}).get("silent"):
+            manifest.setdefault("transcription", {})["drums"] = "silent_stem"
+            return None
+    else:
         try:
-            adtof_to_midi(drum_path, tmp_mid)
+            gate = gate_stem(drum_path, CFG, manifest, "drums")
         except Exception as e:
-            manifest.setdefault("transcription", {})["drums"] = f"error:adtof:{e}"
+            print(f"[activity] gate failed for drums: {e}")
+            gate = {"silent": False, "regions": None}
+        if gate["silent"]:
+            manifest.setdefault("transcription", {})["drums"] = "silent_stem"
             return None
+        regions = gate["regions"]
 
-        if not os.path.exists(tmp_mid):
-            manifest.setdefault("transcription", {})["drums"] = "error:no_mid_created"
-            return None
+    # 1) Activations -> our own peak picking; else ADTOF's MIDI output
+    try:
+        acts = _drum_activations(drum_path, CFG, manifest, repick=repick, regions=regions)
+    except Exception as e:
+        print(f"[drums] ADTOF activations failed: {e}")
+        manifest.setdefault("transcription", {})["drums"] = f"error:adtof:{e}"
+        return None
 
-        kit = _merge_adtof_output(tmp_mid)
+    if acts is not None:
+        act, fps, labels = acts
+        dcfg = _drums_cfg(CFG)
+        kit = _kit_from_peaks(*pick_drum_peaks(
+            act, fps, labels,
+            thresholds=dcfg.get("thresholds"),
+            min_ioi_s=dcfg.get("min_ioi_s"),
+        ))
+    elif repick:
+        manifest.setdefault("transcription", {})["drums"] = "missing_activations"
+        return None
+    else:
+        kit = _adtof_midi_kit(drum_path, manifest, regions=regions)
+        if kit is None:
+            return None
 
     # 2) If merge produced no notes, bail
     if not getattr(kit, "notes", None):
         manifest.setdefault("transcription", {})["drums"] = "no_notes"
         return None
 
-    # 3) Load the drum stem once for velocity estimation
-    y, sr = load_audio_mono(drum_path)
-
-    # 4) Apply per-hit velocity. If y/sr is bad, helper will just return 100.
-    for n in kit.notes:
-        n.velocity = _drum_hit_velocity(y, sr, n.start)
+    # 3) Apply per-hit velocity from the stem's local RMS (if we still have it;
+    #    otherwise keep activation-height velocities)
+    if has_stem:
+        y, sr = load_audio_mono(drum_path)
+        for n in kit.notes:
+            n.velocity = _drum_hit_velocity(y, sr, n.start)
 
-    # 5) Ensure drum flags
+    # 4) Ensure drum flags
     kit.is_drum = True
     kit.name = "drums"
 
@@ -1,14 +1,283 @@
+import itertools
+import multiprocessing
+import multiprocessing.util
 import os
+import tempfile
 import pretty_midi
 import numpy as np
-from utils.audio_utils import load_audio_mono
+import soundfile as sf
+from utils.audio_utils import load_audio_mono, audio_exists, is_in_memory, file_signature
+from steps.activity_gate import gate_stem, compact_audio, remap_events
+from steps.vocal_f0 import f0_params, track_lead, segment_notes, split_by_lead
 
 
-from basic_pitch.inference import predict, Model
-from basic_pitch import ICASSP_2022_MODEL_PATH
+from basic_pitch.inference import window_audio_file, unwrap_output
+from basic_pitch.constants import AUDIO_SAMPLE_RATE, AUDIO_N_SAMPLES, FFT_HOP
+import basic_pitch.note_creation as bp_notes
+from utils.bp_backends import load_model, resolve_backend
+from utils import shm_transport
 
-# One shared Basic Pitch model
-_MODEL = Model(ICASSP_2022_MODEL_PATH)
+# One shared Basic Pitch model per (runtime, threads), loaded on first
+# inference (redecode never needs it)
+_MODEL = None
+_MODEL_KEY = None
+
+# Decoding thresholds per stem; overridden by CFG["transcription"]["basic_pitch"].
+# min_note_len is passed through with basic_pitch.predict()'s minimum_note_length semantics.
+_BP_DEFAULTS = {
+    "default": {"onset_threshold": 0.5, "frame_threshold": 0.3, "min_note_len": 0.03},
+    "vocals": {"onset_threshold": 0.6, "frame_threshold": 0.4, "min_note_len": 0.08},
+}
+
+
+def _get_model(CFG: dict):
+    """
+    Runtime/threads come from CFG["transcription"]["basic_pitch_runtime"]
+    ("auto" = this host's autotune result, else basic-pitch's default).
+    """
+    global _MODEL, _MODEL_KEY
+    key = resolve_backend(CFG)
+    if _MODEL is None or _MODEL_KEY != key:
+        _MODEL = load_model(*key)
+        _MODEL_KEY = key
+        print(f"[transcribe_melodic] Basic Pitch runtime: {key[0]} (threads={key[1] or 'default'})")
+    return _MODEL
+
+
+def _bp_params(CFG: dict, stem: str) -> dict:
+    """
+    Decoding thresholds for `stem`: built-in defaults < config "default" < config "<stem>".
+    """
+    user = (CFG.get("transcription") or {}).get("basic_pitch") or {}
+    params = dict(_BP_DEFAULTS["default"])
+    params.update(_BP_DEFAULTS.get(stem, {}))
+    params.update(user.get("default") or {})
+    params.update(user.get(stem) or {})
+    return params
+
+
+def _posterior_cache_path(CFG: dict, manifest: dict, stem: str) -> str:
+    cache_dir = (CFG.get("transcription") or {}).get("posterior_cache_dir", "data/posteriors")
+    return os.path.join(cache_dir, str(manifest.get("song_id", "unknown")), f"{stem}.npz")
+
+
+_N_OVERLAP_FRAMES = 30
+_OVERLAP_LEN = _N_OVERLAP_FRAMES * FFT_HOP
+_HOP_SIZE = AUDIO_N_SAMPLES - _OVERLAP_LEN
+
+
+def _predict_windows(y, model, n_windows=None):
+    """
+    Raw (still overlapping) model outputs for the windows of padded audio `y`,
+    exactly as basic_pitch's run_inference() cuts them.
+    """
+    output = {"note": [], "onset": [], "contour": []}
+    for window, _ in itertools.islice(window_audio_file(y, _HOP_SIZE), n_windows):
+        for k, v in model.predict(np.expand_dims(window, axis=0)).items():
+            output[k].append(v)
+    return {k: np.concatenate(v) for k, v in output.items()}
+
+
+def _run_inference_mono(y, model):
+    """
+    basic_pitch's run_inference() for mono 22.05 kHz audio already in memory
+    (it only reads paths). Same windowing and unwrapping, so the posteriors match.
+    """
+    y = np.asarray(y, dtype=np.float32)
+    original_length = y.shape[0]
+    y = np.concatenate([np.zeros(_OVERLAP_LEN // 2, dtype=np.float32), y])
+    output = _predict_windows(y, model)
+    return {k: unwrap_output(v, original_length, _N_OVERLAP_FRAMES) for k, v in output.items()}
+
+
+# ---------------------------------------------------------------------------
+# Segment parallelism: one long stem across several processes
+#
+# Basic Pitch sees the audio only through fixed windows, each predicted on its
+# own; run_inference() just trims the window overlaps and concatenates. So a
+# stem is split into contiguous runs of windows (at window boundaries, not at
+# musical ones), each run goes to a worker, and the raw outputs are
+# concatenated in order before the usual unwrap. The posteriors - and so the
+# notes, which are decoded once over the whole stem - are the same as a serial
+# run: nothing is cut at a segment boundary, and the result does not depend on
+# the number of workers.
+# ---------------------------------------------------------------------------
+_SEG_POOL = None
+_SEG_POOL_KEY = None
+_WORKER_MODEL = None
+
+
+def _segment_cfg(CFG: dict) -> dict:
+    return (CFG.get("transcription") or {}).get("segment_parallel") or {}
+
+
+def _init_segment_worker(backend, threads):
+    global _WORKER_MODEL
+    _WORKER_MODEL = load_model(backend, threads)
+
+
+def _predict_span(src, start, stop, n_windows):
+    # src: a shm_transport handle (zero-copy view) or the span itself
+    y = shm_transport.attach(src) if isinstance(src, str) else src
+    return _predict_windows(y[start:stop], _WORKER_MODEL, n_windows)
+
+
+def _shutdown_segment_pool():
+    global _SEG_POOL, _SEG_POOL_KEY
+    if _SEG_POOL is not None:
+        _SEG_POOL.shutdown(cancel_futures=True)
+    _SEG_POOL, _SEG_POOL_KEY = None, None
+
+
+# A multiprocessing finalizer rather than atexit: it also runs when this is a
+# supervised stage child, before multiprocessing joins the child's own children
+# (idle pool workers would block that join forever). The priority must beat
+# the pool queues' own close finalizers (10), or the stop sentinels never go out.
+multiprocessing.util.Finalize(None, _shutdown_segment_pool, exitpriority=100)
+
+
+def _segment_pool(CFG: dict, workers: int):
+    """
+    Persistent worker pool (one model per worker, single-threaded so workers
+    don't oversubscribe the cores). Rebuilt only if the runtime or size changes.
+    """
+    global _SEG_POOL, _SEG_POOL_KEY
+    from concurrent.futures import ProcessPoolExecutor
+
+    backend, _ = resolve_backend(CFG)
+    key = (backend, workers)
+    if _SEG_POOL is None or _SEG_POOL_KEY != key:
+        _shutdown_segment_pool()
+        # spawn: forking a process that already holds a TF/ONNX runtime is unsafe
+        _SEG_POOL = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_segment_worker,
+            initargs=(backend, 1),
+        )
+        _SEG_POOL_KEY = key
+    return _SEG_POOL
+
+
+def _segment_workers(CFG: dict, duration_s: float) -> int:
+    """
+    Number of segment workers for a stem of `duration_s` (1 = run in-process).
+    """
+    scfg = _segment_cfg(CFG)
+    if not scfg.get("enabled", False) or duration_s < float(scfg.get("min_duration_s", 60.0)):
+        return 1
+    workers = int(scfg.get("workers") or os.cpu_count() or 1)
+    # at least min_segment_s of audio per worker, or the spawn overhead dominates
+    return max(1, min(workers, int(duration_s // float(scfg.get("min_segment_s", 15.0)))))
+
+
+def _run_inference_segments(y, CFG: dict, workers: int):
+    """
+    Posteriors for mono 22.05 kHz audio `y`, windows spread over `workers` processes.
+    """
+    original_length = y.shape[0]
+    y = np.concatenate([np.zeros(_OVERLAP_LEN // 2, dtype=np.float32), y.astype(np.float32)])
+    n_windows = -(-len(y) // _HOP_SIZE)
+    bounds = np.linspace(0, n_windows, min(workers, n_windows) + 1).round().astype(int)
+    pool = _segment_pool(CFG, workers)
+    # workers map the padded stem from shared memory instead of unpickling their span
+    with shm_transport.song_scope("bp_segments", CFG):
+        handle = shm_transport.share(y)
+        spans = []
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b <= a:
+                continue
+            start, stop = a * _HOP_SIZE, (b - 1) * _HOP_SIZE + AUDIO_N_SAMPLES
+            if handle:
+                spans.append((handle, start, stop, b - a))
+            else:
+                spans.append((y[start:stop], 0, stop - start, b - a))
+        try:
+            parts = list(pool.map(_predict_span, *zip(*spans)))
+        finally:
+            shm_transport.release(handle)
+    return {
+        k: unwrap_output(np.concatenate([p[k] for p in parts]), original_length, _N_OVERLAP_FRAMES)
+        for k in ("note", "onset", "contour")
+    }
+
+
+def _infer(audio, CFG: dict, manifest: dict = None, stem: str = None):
+    """
+    Basic Pitch posteriors for a stem file or AudioArray: in-process for short
+    stems, across the segment pool for long ones.
+    """
+    duration = audio.duration if is_in_memory(audio) else float(sf.info(audio).duration)
+    workers = _segment_workers(CFG, duration)
+    if manifest is not None and stem:
+        manifest.setdefault("transcription", {}).setdefault("segment_workers", {})[stem] = workers
+    # the same decode run_inference() does, but shared with other processes
+    # through the song's shm_transport scope
+    y, _ = load_audio_mono(audio, sr=AUDIO_SAMPLE_RATE)
+    if workers <= 1:
+        return _run_inference_mono(y, _get_model(CFG))
+    return _run_inference_segments(y, CFG, workers)
+
+
+def _bp_posteriors(audio_path, CFG: dict, manifest: dict, stem: str, redecode: bool = False,
+                   regions=None):
+    """
+    Basic Pitch note/onset/contour posteriors for one stem.
+
+    If `regions` is given (from the activity gate), only those parts of the stem
+    are sent through the model; the returned `segments` map the compacted
+    timeline back to the stem (empty = whole stem).
+
+    Posteriors are cached as float16 in a compressed .npz keyed by song/stem and
+    tagged with the stem's size+mtime. A regenerated stem invalidates the cache;
+    in redecode mode we never run the model and use whatever is cached.
+
+    In-memory stems (AudioArray) are never cached.
+
+    Returns (output, segments).
+    """
+    if is_in_memory(audio_path):
+        if regions:
+            compact, segments = compact_audio(audio_path, regions, None)
+            return _infer(compact, CFG, manifest, stem), segments
+        return _infer(audio_path, CFG, manifest, stem), np.zeros((0, 3))
+
+    cache_path = _posterior_cache_path(CFG, manifest, stem)
+    manifest.setdefault("transcription", {}).setdefault("posteriors", {})[stem] = cache_path
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as z:
+            fresh = redecode or (
+                audio_path
+                and os.path.exists(audio_path)
+                and np.array_equal(z["stem_signature"], file_signature(audio_path))
+            )
+            if fresh:
+                segments = z["segments"] if "segments" in z.files else np.zeros((0, 3))
+                return {k: z[k].astype(np.float32) for k in ("note", "onset", "contour")}, segments
+
+    if redecode:
+        raise FileNotFoundError(f"no cached posteriors at {cache_path}")
+
+    segments = np.zeros((0, 3))
+    if regions:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            compact_path = os.path.join(tmpdir, f"{stem}_active.wav")
+            segments = compact_audio(audio_path, regions, compact_path)
+            output = _infer(compact_path, CFG, manifest, stem)
+    else:
+        output = _infer(audio_path, CFG, manifest, stem)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(
+        tmp,
+        stem_signature=file_signature(audio_path),
+        segments=segments,
+        **{k: np.asarray(output[k], dtype=np.float16) for k in ("note", "onset", "contour")},
+    )
+    os.replace(tmp, cache_path)
+    return output, segments
 
 
 def _get_midi_tempo(manifest: dict) -> float:
@@ -34,8 +303,11 @@ def _filter_bass_silence(bass_path, events,
     - min_active_ratio: fraction of frames in the note window that must be "loud"
                         to keep the note.
     """
-    if not events or not bass_path or not os.path.exists(bass_path):
+    if not events or not bass_path:
         return events
+    if not audio_exists(bass_path):
+        # e.g. redecode after eviction: unfiltered events would silently differ
+        raise FileNotFoundError(f"bass stem needed for the silence filter is missing: {bass_path}")
 
     y, sr = load_audio_mono(bass_path)
     if y is None or y.size == 0:
@@ -132,92 +404,89 @@ def _squash_vibrato(events, semitone_tol=1, max_span=0.25):
     return cleaned
 
 
-def _bp_predict_events(
-    audio_path: str,
-    manifest: dict,
-    onset_threshold=0.5,
-    frame_threshold=0.3,
-    min_note_len=0.03,
-):
+def _note_events_to_tuples(note_events):
+    """
+    Normalize Basic Pitch note events into [(start, end, pitch, velocity), ...].
     """
-    Run Basic Pitch with midi_tempo from manifest and normalize output into:
-        [(start, end, pitch, velocity), ...]
-    Supports both:
-      - dict {"notes": ...}
-      - tuple (model_output, midi_data, note_events)
-    """
-    midi_tempo = _get_midi_tempo(manifest)
-
-    out = predict(
-        audio_path,
-        _MODEL,
-        midi_tempo=midi_tempo,
-        onset_threshold=onset_threshold,
-        frame_threshold=frame_threshold,
-        minimum_note_length=min_note_len,
-    )
-
     events = []
+    for ev in note_events:
+        if isinstance(ev, dict):
+            onset = float(
+                ev.get("start_time")
+                or ev.get("onset_time")
+                or ev.get("start")
+                or 0.0
+            )
+            offset = float(
+                ev.get("end_time")
+                or ev.get("offset_time")
+                or ev.get("end")
+                or (onset + 0.02)
+            )
+            pitch = int(ev.get("pitch") or ev.get("midi_note_number") or 0)
+            vel = ev.get("velocity") or ev.get("amplitude") or 80
+        elif isinstance(ev, (tuple, list)) and len(ev) >= 4:
+            onset, offset, pitch, vel = ev[:4]
+        else:
+            continue
 
-    # Case 1: dict-style {"notes": ...}
-    if isinstance(out, dict) and "notes" in out:
-        for row in out["notes"]:
-            if len(row) < 4:
-                continue
-            onset, offset, midi, vel = row[:4]
-            onset = float(onset)
-            offset = float(offset)
-            if offset <= onset:
-                continue
-
-            vel = float(vel)
-            if 0.0 <= vel <= 1.0:
-                vel *= 127.0
-            vel = int(round(max(1, min(127, vel))))
+        onset = float(onset)
+        offset = float(offset)
+        pitch = int(pitch)
+        vel = float(vel)
 
-            events.append((onset, offset, int(midi), vel))
-        return events
+        if offset <= onset or pitch <= 0:
+            continue
 
-    # Case 2: tuple-style (model_output, midi_data, note_events)
-    if isinstance(out, (tuple, list)) and len(out) == 3:
-        _, _, note_events = out
-        for ev in note_events:
-            if isinstance(ev, dict):
-                onset = float(
-                    ev.get("start_time")
-                    or ev.get("onset_time")
-                    or ev.get("start")
-                    or 0.0
-                )
-                offset = float(
-                    ev.get("end_time")
-                    or ev.get("offset_time")
-                    or ev.get("end")
-                    or (onset + 0.02)
-                )
-                pitch = int(ev.get("pitch") or ev.get("midi_note_number") or 0)
-                vel = ev.get("velocity") or ev.get("amplitude") or 80
-            elif isinstance(ev, (tuple, list)) and len(ev) >= 4:
-                onset, offset, pitch, vel = ev[:4]
-            else:
-                continue
+        if 0.0 <= vel <= 1.0:
+            vel *= 127.0
+        vel = int(round(max(1, min(127, vel))))
 
-            onset = float(onset)
-            offset = float(offset)
-            pitch = int(pitch)
-            vel = float(vel)
+        events.append((onset, offset, pitch, vel))
+    return events
 
-            if offset <= onset or pitch <= 0:
-                continue
 
-            if 0.0 <= vel <= 1.0:
-                vel *= 127.0
-            vel = int(round(max(1, min(127, vel))))
+def _decode_posteriors(
+    output,
+    manifest: dict,
+    onset_threshold=0.5,
+    frame_threshold=0.3,
+    min_note_len=0.03,
+):
+    """
+    Posteriors -> note events, exactly as basic_pitch.predict() would decode them.
+    Pure CPU; cheap enough to sweep thresholds over a whole corpus.
+    """
+    min_note_frames = int(np.round(min_note_len / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+    _, note_events = bp_notes.model_output_to_notes(
+        output,
+        onset_thresh=onset_threshold,
+        frame_thresh=frame_threshold,
+        min_note_len=min_note_frames,
+        midi_tempo=_get_midi_tempo(manifest),
+    )
+    return _note_events_to_tuples(note_events)
 
-            events.append((onset, offset, pitch, vel))
-        return events
 
-    raise ValueError(f"Unexpected basic_pitch.predict() output type: {type(out)}")
+def _bp_predict_events(
+    audio_path: str,
+    CFG: dict,
+    manifest: dict,
+    stem: str,
+    redecode: bool = False,
+    regions=None,
+):
+    """
+    Run (or reuse cached) Basic Pitch inference on one stem and decode it with
+    the stem's thresholds into:
+        [(start, end, pitch, velocity), ...]
+    Times are always on the stem's own timeline, even when only `regions` were
+    transcribed.
+    """
+    params = _bp_params(CFG, stem)
+    manifest.setdefault("transcription", {}).setdefault("basic_pitch_params", {})[stem] = params
+    output, segments = _bp_posteriors(audio_path, CFG, manifest, stem, redecode=redecode, regions=regions)
+    return remap_events(_decode_posteriors(output, manifest, **params), segments)
 
 
 def _events_to_instrument(events, program=0, name=""):
@@ -239,7 +508,7 @@ def _events_to_instrument(events, program=0, name=""):
     return inst
 
 
-def _split_lead_harmony(events):
+def _split_highest_note(events):
     """
     Split vocal events into lead vs harmony:
       - for each note, look at its midpoint
@@ -263,37 +532,112 @@ def _split_lead_harmony(events):
     return lead, harm
 
 
-def transcribe_pitched_tracks(stems: dict, CFG: dict, manifest: dict):
+def _split_lead_harmony(events, v_path, CFG, manifest, redecode=False):
+    """
+    Split vocal events into lead vs harmony.
+
+    Lead = notes segmented from a monophonic f0 track of the vocals stem
+    (steps/vocal_f0.py); harmony = Basic Pitch notes the lead doesn't explain.
+    Falls back to the highest-active-note rule when the tracker is disabled,
+    has no cached track (redecode), or isn't confident enough.
+    The outcome is recorded under manifest["transcription"]["lead_f0"].
+    """
+    params = f0_params(CFG)
+    info = {"method": "highest_note"}
+    manifest.setdefault("transcription", {})["lead_f0"] = info
+    manifest["transcription"].pop("pitched_debug", None)  # from the retired CREPE path
+
+    if not events:
+        return [], []
+    if not params.get("enabled", True):
+        info["reason"] = "disabled"
+        return _split_highest_note(events)
+
+    try:
+        track = track_lead(v_path, CFG, manifest, redecode=redecode)
+    except Exception as e:
+        info["reason"] = f"error: {e}"
+        return _split_highest_note(events)
+    if track is None:
+        info["reason"] = "no cached f0 track"
+        return _split_highest_note(events)
+
+    conf = track["conf"]
+    voiced = (conf >= float(params["voicing_conf"])) & (track["rms_db"] > float(params["silence_db"]))
+    info["voiced_ratio"] = round(float(voiced.mean()) if len(voiced) else 0.0, 4)
+    info["conf_mean"] = round(float(conf[voiced].mean()) if voiced.any() else 0.0, 4)
+
+    lead = segment_notes(
+        track["f0"], conf, track["rms_db"], track["hop_s"],
+        voicing_conf=float(params["voicing_conf"]), silence_db=float(params["silence_db"]),
+        smooth_s=float(params["smooth_s"]), min_note_s=float(params["min_note_s"]),
+        max_gap_s=float(params["max_gap_s"]),
+    )
+    if not lead or info["conf_mean"] < float(params["min_conf_mean"]):
+        info["reason"] = "low confidence" if lead else "no voiced notes"
+        return _split_highest_note(events)
+
+    harm = split_by_lead(events, lead, track["hop_s"])
+    info.update({"method": "f0", "lead_notes": len(lead), "harmony_notes": len(harm)})
+    return lead, harm
+
+
+def transcribe_pitched_tracks(stems: dict, CFG: dict, manifest: dict, redecode: bool = False):
     """
     Use Basic Pitch (+ midi_tempo) on:
       - vocals -> voxlead, voxbg (with vocal-specific cleanup)
       - bass   -> bass
       - guitar -> guitar
       - other  -> other (as pad/synth-ish via program)
+
+    redecode=True rebuilds notes from cached posteriors only (no model, stems
+    need not exist); thresholds come from CFG["transcription"]["basic_pitch"].
+
     Returns:
       dict[name -> pretty_midi.Instrument]
     """
     pitched = {}
     status = {}
 
+    def available(path):
+        if redecode:
+            return bool(path)
+        return audio_exists(path)
+
+    def gate(stem, path):
+        """
+        (silent, regions) from the activity gate; redecode reuses the recorded verdict.
+        """
+        if redecode:
+            return bool(((manifest.get("activity") or {}).get(stem) or {}).get("silent")), None
+        try:
+            g = gate_stem(path, CFG, manifest, stem)
+        except Exception as e:
+            # unreadable here => let Basic Pitch surface the real error
+            print(f"[activity] gate failed for {stem}: {e}")
+            return False, None
+        return g["silent"], g["regions"]
+
     # ---------- VOCALS ----------
     v_path = stems.get("vocals")
-    if v_path and os.path.exists(v_path):
+    v_silent, v_regions = gate("vocals", v_path) if available(v_path) else (False, None)
+    if v_silent:
+        status["voxlead"] = "silent_stem"
+        status["voxbg"] = "silent_stem"
+    elif available(v_path):
         try:
-            # More conservative for vocals
+            # More conservative for vocals (see _BP_DEFAULTS["vocals"])
             v_events = _bp_predict_events(
-                v_path,
-                manifest,
-                onset_threshold=0.6,
-                frame_threshold=0.4,
-                min_note_len=0.08,
+                v_path, CFG, manifest, "vocals", redecode=redecode, regions=v_regions
             )
             # Vocal-specific cleanup
             v_events = _merge_same_pitch(v_events, max_gap=0.07)
             v_events = _squash_vibrato(v_events, semitone_tol=1, max_span=0.30)
 
             if v_events:
-                lead_ev, harm_ev = _split_lead_harmony(v_events)
+                lead_ev, harm_ev = _split_lead_harmony(
+                    v_events, v_path, CFG, manifest, redecode=redecode
+                )
 
                 if lead_ev:
                     pitched["voxlead"] = _events_to_instrument(
@@ -322,9 +666,14 @@ def transcribe_pitched_tracks(stems: dict, CFG: dict, manifest: dict):
 
     # ---------- BASS ----------
     b_path = stems.get("bass")
-    if b_path and os.path.exists(b_path):
+    b_silent, b_regions = gate("bass", b_path) if available(b_path) else (False, None)
+    if b_silent:
+        status["bass"] = "silent_stem"
+    elif available(b_path):
         try:
-            b_events = _bp_predict_events(b_path, manifest)
+            b_events = _bp_predict_events(
+                b_path, CFG, manifest, "bass", redecode=redecode, regions=b_regions
+            )
 
             # 1) basic harmonic/junk filter (optional, keep if it helped at all)
             # from the earlier helper; if you didn't keep it, you can skip this line.
@@ -355,9 +704,14 @@ def transcribe_pitched_tracks(stems: dict, CFG: dict, manifest: dict):
 
     # ---------- GUITAR ----------
     g_path = stems.get("guitar")
-    if g_path and os.path.exists(g_path):
+    g_silent, g_regions = gate("guitar", g_path) if available(g_path) else (False, None)
+    if g_silent:
+        status["guitar"] = "silent_stem"
+    elif available(g_path):
         try:
-            g_events = _bp_predict_events(g_path, manifest)
+            g_events = _bp_predict_events(
+                g_path, CFG, manifest, "guitar", redecode=redecode, regions=g_regions
+            )
             if g_events:
                 pitched["guitar"] = _events_to_instrument(
                     g_events, program=28, name="guitar"
@@ -372,9 +726,14 @@ def transcribe_pitched_tracks(stems: dict, CFG: dict, manifest: dict):
 
     # ---------- OTHER (synth/extra melodic) ----------
     o_path = stems.get("other")
-    if o_path and os.path.exists(o_path):
+    o_silent, o_regions = gate("other", o_path) if available(o_path) else (False, None)
+    if o_silent:
+        status["other"] = "silent_stem"
+    elif available(o_path):
         try:
-            o_events = _bp_predict_events(o_path, manifest)
+            o_events = _bp_predict_events(
+                o_path, CFG, manifest, "other", redecode=redecode, regions=o_regions
+            )
             if o_events:
                 # Use a pad-like GM program so it imports as a pad
                 pitched["other"] = _events_to_instrument(
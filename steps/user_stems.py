@@ -0,0 +1,285 @@
+"""
+Bring-your-own stems: use a session's real multitrack exports instead of
+separating a bounce of them.
+
+Two layouts are recognized:
+
+  - stem folder: the batch glob matches a directory, e.g.
+        data/raw/SongA/{mix.wav, kick.wav, snare.wav, bass_di.wav, vox_lead.wav, ...}
+    Files are assigned to roles by filename keywords (user_stems.roles),
+    unless the folder has a map file (user_stems.folder_map). A file named
+    like user_stems.mix_names is the mix; without one, all stems are summed.
+
+  - sidecar: next to a mix, <song>.stems.yaml maps roles to files or globs,
+    relative to the sidecar:
+        vocals: [vox_lead.wav, vox_bv*.wav]
+        drums: drums/*.wav
+        bass: bass_di.wav
+
+Roles are the ones separate_track produces: vocals, drums, bass, guitar,
+other. A role with one input uses the file in place. Several inputs are
+summed into <out_dir>/<sid>/<role>.wav, but only when the song is processed,
+and again only when an input has changed. Separation is skipped entirely.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import soundfile as sf
+import yaml
+
+from utils.manifest import song_id_from_path
+
+ROLES = ("vocals", "drums", "bass", "guitar", "other")
+AUDIO_EXTS = (".wav", ".flac", ".aif", ".aiff", ".ogg", ".mp3")
+
+_DEFAULT_ROLES = {
+    "drums": ["drum", "drums", "kick", "snare", "hat", "hihat", "tom", "toms", "cymbal", "overhead", "oh",
+              "room", "perc", "clap"],
+    "bass": ["bass", "sub", "808"],
+    "guitar": ["guitar", "guitars", "gtr", "gt"],
+    "vocals": ["vox", "vocal", "vocals", "voice", "bv", "bgv", "bvs", "choir"],
+}
+
+
+def _ucfg(CFG: dict) -> dict:
+    return CFG.get("user_stems") or {}
+
+
+def sidecar_path(audio_path: str, CFG: dict) -> str:
+    return os.path.splitext(audio_path)[0] + _ucfg(CFG).get("sidecar_suffix", ".stems.yaml")
+
+
+def is_sidecar(path: str, CFG: dict) -> bool:
+    """
+    True for a role-mapping file, which batch globs must not treat as a song.
+    """
+    return path.endswith(_ucfg(CFG).get("sidecar_suffix", ".stems.yaml"))
+
+
+def batch_songs(paths, CFG: dict) -> list:
+    """
+    The songs among glob matches: audio files and stem folders, minus
+    sidecars and the folders holding a sidecar song's stems.
+    """
+    paths = [song_path(p) for p in paths]
+    stem_dirs = set()
+    for p in paths:
+        if is_sidecar(p, CFG):
+            base = os.path.dirname(p) or "."
+            for entries in (_read_map(p) or {}).values():
+                for e in [entries] if isinstance(entries, str) else entries or []:
+                    for m in glob.glob(os.path.join(base, str(e))):
+                        stem_dirs.add(os.path.abspath(os.path.dirname(m)))
+    return sorted(
+        p for p in paths
+        if not is_sidecar(p, CFG) and not (os.path.isdir(p) and os.path.abspath(p) in stem_dirs)
+    )
+
+
+def song_path(path: str) -> str:
+    """
+    `path` without a trailing separator, so a stem folder's song ID is its name.
+    """
+    return path.rstrip("/\\") or path
+
+
+def _is_audio(name: str) -> bool:
+    return name.lower().endswith(AUDIO_EXTS)
+
+
+def _resolve(base_dir: str, entries) -> list:
+    if isinstance(entries, str):
+        entries = [entries]
+    out = []
+    for e in entries or []:
+        matches = sorted(glob.glob(os.path.join(base_dir, str(e))))
+        if not matches:
+            raise FileNotFoundError(f"user stems: {e!r} matches nothing in {base_dir}")
+        out.extend(m for m in matches if _is_audio(m))
+    return out
+
+
+def _read_map(map_path: str) -> dict:
+    with open(map_path, "r") as f:
+        m = yaml.safe_load(f) or {}
+    unknown = set(m) - set(ROLES) - {"mix"}
+    if unknown:
+        raise ValueError(f"{map_path}: unknown role(s) {sorted(unknown)} (expected {', '.join(ROLES)}, mix)")
+    return m
+
+
+def _role_for(fname: str, roles: dict) -> str:
+    tokens = set("".join(c if c.isalnum() else " " for c in os.path.splitext(fname)[0].lower()).split())
+    for role, words in roles.items():
+        if tokens & {str(w).lower() for w in words}:
+            return role
+    return "other"
+
+
+def find_user_stems(audio_path: str, CFG: dict):
+    """
+    The song's user-stem spec, or None for a plain mix (separate as usual):
+        {"layout": "folder"|"sidecar", "source": folder or mix path, "mix": path or None,
+         "inputs": {role: [paths]}}
+    """
+    ucfg = _ucfg(CFG)
+    if not ucfg.get("enabled", True):
+        return None
+    audio_path = song_path(audio_path)
+
+    if os.path.isdir(audio_path):
+        map_path = os.path.join(audio_path, ucfg.get("folder_map", "stems.yaml"))
+        mix_names = {n.lower() for n in ucfg.get("mix_names", ["mix", "master", "bounce"])}
+        if os.path.exists(map_path):
+            m = _read_map(map_path)
+            inputs = {r: _resolve(audio_path, m.get(r)) for r in ROLES}
+            mix = _resolve(audio_path, m.get("mix"))
+            mix = mix[0] if mix else None
+        else:
+            roles = ucfg.get("roles") or _DEFAULT_ROLES
+            inputs = {r: [] for r in ROLES}
+            mix = None
+            for fname in sorted(os.listdir(audio_path)):
+                path = os.path.join(audio_path, fname)
+                if not os.path.isfile(path) or not _is_audio(fname):
+                    continue
+                if os.path.splitext(fname)[0].lower() in mix_names:
+                    mix = path
+                    continue
+                inputs[_role_for(fname, roles)].append(path)
+        layout = "folder"
+    else:
+        sidecar = sidecar_path(audio_path, CFG)
+        if not os.path.exists(sidecar):
+            return None
+        m = _read_map(sidecar)
+        inputs = {r: _resolve(os.path.dirname(sidecar) or ".", m.get(r)) for r in ROLES}
+        mix = audio_path
+        layout = "sidecar"
+
+    if not any(inputs.values()):
+        raise ValueError(f"user stems: no stem files found for {audio_path}")
+    return {"layout": layout, "source": audio_path, "mix": mix, "inputs": inputs}
+
+
+def _signature(paths) -> list:
+    return [[os.path.abspath(p), os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in paths]
+
+
+def _fit_channels(x, ch: int):
+    if x.shape[1] == ch:
+        return x
+    mono = x.mean(axis=1, keepdims=True)
+    return np.repeat(mono, ch, axis=1)
+
+
+def _mix_files(paths, out_path: str, block: int = 1 << 18):
+    """
+    Sum `paths` into a float WAV at `out_path`. Inputs at a common rate are
+    streamed block by block; mixed rates are resampled to the highest one.
+    """
+    infos = [sf.info(p) for p in paths]
+    sr = max(i.samplerate for i in infos)
+    ch = min(2, max(i.channels for i in infos))
+    frames = max(int(round(i.frames * sr / i.samplerate)) for i in infos)
+    tmp = out_path + ".partial.wav"
+    if all(i.samplerate == sr for i in infos):
+        handles = [sf.SoundFile(p) for p in paths]
+        try:
+            with sf.SoundFile(tmp, "w", sr, ch, subtype="FLOAT", format="WAV") as out:
+                for start in range(0, frames, block):
+                    n = min(block, frames - start)
+                    acc = np.zeros((n, ch), dtype=np.float32)
+                    for h in handles:
+                        x = h.read(n, dtype="float32", always_2d=True)
+                        acc[: len(x)] += _fit_channels(x, ch)
+                    out.write(acc)
+        finally:
+            for h in handles:
+                h.close()
+    else:
+        import librosa
+        acc = np.zeros((frames, ch), dtype=np.float32)
+        for p in paths:
+            y, _ = librosa.load(p, sr=sr, mono=False)
+            y = np.atleast_2d(y).T
+            acc[: len(y)] += _fit_channels(y, ch)[:frames]
+        sf.write(tmp, acc, sr, subtype="FLOAT", format="WAV")
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def _mixed(paths, out_path: str) -> str:
+    """
+    The sum of `paths` at `out_path`, rebuilt only if an input changed since.
+    """
+    sig_path = os.path.splitext(out_path)[0] + ".sources.json"
+    sig = _signature(paths)
+    if os.path.exists(out_path) and os.path.exists(sig_path):
+        with open(sig_path, "r") as f:
+            if json.load(f) == sig:
+                return out_path
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    _mix_files(paths, out_path)
+    with open(sig_path, "w") as f:
+        json.dump(sig, f)
+    return out_path
+
+
+def _out_dir(CFG: dict, sid: str) -> str:
+    base = _ucfg(CFG).get("out_dir") or os.path.join((CFG.get("separation") or {}).get("out_dir", "data/stems"), "user")
+    return os.path.join(base, sid)
+
+
+def source_audio(spec: dict, CFG: dict) -> str:
+    """
+    The song's mix: the supplied one, or the sum of all its stems.
+    """
+    if spec["mix"]:
+        return spec["mix"]
+    sid = song_id_from_path(spec["source"])
+    return _mixed([p for r in ROLES for p in spec["inputs"][r]], os.path.join(_out_dir(CFG, sid), "mix.wav"))
+
+
+def source_signature(spec: dict) -> list:
+    """
+    [total bytes, newest mtime] over the mix and all stems (cf. process_one's
+    source_signature for a single file).
+    """
+    paths = [p for r in ROLES for p in spec["inputs"][r]] + ([spec["mix"]] if spec["mix"] else [])
+    sts = [os.stat(p) for p in paths]
+    return [sum(st.st_size for st in sts), int(max(st.st_mtime for st in sts))]
+
+
+def use_user_stems(spec: dict, CFG: dict, manifest: dict):
+    """
+    Drop-in for separate_track(): the 5-stem view from the user's stems.
+    """
+    sid = manifest.get("song_id") or song_id_from_path(spec["source"])
+    out_dir = _out_dir(CFG, sid)
+    stems = {}
+    mixed = []
+    for role in ROLES:
+        paths = spec["inputs"][role]
+        if not paths:
+            stems[role] = None
+        elif len(paths) == 1:
+            stems[role] = paths[0]
+        else:
+            stems[role] = _mixed(paths, os.path.join(out_dir, f"{role}.wav"))
+            mixed.append(role)
+
+    manifest["separation"] = {
+        "model": None,
+        "user_supplied": True,
+        "layout": spec["layout"],
+        "path": spec["source"],
+        "inputs": {r: p for r, p in spec["inputs"].items() if p},
+        "mixed": mixed,
+        "stems": {k: v for k, v in stems.items() if v},
+    }
+    counts = ", ".join(f"{r}={len(p)}" for r, p in spec["inputs"].items() if p)
+    print(f"[user_stems] {sid}: using supplied stems ({counts}); separation skipped")
+    return stems
@@ -0,0 +1,108 @@
+"""
+retry-failed after a run that died in transcribe_drums: the pitched stages
+had succeeded, but the notes were never stored.
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pretty_midi
+import pytest
+import soundfile as sf
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+_cwd = os.getcwd()
+os.chdir(REPO)  # pipeline loads config.yaml from the working directory
+try:
+    import pipeline
+finally:
+    os.chdir(_cwd)
+from utils.note_store import save_notes
+
+
+def _inst(name, pitch, is_drum=False):
+    inst = pretty_midi.Instrument(program=0, is_drum=is_drum, name=name)
+    inst.notes.append(pretty_midi.Note(velocity=100, pitch=pitch, start=0.5, end=1.0))
+    return inst
+
+
+@pytest.fixture
+def failed_song(tmp_path, monkeypatch):
+    """
+    Manifest as left by a run whose drum stage raised: pitched statuses True,
+    a drums failure, and a note store from the song's previous run.
+    """
+    monkeypatch.chdir(tmp_path)
+    sid = "song"
+    stems = {}
+    for stem in ("vocals", "drums", "bass", "guitar", "other"):
+        path = tmp_path / "stems" / f"{stem}.wav"
+        path.parent.mkdir(exist_ok=True)
+        sf.write(str(path), np.zeros(2205, dtype=np.float32), 22050)
+        stems[stem] = str(path)
+
+    notes_path = str(tmp_path / "notes" / f"{sid}.npz")
+    os.makedirs(os.path.dirname(notes_path))
+    save_notes(notes_path, {}, _inst("drums", 36, is_drum=True))  # the earlier run's (empty) notes
+
+    manifest = {
+        "song_id": sid,
+        "source_audio": stems["other"],
+        "run_started_at": time.time(),
+        "separation": {"stems": stems},
+        "meter_key": {"tempo": 120.0, "downbeats": [], "meter": {"numerator": 4, "denominator": 4, "confidence": 0.9}},
+        "transcription": {"pitched": {"voxlead": True, "voxbg": "no_notes", "bass": True, "guitar": True, "other": True}},
+        "failures": {"transcribe_drums": {"kind": "crash", "attempts": []}},
+        "notes": {"path": notes_path, "count": 1, "source": "transcription", "at": time.time() - 3600},
+    }
+    os.makedirs("manifests")
+    manifest_path = f"manifests/{sid}.json"
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return manifest_path, manifest
+
+
+def test_plan_redoes_every_stem_when_notes_are_stale(failed_song):
+    _, manifest = failed_song
+    plan = pipeline._retry_plan(manifest)
+    assert plan["stems"] == ["bass", "guitar", "other", "vocals"]
+    assert plan["drums"] is True
+
+
+def test_plan_keeps_pitched_work_when_notes_are_current(failed_song):
+    _, manifest = failed_song
+    manifest["notes"]["at"] = time.time()
+    plan = pipeline._retry_plan(manifest)
+    assert plan["stems"] == []
+    assert plan["drums"] is True
+
+
+def test_retry_writes_pitched_tracks(failed_song, monkeypatch):
+    manifest_path, _ = failed_song
+
+    def fake_pitched(stems, CFG, manifest, redecode=False):
+        names = {"vocals": ["voxlead"], "bass": ["bass"], "guitar": ["guitar"], "other": ["other"]}
+        out = {t: _inst(t, 60) for stem, ts in names.items() if stems.get(stem) for t in ts}
+        manifest.setdefault("transcription", {})["pitched"] = {t: True for t in out}
+        return out
+
+    def fake_drums(path, CFG, manifest):
+        manifest.setdefault("transcription", {})["drums"] = True
+        return _inst("drums", 36, is_drum=True)
+
+    finished = {}
+
+    def fake_finish(pitched, drums, *args, **kwargs):
+        finished["pitched"], finished["drums"] = pitched, drums
+
+    monkeypatch.setattr(pipeline, "transcribe_pitched_tracks", fake_pitched)
+    monkeypatch.setattr(pipeline, "transcribe_drums_to_midi", fake_drums)
+    monkeypatch.setattr(pipeline, "finish_song", fake_finish)
+
+    sid, ok, msg = pipeline._retry_one(manifest_path)
+    assert ok, msg
+    assert sorted(finished["pitched"]) == ["bass", "guitar", "other", "voxlead"]
+    assert finished["drums"] is not None
@@ -0,0 +1,29 @@
+"""
+Reference renders: every track of a MIDI reaches the mix, even when two
+tracks share a name.
+"""
+import os
+import sys
+
+import numpy as np
+import pretty_midi
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+from utils.synth import render_instruments, render_notes, track_names
+
+
+def _inst(name, pitch):
+    inst = pretty_midi.Instrument(program=24, name=name)
+    inst.notes.append(pretty_midi.Note(velocity=100, pitch=pitch, start=0.0, end=1.0))
+    return inst
+
+
+def test_same_named_tracks_are_all_mixed():
+    insts = [_inst("Guitar", 60), _inst("Guitar", 67), _inst("", 48)]
+    assert track_names(insts) == ["Guitar", "Guitar-2", "track2"]
+
+    mix, stems = render_instruments(insts, sr=8000)
+    assert list(stems) == ["Guitar", "Guitar-2", "track2"]
+    expected = sum(render_notes(i.notes, sr=8000, duration_s=2.0) for i in insts)
+    assert np.allclose(mix, expected)
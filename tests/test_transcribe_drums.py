@@ -0,0 +1,97 @@
+"""
+Drum transcription: ADTOF's own MIDI by default, cached activations and our
+peak picker when transcription.drums.activation_fn is configured.
+"""
+import os
+import sys
+import types
+
+import numpy as np
+import pretty_midi
+import pytest
+import soundfile as sf
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+from utils.manifest import load_config
+from steps.transcribe_drums import ADTOF_LABELS, transcribe_drums_to_midi
+
+SR = 22050
+HITS_S = [0.5, 1.0, 1.5, 2.0]
+
+
+@pytest.fixture
+def drum_stem(tmp_path):
+    y = np.zeros(int(3.0 * SR), dtype=np.float32)
+    for t in HITS_S:
+        i = int(t * SR)
+        y[i:i + SR // 2] = 0.8 * np.exp(-np.arange(SR // 2) / 3000.0)
+    path = tmp_path / "drums.wav"
+    sf.write(str(path), y, SR)
+    return str(path)
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    cfg = load_config(os.path.join(REPO, "config.yaml"))
+    cfg["transcription"]["activation_cache_dir"] = str(tmp_path / "activations")
+    return cfg
+
+
+def _fake_adtof(monkeypatch, calls):
+    def transcribe_to_midi(audio_path, out_mid):
+        calls.append(audio_path)
+        pm = pretty_midi.PrettyMIDI()
+        inst = pretty_midi.Instrument(program=0, is_drum=True)
+        for t in HITS_S:
+            inst.notes.append(pretty_midi.Note(velocity=100, pitch=36, start=t, end=t + 0.05))
+        pm.instruments.append(inst)
+        pm.write(out_mid)
+
+    monkeypatch.setitem(sys.modules, "adtof_pytorch", types.SimpleNamespace(transcribe_to_midi=transcribe_to_midi))
+
+
+def _fake_activations(audio_path):
+    """
+    [T, C] curves at 100 fps with one snare peak per hit.
+    """
+    n = int(np.ceil(sf.info(audio_path).duration * 100))
+    act = np.zeros((n, len(ADTOF_LABELS)), dtype=np.float32)
+    for t in HITS_S:
+        act[int(t * 100), ADTOF_LABELS.index(38)] = 0.5
+    return act
+
+
+def test_default_config_uses_adtof_midi(drum_stem, cfg, monkeypatch):
+    calls = []
+    _fake_adtof(monkeypatch, calls)
+    manifest = {"song_id": "song"}
+    kit = transcribe_drums_to_midi(drum_stem, cfg, manifest)
+    assert calls, "ADTOF's transcribe_to_midi was not called"
+    assert manifest["transcription"]["drums"] is True
+    assert len(kit.notes) == len(HITS_S)
+    assert "drum_activations" not in manifest["transcription"]
+
+
+def test_activation_fn_is_cached_and_repicked(drum_stem, cfg, monkeypatch):
+    monkeypatch.setitem(sys.modules, "fake_adtof_acts", types.SimpleNamespace(activations=_fake_activations))
+    cfg["transcription"]["drums"]["activation_fn"] = "fake_adtof_acts:activations"
+    manifest = {"song_id": "song"}
+
+    kit = transcribe_drums_to_midi(drum_stem, cfg, manifest)
+    assert os.path.exists(manifest["transcription"]["drum_activations"])
+    assert [n.pitch for n in kit.notes] == [38] * len(HITS_S)
+    assert np.allclose([n.start for n in kit.notes], HITS_S, atol=0.02)
+
+    # re-picking reads only the cache: a snare threshold above the peaks drops every hit
+    monkeypatch.delitem(sys.modules, "fake_adtof_acts")
+    cfg["transcription"]["drums"]["thresholds"] = {38: 0.6}
+    assert transcribe_drums_to_midi(drum_stem, cfg, manifest, repick=True) is None
+    assert manifest["transcription"]["drums"] == "no_notes"
+
+
+def test_unresolvable_activation_fn_fails_loudly(drum_stem, cfg):
+    cfg["transcription"]["drums"]["activation_fn"] = "no_such_module:activations"
+    manifest = {"song_id": "song"}
+    assert transcribe_drums_to_midi(drum_stem, cfg, manifest) is None
+    assert manifest["transcription"]["drums"].startswith("error:adtof:")
@@ -1,9 +1,122 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
 import librosa, soundfile as sf, numpy as np
 
-def load_audio_mono(path, sr=44100):
-    y, s = librosa.load(path, sr=sr, mono=True)
+from utils import decode_cache, shm_transport
+
+
+class AudioArray:
+    """
+    An in-memory stem, passed between stages in place of a file path
+    (see pipeline_api.run_in_memory). y is float32, shape [n] or [channels, n].
+    """
+    __slots__ = ("y", "sr", "name")
+
+    def __init__(self, y, sr, name=""):
+        self.y = np.asarray(y, dtype=np.float32)
+        self.sr = int(sr)
+        self.name = name
+
+    @property
+    def frames(self):
+        return self.y.shape[-1]
+
+    @property
+    def duration(self):
+        return self.frames / float(self.sr)
+
+    def mono(self, sr=None):
+        y = self.y if self.y.ndim == 1 else self.y.mean(axis=0)
+        if sr and int(sr) != self.sr:
+            # same resampler librosa.load uses, so results match the file path
+            y = librosa.resample(y, orig_sr=self.sr, target_sr=int(sr))
+        return y
+
+    def __repr__(self):
+        return f"AudioArray({self.name or '?'}, {self.duration:.1f}s @ {self.sr} Hz)"
+
+
+def is_in_memory(audio):
+    return isinstance(audio, AudioArray)
+
+
+def audio_exists(audio):
+    """
+    True for an in-memory stem or an existing file path.
+    """
+    if is_in_memory(audio):
+        return True
+    return bool(audio) and os.path.exists(audio)
+
+
+def audio_duration(audio):
+    if is_in_memory(audio):
+        return audio.duration
+    return float(sf.info(audio).duration)
+
+
+def ram_tmp_dir():
+    """
+    RAM-backed temp dir (Linux /dev/shm) when available, else the default.
+    """
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+
+@contextmanager
+def as_path(audio, name="audio.wav"):
+    """
+    Yield a file path for `audio`. Paths pass through; an in-memory stem is
+    written to a RAM-backed temp file for tools that only read files (ADTOF).
+    """
+    if not is_in_memory(audio):
+        yield audio
+        return
+    with tempfile.TemporaryDirectory(dir=ram_tmp_dir()) as tmpdir:
+        path = os.path.join(tmpdir, name)
+        sf.write(path, audio.mono(), audio.sr, subtype="FLOAT")
+        yield path
+
+
+def load_audio_mono(path, sr=44100, duration=None):
+    """
+    Mono float32 at `sr` (None = native). `duration` loads only the first
+    `duration` seconds.
+
+    Inside a song's transport scope (utils/shm_transport.py) the decode is
+    shared: the first process to load (path, sr, duration) publishes it, later
+    ones - other stages, stage children - get a read-only zero-copy view.
+    With the decode cache on (utils/decode_cache.py) it also persists across
+    runs as a memory-mapped file, which is returned as is (already shared).
+    """
+    if is_in_memory(path):
+        if duration is not None:
+            path = AudioArray(path.y[..., : int(duration * path.sr)], path.sr, name=path.name)
+        return path.mono(sr), (sr or path.sr)
+    key = None
+    if sr and shm_transport.active_scope():
+        key = shm_transport.file_key(path, "mono", sr, duration)
+        y = shm_transport.lookup(key)
+        if y is not None:
+            return y, sr
+    y = decode_cache.lookup(path, sr, duration)
+    if y is not None:
+        return y, sr
+    y, s = librosa.load(path, sr=sr, mono=True, duration=duration)
+    decode_cache.store(path, sr, y, duration)
+    if key is not None:
+        shm_transport.publish(key, y)
     return y, s
 
+def file_signature(path):
+    """
+    [size, mtime (s)] of a stem: cached posteriors/activations tagged with it
+    are stale once the stem is rewritten.
+    """
+    st = os.stat(path)
+    return np.array([st.st_size, int(st.st_mtime)], dtype=np.int64)
+
 def write_audio(path, y, sr):
     sf.write(path, y, sr)
 
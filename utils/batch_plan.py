@@ -0,0 +1,330 @@
+"""
+Dry-run cost estimate for a batch (`pipeline.py plan`).
+
+For every matching file: duration from the header (no decode), which stages
+are already covered by what is on disk (finished MIDI, stems, posterior and
+activation caches) or failed last time, and the remaining time and peak
+memory per stage. Rates (seconds of work per second of audio) and memory
+come from the timings/memory_mb that manifests record; until there are
+`plan.min_history` songs with them, `plan.default_rate` / `default_memory_mb`
+stand in.
+
+Only manifests, file headers and directory listings are read - no model or
+audio library is imported - so this answers in seconds for large deliveries.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import soundfile as sf
+
+from utils.manifest import read_manifest, song_id_from_path
+from utils.stem_store import has_stems
+from steps.user_stems import find_user_stems, batch_songs, song_path, source_signature as user_stems_signature
+
+STAGES = ("separation", "beats_meter", "transcribe_pitched", "transcribe_drums", "symbolic")
+
+_DEFAULT_RATE = {
+    "separation": 1.5,
+    "beats_meter": 0.1,
+    "transcribe_pitched": 0.6,
+    "transcribe_drums": 0.3,
+    "symbolic": 0.05,
+}
+_DEFAULT_MEMORY_MB = {
+    "separation": 4000,
+    "beats_meter": 800,
+    "transcribe_pitched": 2500,
+    "transcribe_drums": 2000,
+    "symbolic": 500,
+}
+# rough compressed bitrates for files whose header soundfile cannot read
+_BYTES_PER_S = {".mp3": 24000, ".m4a": 24000, ".aac": 24000, ".ogg": 20000, ".opus": 16000}
+
+
+def _plan_cfg(CFG: dict) -> dict:
+    return CFG.get("plan") or {}
+
+
+def probe_duration(path: str, manifest: dict = None):
+    """
+    (seconds, exact). Uses the manifest's ingest duration for an unchanged
+    file, else the file header, else a size-based guess.
+    """
+    st = os.stat(path)
+    manifest = manifest or {}
+    d = (manifest.get("ingest") or {}).get("duration")
+    if d and manifest.get("source_signature") == [st.st_size, int(st.st_mtime)]:
+        return float(d), True
+    try:
+        return float(sf.info(path).duration), True
+    except Exception:
+        ext = os.path.splitext(path)[1].lower()
+        return st.st_size / float(_BYTES_PER_S.get(ext, 176400)), False
+
+
+def _quantile(values, q):
+    return float(np.quantile(np.asarray(values, dtype=np.float64), q)) if values else None
+
+
+def history(CFG: dict, pattern: str = "manifests/*.json") -> dict:
+    """
+    Per-stage rate (upper quartile of seconds per audio second) and peak
+    memory (90th percentile, MB) over recorded runs, falling back to the
+    configured defaults for stages with too little history.
+    """
+    pcfg = _plan_cfg(CFG)
+    min_n = int(pcfg.get("min_history", 3))
+    rates = {s: [] for s in STAGES}
+    mems = {s: [] for s in STAGES}
+    for mp in glob.glob(pattern):
+        try:
+            with open(mp, "r") as f:
+                m = json.load(f)
+        except (OSError, ValueError):
+            continue
+        dur = float((m.get("ingest") or {}).get("duration") or 0.0)
+        timings = m.get("timings") or {}
+        for stage in STAGES:
+            t = timings.get(stage)
+            # reused or user-supplied stems say nothing about the cost of separating
+            sep = m.get("separation") or {}
+            if stage == "separation" and (sep.get("reused") or sep.get("user_supplied")):
+                t = None
+            if t is not None and dur > 0:
+                rates[stage].append(float(t) / dur)
+            mb = (m.get("memory_mb") or {}).get(stage)
+            if mb:
+                mems[stage].append(float(mb))
+
+    default_rate = {**_DEFAULT_RATE, **(pcfg.get("default_rate") or {})}
+    default_mem = {**_DEFAULT_MEMORY_MB, **(pcfg.get("default_memory_mb") or {})}
+    out = {"rate": {}, "memory_mb": {}, "source": {}, "runs": {}}
+    for stage in STAGES:
+        enough = len(rates[stage]) >= min_n
+        out["rate"][stage] = _quantile(rates[stage], 0.75) if enough else float(default_rate[stage])
+        out["source"][stage] = "history" if enough else "default"
+        out["runs"][stage] = len(rates[stage])
+        out["memory_mb"][stage] = (
+            _quantile(mems[stage], 0.9) if len(mems[stage]) >= min_n else float(default_mem[stage])
+        )
+    return out
+
+
+def _stems_on_disk(manifest: dict, sid: str, CFG: dict):
+    """
+    {stem: path} of the song's separated stems if they are all still there, else None.
+    """
+    stems = (manifest.get("separation") or {}).get("stems") or {}
+    if stems and all(os.path.exists(p) for p in stems.values()):
+        return stems
+    scfg = CFG.get("separation") or {}
+    song_dir = os.path.join(scfg.get("out_dir", "data/stems"), scfg.get("demucs_model", "htdemucs_6s"), sid)
+    if has_stems(song_dir):
+        return {}  # present, but which file is which is only known after separate_track
+    return None
+
+
+def song_state(path: str, CFG: dict) -> dict:
+    """
+    Duration and per-stage state: done | cached | todo | failed.
+    """
+    path = song_path(path)
+    sid = song_id_from_path(path)
+    manifest = read_manifest(f"manifests/{sid}.json")
+    user = find_user_stems(path, CFG)
+    if user:
+        # bring-your-own stems: nothing to separate; the duration is the longest input's
+        inputs = ([user["mix"]] if user["mix"] else []) + [p for ps in user["inputs"].values() for p in ps]
+        duration, exact = max(probe_duration(p) for p in inputs)
+        signature = user_stems_signature(user)
+    else:
+        duration, exact = probe_duration(path, manifest)
+        st = os.stat(path)
+        signature = [st.st_size, int(st.st_mtime)]
+    tcfg = CFG.get("transcription") or {}
+
+    out_mid = (manifest.get("output") or {}).get("midi")
+    finished = (
+        bool(out_mid) and os.path.exists(out_mid)
+        and manifest.get("source_signature") == signature
+        and (manifest.get("queue") or {}).get("status") not in ("running", "error")
+    )
+    if finished:
+        return {"song_id": sid, "path": path, "duration_s": duration, "duration_exact": exact,
+                "stages": {s: "done" for s in STAGES}}
+
+    failures = manifest.get("failures") or {}
+    trans = manifest.get("transcription") or {}
+    states = {s: ("failed" if s in failures else "todo") for s in STAGES}
+
+    stems = _stems_on_disk(manifest, sid, CFG)
+    if user or (stems is not None and "separation" not in failures):
+        states["separation"] = "cached"
+
+    pitched = trans.get("pitched") or {}
+    pitched_failed = any(str(v).startswith("error") for v in pitched.values())
+    if pitched_failed:
+        states["transcribe_pitched"] = "failed"
+    elif stems:
+        post_dir = os.path.join(tcfg.get("posterior_cache_dir", "data/posteriors"), sid)
+        names = [k for k in stems if k != "drums"]
+        if names and all(os.path.exists(os.path.join(post_dir, f"{k}.npz")) for k in names):
+            states["transcribe_pitched"] = "cached"
+
+    if str(trans.get("drums", "")).startswith("error"):
+        states["transcribe_drums"] = "failed"
+    elif os.path.exists(os.path.join(tcfg.get("activation_cache_dir", "data/activations"), sid, "drums.npz")):
+        states["transcribe_drums"] = "cached"
+
+    return {"song_id": sid, "path": path, "duration_s": duration, "duration_exact": exact, "stages": states}
+
+
+def _available_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e6
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def suggest_workers(n_songs: int, peak_mb: float, CFG: dict) -> dict:
+    """
+    Concurrent songs this host can take: limited by cores (plan.cores_per_worker
+    each) and by available memory (plan.memory_headroom of it, at the
+    heaviest stage's peak per song).
+    """
+    pcfg = _plan_cfg(CFG)
+    cpu = os.cpu_count() or 1
+    by_cpu = max(1, cpu // max(1, int(pcfg.get("cores_per_worker", 2))))
+    avail = _available_mb()
+    by_mem = None
+    if avail and peak_mb:
+        by_mem = max(1, int(avail * float(pcfg.get("memory_headroom", 0.8)) // peak_mb))
+    workers = min(by_cpu, by_mem or by_cpu, max(1, n_songs))
+    return {"workers": workers, "cpu_count": cpu, "by_cpu": by_cpu, "by_memory": by_mem,
+            "available_mb": round(avail) if avail else None}
+
+
+def plan_batch(pattern: str, CFG: dict, workers: int = None, history_pattern: str = "manifests/*.json") -> dict:
+    pcfg = _plan_cfg(CFG)
+    cached_fraction = float(pcfg.get("cached_fraction", 0.1))
+    hist = history(CFG, history_pattern)
+
+    songs = []
+    totals = {s: 0.0 for s in STAGES}
+    peak_mb = 0.0
+    for path in batch_songs(glob.glob(pattern), CFG):
+        song = song_state(path, CFG)
+        est = {}
+        for stage, state in song["stages"].items():
+            full = hist["rate"][stage] * song["duration_s"]
+            if state == "done" or (state == "cached" and stage == "separation"):
+                est[stage] = 0.0
+            elif state == "cached":
+                est[stage] = full * cached_fraction
+            else:
+                est[stage] = full
+            totals[stage] += est[stage]
+        pending = [s for s, e in est.items() if e > 0]
+        song["estimate_s"] = {s: round(e, 1) for s, e in est.items()}
+        song["remaining_s"] = round(sum(est.values()), 1)
+        song["peak_mb"] = round(max((hist["memory_mb"][s] for s in pending), default=0.0))
+        peak_mb = max(peak_mb, song["peak_mb"])
+        songs.append(song)
+
+    todo = [s for s in songs if s["remaining_s"] > 0]
+    suggestion = suggest_workers(len(todo), peak_mb, CFG)
+    n_workers = int(workers or suggestion["workers"])
+    total = sum(totals.values())
+    longest = max((s["remaining_s"] for s in todo), default=0.0)
+    return {
+        "pattern": pattern,
+        "songs": songs,
+        "n_songs": len(songs),
+        "n_done": len(songs) - len(todo),
+        "audio_s": round(sum(s["duration_s"] for s in songs), 1),
+        "stage_totals_s": {s: round(v, 1) for s, v in totals.items()},
+        "cpu_s": round(total, 1),
+        "workers": n_workers,
+        "suggested": suggestion,
+        # a song is not split across workers, so the longest one bounds the wall time
+        "wall_s": round(max(total / n_workers, longest), 1),
+        "peak_mb_per_worker": round(peak_mb),
+        "history": hist,
+    }
+
+
+def _hms(seconds: float) -> str:
+    s = int(round(seconds))
+    return f"{s // 3600}:{s % 3600 // 60:02d}:{s % 60:02d}"
+
+
+_STATE_MARK = {"done": "=", "cached": "c", "todo": ".", "failed": "!"}
+
+
+def print_plan(plan: dict, limit: int = 0):
+    print(f"[plan] {plan['n_songs']} file(s) for {plan['pattern']!r}, {_hms(plan['audio_s'])} of audio, "
+          f"{plan['n_done']} already done")
+    print("[plan] stages: " + " ".join(STAGES) + "   (= done, c cached, . to do, ! failed last run)")
+    shown = 0
+    for song in plan["songs"]:
+        if limit and shown >= limit:
+            print(f"[plan] ... {plan['n_songs'] - shown} more (see --out for all)")
+            break
+        marks = "".join(_STATE_MARK[song["stages"][s]] for s in STAGES)
+        dur = _hms(song["duration_s"]) + ("" if song["duration_exact"] else "~")
+        print(f"  {marks}  {dur:>9}  {_hms(song['remaining_s']):>9}  {song['peak_mb']:>6} MB  {song['song_id']}")
+        shown += 1
+
+    hist = plan["history"]
+    for stage in STAGES:
+        print(f"[plan] {stage:<19} {_hms(plan['stage_totals_s'][stage]):>9}  "
+              f"rate {hist['rate'][stage]:.3f} s/s ({hist['source'][stage]}, {hist['runs'][stage]} runs)  "
+              f"peak {hist['memory_mb'][stage]:.0f} MB")
+    sug = plan["suggested"]
+    mem = f", {sug['by_memory']} by memory ({sug['available_mb']} MB free)" if sug["by_memory"] else ""
+    print(f"[plan] suggested workers: {sug['workers']} ({sug['by_cpu']} by {sug['cpu_count']} cores{mem})")
+    print(f"[plan] total: {_hms(plan['cpu_s'])} of work; ~{_hms(plan['wall_s'])} wall with "
+          f"{plan['workers']} worker(s) at up to {plan['peak_mb_per_worker']} MB each")
+
+
+def cmd_plan(pattern: str, CFG: dict, workers: int = None, out: str = None, limit: int = 0) -> int:
+    if not glob.glob(pattern):
+        print(f"No files match: {pattern}")
+        return 1
+    plan = plan_batch(pattern, CFG, workers=workers)
+    print_plan(plan, limit=limit)
+    if out:
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(plan, f, indent=2)
+        print(f"[plan] wrote {out}")
+    return 0
+
+
+def add_arguments(p):
+    p.add_argument("pattern", help='e.g., "data/raw/*.wav"')
+    p.add_argument("--workers", type=int, default=None, help="Plan for this many workers (default: suggested)")
+    p.add_argument("--out", default=None, help="Also write the full plan as JSON")
+    p.add_argument("--limit", type=int, default=0, help="Show at most this many songs (0 = all)")
+
+
+def main(argv, config_path: str = "config.yaml") -> int:
+    """
+    `pipeline.py plan ...` without importing the pipeline (and its models).
+    """
+    import argparse
+    from utils.manifest import load_config
+
+    ap = argparse.ArgumentParser(prog="pipeline.py plan", description="Estimate time/memory of a batch")
+    add_arguments(ap)
+    args = ap.parse_args(argv)
+    return cmd_plan(args.pattern, load_config(config_path), workers=args.workers, out=args.out, limit=args.limit)
@@ -0,0 +1,216 @@
+"""
+Basic Pitch runtime selection.
+
+basic-pitch ships the same ICASSP-2022 model as a TF SavedModel, TFLite, ONNX
+and CoreML file, and its Model() class loads whichever runtime happens to be
+installed. Here we pick the runtime explicitly, control its thread count, and
+optionally benchmark the available ones once per host (--autotune).
+"""
+import json
+import importlib.metadata
+import os
+import socket
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+import basic_pitch
+from basic_pitch import FilenameSuffix, build_icassp_2022_model_path
+from basic_pitch.inference import Model, run_inference
+
+BACKENDS = {
+    "tf": (FilenameSuffix.tf, "TF_PRESENT"),
+    "tflite": (FilenameSuffix.tflite, "TFLITE_PRESENT"),
+    "onnx": (FilenameSuffix.onnx, "ONNX_PRESENT"),
+    "coreml": (FilenameSuffix.coreml, "CT_PRESENT"),
+}
+
+# tflite can also run through tensorflow.lite when tflite-runtime is missing
+_ALSO_PRESENT_WITH = {"tflite": "TF_PRESENT"}
+
+
+def _bp_version():
+    try:
+        return importlib.metadata.version("basic-pitch")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def _runtime_cfg(CFG: dict) -> dict:
+    return (CFG.get("transcription") or {}).get("basic_pitch_runtime") or {}
+
+
+def available_backends():
+    out = []
+    for name, (suffix, flag) in BACKENDS.items():
+        present = getattr(basic_pitch, flag, False) or getattr(basic_pitch, _ALSO_PRESENT_WITH.get(name, ""), False)
+        if present and build_icassp_2022_model_path(suffix).exists():
+            out.append(name)
+    return out
+
+
+def load_model(backend: str = "auto", threads: int = 0) -> Model:
+    """
+    Load the Basic Pitch model on a specific runtime. threads=0 keeps the
+    runtime's default.
+    """
+    if backend in (None, "", "auto"):
+        return Model(basic_pitch.ICASSP_2022_MODEL_PATH)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown Basic Pitch backend {backend!r}; choose from {sorted(BACKENDS)}")
+    if backend not in available_backends():
+        raise RuntimeError(f"Basic Pitch backend {backend!r} is not available here ({available_backends()})")
+
+    path = str(build_icassp_2022_model_path(BACKENDS[backend][0]))
+    threads = int(threads or 0)
+
+    if backend == "tf" and threads:
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError as e:
+            # only settable before TF initializes; a second model in this process keeps the first's pools
+            print(f"[bp_backends] TF thread pools already initialized, keeping them ({e})")
+
+    model = Model(path)
+
+    # Model() picks the first runtime that accepts the file; make sure it's the one we asked for.
+    expected = {
+        "tf": Model.MODEL_TYPES.TENSORFLOW,
+        "tflite": Model.MODEL_TYPES.TFLITE,
+        "onnx": Model.MODEL_TYPES.ONNX,
+        "coreml": Model.MODEL_TYPES.COREML,
+    }[backend]
+    if model.model_type != expected:
+        raise RuntimeError(f"{path} loaded as {model.model_type.name}, expected {expected.name}")
+
+    if threads and backend == "onnx":
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        model.model = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+    elif threads and backend == "tflite":
+        try:
+            import tflite_runtime.interpreter as tflite
+        except ImportError:
+            import tensorflow.lite as tflite
+        model.interpreter = tflite.Interpreter(path, num_threads=threads)
+        model.model = model.interpreter.get_signature_runner()
+    return model
+
+
+def _synthetic_clip(path: str, seconds: float = 8.0, sr: int = 22050):
+    """
+    A few seconds of plucked-ish chords with some noise; enough to exercise
+    every part of the model without shipping audio fixtures.
+    """
+    t = np.arange(int(seconds * sr)) / sr
+    y = np.zeros_like(t)
+    chords = [(48, 55, 64), (45, 52, 60, 67), (53, 57, 60), (43, 50, 59, 62)]
+    step = seconds / len(chords)
+    for i, chord in enumerate(chords):
+        env = np.where(t >= i * step, np.exp(-(t - i * step) * 2.5), 0.0)
+        for p in chord:
+            y += env * np.sin(2 * np.pi * 440.0 * 2 ** ((p - 69) / 12.0) * t)
+    y += 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    sf.write(path, (0.25 * y / np.max(np.abs(y))).astype(np.float32), sr)
+
+
+def _cache_path(CFG: dict) -> str:
+    cache_dir = _runtime_cfg(CFG).get("autotune_cache_dir", "data/cache")
+    return os.path.join(cache_dir, f"bp_backend_{socket.gethostname()}.json")
+
+
+def cached_choice(CFG: dict):
+    p = _cache_path(CFG)
+    if not os.path.exists(p):
+        return None
+    with open(p, "r") as f:
+        choice = json.load(f)
+    # stale if basic-pitch or the set of installed runtimes changed
+    if choice.get("basic_pitch") != _bp_version() or \
+            choice.get("available") != available_backends():
+        return None
+    return choice
+
+
+def autotune(CFG: dict, repeats: int = 2):
+    """
+    Time every available backend on a synthetic clip, drop the ones whose
+    posteriors disagree with the reference by more than `tolerance` (max abs
+    diff), and cache the fastest for this host.
+    """
+    rcfg = _runtime_cfg(CFG)
+    threads = int(rcfg.get("threads", 0) or 0)
+    tolerance = float(rcfg.get("agreement_tolerance", 0.02))
+    backends = available_backends()
+    if not backends:
+        raise RuntimeError("No Basic Pitch runtime is installed")
+
+    results = {}
+    outputs = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        clip = os.path.join(tmpdir, "autotune.wav")
+        _synthetic_clip(clip)
+        for name in backends:
+            try:
+                model = load_model(name, threads)
+                run_inference(clip, model)  # warm-up
+                t0 = time.perf_counter()
+                for _ in range(repeats):
+                    out = run_inference(clip, model)
+                results[name] = {"seconds": (time.perf_counter() - t0) / repeats}
+                outputs[name] = out
+            except Exception as e:
+                results[name] = {"error": str(e)}
+                print(f"[bp_backends] {name}: {e}")
+
+    ok = [n for n in backends if n in outputs]
+    if not ok:
+        raise RuntimeError(f"No Basic Pitch backend ran successfully: {results}")
+    reference = "tf" if "tf" in ok else ok[0]
+    for name in ok:
+        diff = max(
+            float(np.max(np.abs(outputs[name][k] - outputs[reference][k])))
+            for k in ("note", "onset", "contour")
+        )
+        results[name]["max_abs_diff"] = diff
+        results[name]["agrees"] = diff <= tolerance
+
+    candidates = [n for n in ok if results[n]["agrees"]]
+    best = min(candidates, key=lambda n: results[n]["seconds"])
+    choice = {
+        "backend": best,
+        "threads": threads,
+        "reference": reference,
+        "results": results,
+        "basic_pitch": _bp_version(),
+        "available": backends,
+        "host": socket.gethostname(),
+        "tuned_at": time.time(),
+    }
+    p = _cache_path(CFG)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    with open(p, "w") as f:
+        json.dump(choice, f, indent=2)
+    print(f"[bp_backends] autotune picked {best} ({results[best]['seconds']:.2f}s per clip); cached in {p}")
+    return choice
+
+
+def resolve_backend(CFG: dict):
+    """
+    (backend, threads) to use: explicit config wins; "auto" uses this host's
+    autotune result if there is one, else basic-pitch's own default.
+    """
+    rcfg = _runtime_cfg(CFG)
+    backend = rcfg.get("backend", "auto") or "auto"
+    threads = int(rcfg.get("threads", 0) or 0)
+    if backend == "auto":
+        choice = cached_choice(CFG)
+        if choice:
+            return choice["backend"], threads
+    return backend, threads
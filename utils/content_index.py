@@ -0,0 +1,166 @@
+"""
+Content index: file hash + coarse audio fingerprint -> song IDs.
+
+Layout (under `index_dir`):
+    content_index.json         {"by_hash": {...}, "by_song": {...}}
+    fingerprints/<hash>.npy    packed fingerprint bits, one row per frame
+
+The fingerprint is a Haitsma/Kalker-style sign-of-energy-difference code over
+log-spaced bands, computed from a low-rate mono decode. It is robust to
+re-encoding and small gain changes, which is all we need to flag re-sends.
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import librosa
+import numpy as np
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def audio_fingerprint(path: str, sr: int = 8000, n_fft: int = 2048, hop: int = 512,
+                      n_bands: int = 17, fmin: float = 300.0, fmax: float = 2000.0):
+    """
+    Returns (packed_bits uint8 [n_frames, ceil((n_bands-1)/8)], duration_s).
+    """
+    y, sr = librosa.load(path, sr=sr, mono=True, res_type="soxr_qq")
+    duration = float(len(y)) / sr
+    if len(y) < n_fft:
+        return np.zeros((0, (n_bands + 6) // 8), dtype=np.uint8), duration
+
+    power = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop, center=False)) ** 2
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    edges = np.searchsorted(freqs, np.geomspace(fmin, fmax, n_bands + 1))
+    csum = np.vstack([np.zeros((1, power.shape[1])), np.cumsum(power, axis=0)])
+    energy = csum[edges[1:]] - csum[edges[:-1]]          # (n_bands, T)
+
+    band_diff = energy[:-1] - energy[1:]                   # (n_bands-1, T)
+    bits = (band_diff[:, 1:] - band_diff[:, :-1]) > 0      # (n_bands-1, T-1)
+    return np.packbits(bits.T, axis=1), duration
+
+
+def fingerprint_similarity(a, b, max_shift: int = 3) -> float:
+    """
+    1 - best bit error rate over small frame offsets. ~0.5 for unrelated audio.
+    """
+    if a.size == 0 or b.size == 0:
+        return 0.0
+    ua = np.unpackbits(a, axis=1).astype(bool)
+    ub = np.unpackbits(b, axis=1).astype(bool)
+    best = 1.0
+    for shift in range(-max_shift, max_shift + 1):
+        xa = ua[max(0, shift):]
+        xb = ub[max(0, -shift):]
+        n = min(len(xa), len(xb))
+        if n == 0:
+            continue
+        best = min(best, float(np.mean(xa[:n] ^ xb[:n])))
+    return 1.0 - best
+
+
+@contextmanager
+def _locked(path: str, timeout_s: float = 60.0, stale_s: float = 300.0):
+    lock = f"{path}.lock"
+    deadline = time.time() + timeout_s
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > stale_s:
+                    os.unlink(lock)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Could not lock {path}")
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(lock)
+        except FileNotFoundError:
+            pass
+
+
+class ContentIndex:
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.path = os.path.join(index_dir, "content_index.json")
+        self.fp_dir = os.path.join(index_dir, "fingerprints")
+        os.makedirs(self.fp_dir, exist_ok=True)
+
+    def _load(self) -> dict:
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        else:
+            data = {}
+        data.setdefault("by_hash", {})
+        data.setdefault("by_song", {})
+        return data
+
+    def _save(self, data: dict):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def save_fingerprint(self, digest: str, fp):
+        np.save(os.path.join(self.fp_dir, f"{digest}.npy"), fp)
+
+    def load_fingerprint(self, digest: str):
+        p = os.path.join(self.fp_dir, f"{digest}.npy")
+        return np.load(p) if os.path.exists(p) else None
+
+    def lookup_hash(self, digest: str):
+        return self._load()["by_hash"].get(digest)
+
+    def lookup_song(self, sid: str):
+        return self._load()["by_song"].get(sid)
+
+    def near_duplicates(self, digest: str, fp, duration: float, threshold: float,
+                        duration_tol: float = 1.0):
+        """
+        [(song_id, similarity)] for indexed entries whose fingerprint matches.
+        Duration is used as a cheap pre-filter before comparing bits.
+        """
+        out = []
+        for h, entry in self._load()["by_hash"].items():
+            if h == digest or abs(float(entry.get("duration", -1e9)) - duration) > duration_tol:
+                continue
+            other = self.load_fingerprint(h)
+            if other is None:
+                continue
+            sim = fingerprint_similarity(fp, other)
+            if sim >= threshold:
+                out.append((entry["song_id"], sim))
+        return sorted(out, key=lambda x: -x[1])
+
+    def register(self, digest: str, sid: str, source_audio: str, duration: float):
+        """
+        Record sid <-> digest. The first song seen with a digest stays its owner.
+        """
+        with _locked(self.path):
+            data = self._load()
+            data["by_hash"].setdefault(digest, {
+                "song_id": sid,
+                "source_audio": source_audio,
+                "duration": duration,
+            })
+            data["by_song"][sid] = {"hash": digest, "source_audio": source_audio}
+            self._save(data)
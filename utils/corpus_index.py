@@ -0,0 +1,245 @@
+"""
+SQLite mirror of the key manifest fields, for fast corpus-wide queries.
+
+The JSON manifests stay the source of truth; this index is updated on every
+write_manifest() and can be rebuilt from manifests/*.json at any time.
+"""
+import fnmatch
+import glob
+import json
+import os
+import sqlite3
+import time
+from urllib.request import pathname2url
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    song_id         TEXT PRIMARY KEY,
+    manifest_path   TEXT,
+    source_audio    TEXT,
+    input_hash      TEXT,
+    duplicate_of    TEXT,
+    duration_s      REAL,
+    tempo           REAL,
+    meter_num       INTEGER,
+    meter_den       INTEGER,
+    meter_conf      REAL,
+    key_tonic       TEXT,
+    key_mode        TEXT,
+    key_conf        REAL,
+    key_normalized  INTEGER,
+    transpose       INTEGER,
+    midi_path       TEXT,
+    queue_status    TEXT,
+    updated_at      REAL
+);
+CREATE TABLE IF NOT EXISTS stem_status (
+    song_id  TEXT,
+    track    TEXT,
+    stage    TEXT,
+    status   TEXT,
+    PRIMARY KEY (song_id, track)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    song_id  TEXT,
+    kind     TEXT,
+    path     TEXT,
+    PRIMARY KEY (song_id, kind)
+);
+CREATE TABLE IF NOT EXISTS timings (
+    song_id  TEXT,
+    stage    TEXT,
+    seconds  REAL,
+    PRIMARY KEY (song_id, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_songs_meter_conf ON songs(meter_conf);
+CREATE INDEX IF NOT EXISTS idx_songs_tempo ON songs(tempo);
+CREATE INDEX IF NOT EXISTS idx_stem_status_status ON stem_status(status);
+"""
+
+# Named queries for the `query` subcommand. `?` placeholders are filled from config.
+PRESETS = {
+    "low-meter-conf": (
+        "SELECT song_id, meter_conf, tempo FROM songs "
+        "WHERE meter_conf IS NOT NULL AND meter_conf < ? ORDER BY meter_conf",
+        ("meter_key", "meter_conf_threshold", 0.58),
+    ),
+    "low-key-conf": (
+        "SELECT song_id, key_conf, key_tonic, key_mode FROM songs "
+        "WHERE key_conf IS NOT NULL AND key_conf < ? ORDER BY key_conf",
+        ("meter_key", "key_conf_threshold", 0.55),
+    ),
+    "errors": (
+        "SELECT song_id, track, stage, status FROM stem_status "
+        "WHERE status LIKE 'error%' ORDER BY song_id, track",
+        None,
+    ),
+    "missing": (
+        "SELECT song_id, track, stage, status FROM stem_status "
+        "WHERE status IN ('missing_stem', 'missing_activations') ORDER BY song_id, track",
+        None,
+    ),
+    "tempo-hist": (
+        "SELECT CAST(tempo / 10 AS INTEGER) * 10 AS bpm_bin, COUNT(*) AS n FROM songs "
+        "WHERE tempo IS NOT NULL GROUP BY bpm_bin ORDER BY bpm_bin",
+        None,
+    ),
+    "stage-times": (
+        "SELECT stage, COUNT(*) AS n, ROUND(AVG(seconds), 2) AS mean_s, ROUND(MAX(seconds), 2) AS max_s "
+        "FROM timings GROUP BY stage ORDER BY mean_s DESC",
+        None,
+    ),
+}
+
+
+def connect(db_path: str):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30.0)
+    con.executescript(_SCHEMA)
+    return con
+
+
+def connect_readonly(db_path: str):
+    """
+    Read-only connection for queries: SQLite itself refuses writes, whatever the SQL.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"no corpus index at {db_path}; run `pipeline.py index-rebuild`")
+    uri = "file:" + pathname2url(os.path.abspath(db_path)) + "?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=30.0)
+
+
+def _status_text(v):
+    if v is True:
+        return "ok"
+    if v is False or v is None:
+        return "none"
+    return str(v)
+
+
+def _rows_for_manifest(manifest_path: str, m: dict):
+    sid = m.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+    mk = m.get("meter_key") or {}
+    meter = mk.get("meter") or {}
+    key = m.get("key") or {}
+    ingest = m.get("ingest") or {}
+    output = m.get("output") or {}
+
+    song = {
+        "song_id": sid,
+        "manifest_path": manifest_path,
+        "source_audio": m.get("source_audio"),
+        "input_hash": ingest.get("hash"),
+        "duplicate_of": ingest.get("duplicate_of"),
+        "duration_s": ingest.get("duration"),
+        "tempo": mk.get("tempo"),
+        "meter_num": meter.get("numerator"),
+        "meter_den": meter.get("denominator"),
+        "meter_conf": meter.get("confidence"),
+        "key_tonic": key.get("detected_tonic"),
+        "key_mode": key.get("detected_mode"),
+        "key_conf": key.get("confidence"),
+        "key_normalized": int(bool(key.get("normalized"))) if "normalized" in key else None,
+        "transpose": key.get("transpose_semitones"),
+        "midi_path": output.get("midi"),
+        "queue_status": (m.get("queue") or {}).get("status"),
+        "updated_at": time.time(),
+    }
+
+    tr = m.get("transcription") or {}
+    stems = []
+    for track, status in (tr.get("pitched") or {}).items():
+        stems.append((sid, track, "pitched", _status_text(status)))
+    if "drums" in tr:
+        stems.append((sid, "drums", "drums", _status_text(tr["drums"])))
+
+    outputs = []
+    for name, path in ((m.get("separation") or {}).get("stems") or {}).items():
+        outputs.append((sid, f"stem:{name}", path))
+    if output.get("midi"):
+        outputs.append((sid, "midi", output["midi"]))
+
+    timings = [(sid, stage, float(sec)) for stage, sec in (m.get("timings") or {}).items()]
+    return sid, song, stems, outputs, timings
+
+
+def upsert_manifest(con, manifest_path: str, manifest: dict):
+    sid, song, stems, outputs, timings = _rows_for_manifest(manifest_path, manifest)
+    cols = ", ".join(song)
+    marks = ", ".join("?" for _ in song)
+    with con:
+        con.execute(f"INSERT OR REPLACE INTO songs ({cols}) VALUES ({marks})", list(song.values()))
+        for table in ("stem_status", "outputs", "timings"):
+            con.execute(f"DELETE FROM {table} WHERE song_id = ?", (sid,))
+        con.executemany("INSERT INTO stem_status VALUES (?, ?, ?, ?)", stems)
+        con.executemany("INSERT INTO outputs VALUES (?, ?, ?)", outputs)
+        con.executemany("INSERT INTO timings VALUES (?, ?, ?)", timings)
+
+
+FULL_PATTERN = "manifests/*.json"
+
+
+def _delete_matching(con, pattern: str):
+    """
+    Drop the rows of songs whose manifest path matches `pattern` (including
+    manifests that have since been deleted).
+    """
+    pattern = os.path.normpath(pattern)
+    sids = [
+        sid for sid, path in con.execute("SELECT song_id, manifest_path FROM songs")
+        if path and fnmatch.fnmatchcase(os.path.normpath(path), pattern)
+    ]
+    with con:
+        for table in ("songs", "stem_status", "outputs", "timings"):
+            con.executemany(f"DELETE FROM {table} WHERE song_id = ?", [(sid,) for sid in sids])
+
+
+def rebuild(db_path: str, pattern: str = FULL_PATTERN) -> int:
+    """
+    Rebuild the index from the JSON manifests matching `pattern`. The whole
+    database is dropped only for the full corpus; a narrower pattern replaces
+    just the rows of the manifests it matches. Returns #songs indexed.
+    """
+    full = os.path.normpath(pattern) == os.path.normpath(FULL_PATTERN)
+    if full and os.path.exists(db_path):
+        os.remove(db_path)
+    con = connect(db_path)
+    n = 0
+    try:
+        if not full:
+            _delete_matching(con, pattern)
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, "r") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[corpus_index] skipping {path}: {e}")
+                continue
+            upsert_manifest(con, path, manifest)
+            n += 1
+    finally:
+        con.close()
+    return n
+
+
+def run_query(db_path: str, what: str, CFG: dict):
+    """
+    Run a preset name or a read-only SQL statement. Returns (columns, rows).
+    """
+    con = connect_readonly(db_path)
+    try:
+        if what in PRESETS:
+            sql, param = PRESETS[what]
+            args = ()
+            if param:
+                section, key, default = param
+                args = ((CFG.get(section) or {}).get(key, default),)
+        else:
+            sql, args = what, ()
+            if not sql.lstrip().lower().startswith(("select", "with")):
+                raise ValueError(f"Unknown preset and not a SELECT: {what!r} (presets: {', '.join(PRESETS)})")
+        cur = con.execute(sql, args)
+        cols = [d[0] for d in cur.description or []]
+        return cols, cur.fetchall()
+    finally:
+        con.close()
@@ -0,0 +1,233 @@
+"""
+Corpus-wide note statistics as a map-reduce over per-song partial results.
+
+Every partial is a dict of fixed-shape count arrays, so merging is an
+element-wise sum. Partials are cached per song (keyed by the manifest and note
+store signatures); a re-run only maps new or changed songs, then sums.
+
+Per track class: pitch and pitch-class histograms, per-song pitch-span and
+note-density histograms, note counts and seconds. Per corpus: tempo (1-BPM
+bins) and key distributions. Drum-hit class counts are the drums row of the
+pitch histogram.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+
+from utils.note_store import note_store_path, load_notes, notes_from_midi
+
+TRACKS = ("voxlead", "voxbg", "bass", "guitar", "keys", "other", "drums")
+_T = {name: i for i, name in enumerate(TRACKS)}
+
+PC_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+_FLATS = {"DB": "C#", "EB": "D#", "GB": "F#", "AB": "G#", "BB": "A#", "D-": "C#", "E-": "D#",
+          "G-": "F#", "A-": "G#", "B-": "A#"}
+KEY_NAMES = [f"{pc} major" for pc in PC_NAMES] + [f"{pc} minor" for pc in PC_NAMES] + ["unknown"]
+
+N_TEMPO = 301             # 0..300 BPM, 1-BPM bins
+DENSITY_STEP = 0.25       # notes per second
+N_DENSITY = 80
+
+DRUM_GROUPS = {
+    "kick": (35, 36),
+    "snare": (37, 38, 39, 40),
+    "toms": (41, 43, 45, 47, 48, 50),
+    "hihat": (42, 44, 46),
+    "cymbals": (49, 51, 52, 53, 55, 57, 59),
+}
+
+
+def empty_partial():
+    n = len(TRACKS)
+    return {
+        "songs": np.zeros(1, dtype=np.int64),
+        "duration_s": np.zeros(1, dtype=np.float64),
+        "notes": np.zeros(n, dtype=np.int64),
+        "note_seconds": np.zeros(n, dtype=np.float64),
+        "songs_with": np.zeros(n, dtype=np.int64),
+        "pitch_hist": np.zeros((n, 128), dtype=np.int64),
+        "pc_hist": np.zeros((n, 12), dtype=np.int64),
+        "span_hist": np.zeros((n, 128), dtype=np.int64),
+        "density_hist": np.zeros((n, N_DENSITY), dtype=np.int64),
+        "tempo_hist": np.zeros(N_TEMPO, dtype=np.int64),
+        "key_hist": np.zeros(len(KEY_NAMES), dtype=np.int64),
+    }
+
+
+def merge(a: dict, b: dict) -> dict:
+    return {k: a[k] + b[k] for k in a}
+
+
+def _key_index(key: dict) -> int:
+    tonic = (key.get("detected_tonic") or "").upper()
+    mode = (key.get("detected_mode") or "").lower()
+    tonic = _FLATS.get(tonic, tonic)
+    if tonic not in PC_NAMES or mode not in ("major", "minor"):
+        return len(KEY_NAMES) - 1
+    # report the key of the written MIDI (after any normalization)
+    pc = (PC_NAMES.index(tonic) + int(key.get("transpose_semitones") or 0)) % 12
+    return pc + (12 if mode == "minor" else 0)
+
+
+def _signature(manifest_path: str, notes_path: str):
+    sig = [os.stat(manifest_path).st_mtime_ns]
+    sig.append(os.stat(notes_path).st_mtime_ns if os.path.exists(notes_path) else 0)
+    return np.array(sig, dtype=np.int64)
+
+
+def _load_song_notes(manifest: dict, notes_path: str):
+    """
+    (tracks {name: Instrument}, transpose) as written to the final MIDI.
+    The note store holds pre-normalization pitches; MIDI files already
+    include the transposition.
+    """
+    if os.path.exists(notes_path):
+        pitched, drums = load_notes(notes_path)
+        transpose = int((manifest.get("key") or {}).get("transpose_semitones") or 0)
+    else:
+        mid = (manifest.get("output") or {}).get("midi")
+        if not mid or not os.path.exists(mid):
+            return None, 0
+        pitched, drums = notes_from_midi(mid)
+        transpose = 0
+    tracks = dict(pitched)
+    if drums is not None:
+        tracks["drums"] = drums
+    return tracks, transpose
+
+
+def song_partial(manifest_path: str, CFG: dict):
+    """
+    Map step for one song. Returns (sid, partial) or (sid, None) when the
+    song has no notes yet.
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    sid = manifest.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+    notes_path = (manifest.get("notes") or {}).get("path") or note_store_path(CFG, sid)
+    tracks, transpose = _load_song_notes(manifest, notes_path)
+    if tracks is None:
+        return sid, None
+
+    part = empty_partial()
+    part["songs"][0] = 1
+    ends = [n.end for inst in tracks.values() for n in inst.notes]
+    duration = float((manifest.get("ingest") or {}).get("duration") or (max(ends) if ends else 0.0))
+    part["duration_s"][0] = duration
+
+    for name, inst in tracks.items():
+        t = _T.get(name)
+        if t is None or not inst.notes:
+            continue
+        pitch = np.fromiter((n.pitch for n in inst.notes), dtype=np.int64, count=len(inst.notes))
+        dur = np.fromiter((n.end - n.start for n in inst.notes), dtype=np.float64, count=len(inst.notes))
+        if name != "drums" and transpose:
+            pitch = pitch + transpose
+        pitch = pitch[(pitch > 0) & (pitch < 128)]
+        if not pitch.size:
+            continue
+        part["notes"][t] = pitch.size
+        part["note_seconds"][t] = float(dur.sum())
+        part["songs_with"][t] = 1
+        part["pitch_hist"][t] = np.bincount(pitch, minlength=128)
+        if name != "drums":
+            part["pc_hist"][t] = np.bincount(pitch % 12, minlength=12)
+            part["span_hist"][t, int(pitch.max() - pitch.min())] = 1
+        if duration > 0:
+            part["density_hist"][t, min(N_DENSITY - 1, int(pitch.size / duration / DENSITY_STEP))] = 1
+
+    tempo = (manifest.get("meter_key") or {}).get("tempo")
+    if tempo:
+        part["tempo_hist"][int(np.clip(round(float(tempo)), 0, N_TEMPO - 1))] = 1
+    part["key_hist"][_key_index(manifest.get("key") or {})] = 1
+    return sid, part
+
+
+def partial_path(stats_dir: str, sid: str) -> str:
+    return os.path.join(stats_dir, "partials", f"{sid}.npz")
+
+
+def cached_partial(manifest_path: str, CFG: dict, stats_dir: str):
+    """
+    Map step with a per-song cache. Returns (sid, partial or None, computed).
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    sid = manifest.get("song_id") or os.path.splitext(os.path.basename(manifest_path))[0]
+    notes_path = (manifest.get("notes") or {}).get("path") or note_store_path(CFG, sid)
+    sig = _signature(manifest_path, notes_path)
+
+    p = partial_path(stats_dir, sid)
+    if os.path.exists(p):
+        with np.load(p) as z:
+            if np.array_equal(z["signature"], sig):
+                if not z["has_notes"]:
+                    return sid, None, False
+                return sid, {k: z[k] for k in empty_partial()}, False
+
+    sid, part = song_partial(manifest_path, CFG)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    tmp = f"{p}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp, signature=sig, has_notes=np.bool_(part is not None), **(part or {}))
+    os.replace(tmp, p)
+    return sid, part, True
+
+
+def _hist_stats(hist, values):
+    n = hist.sum()
+    if not n:
+        return None
+    mean = float((hist * values).sum() / n)
+    nz = np.flatnonzero(hist)
+    return {"n": int(n), "mean": round(mean, 3), "min": float(values[nz[0]]), "max": float(values[nz[-1]])}
+
+
+def summarize(total: dict) -> dict:
+    """
+    JSON-friendly summary of a merged partial.
+    """
+    out = {
+        "songs": int(total["songs"][0]),
+        "duration_h": round(float(total["duration_s"][0]) / 3600.0, 2),
+        "tempo": _hist_stats(total["tempo_hist"], np.arange(N_TEMPO)),
+        "tempo_hist": {str(b): int(c) for b, c in enumerate(total["tempo_hist"]) if c},
+        "keys": {KEY_NAMES[i]: int(c) for i, c in enumerate(total["key_hist"]) if c},
+        "tracks": {},
+    }
+    pitches = np.arange(128)
+    for name, t in _T.items():
+        if not total["songs_with"][t]:
+            continue
+        tr = {
+            "songs": int(total["songs_with"][t]),
+            "notes": int(total["notes"][t]),
+            "note_hours": round(float(total["note_seconds"][t]) / 3600.0, 3),
+            "pitch": _hist_stats(total["pitch_hist"][t], pitches),
+            "pitch_hist": {str(p): int(c) for p, c in enumerate(total["pitch_hist"][t]) if c},
+            "density_notes_per_s": _hist_stats(
+                total["density_hist"][t], (np.arange(N_DENSITY) + 0.5) * DENSITY_STEP
+            ),
+        }
+        if name == "drums":
+            hist = total["pitch_hist"][t]
+            tr["hit_classes"] = {g: int(hist[list(ps)].sum()) for g, ps in DRUM_GROUPS.items()}
+        else:
+            tr["pitch_class_hist"] = dict(zip(PC_NAMES, (int(c) for c in total["pc_hist"][t])))
+            tr["span_semitones"] = _hist_stats(total["span_hist"][t], pitches)
+        out["tracks"][name] = tr
+    return out
+
+
+def prune_partials(stats_dir: str, keep_sids) -> int:
+    """
+    Drop cached partials of songs that are no longer in the corpus.
+    """
+    keep = set(keep_sids)
+    removed = 0
+    for p in glob.glob(os.path.join(stats_dir, "partials", "*.npz")):
+        if os.path.splitext(os.path.basename(p))[0] not in keep:
+            os.remove(p)
+            removed += 1
+    return removed
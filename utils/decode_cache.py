@@ -0,0 +1,171 @@
+"""
+Persistent decode cache: each source / stem decoded once per analysis rate.
+
+load_audio_mono() otherwise runs librosa.load (audioread/ffmpeg for MP3/AAC,
+plus a resample) in every stage and on every re-run. Here the mono decode is
+stored as raw float32 under
+
+    <dir>/<file hash>.<sr>[.<duration>].f32
+
+and later reads are np.memmap views: no decode, and parallel workers reading
+the same entry share its pages through the OS page cache. The key is the
+file's content hash (memoized per path/size/mtime in each process), so a
+renamed or copied delivery hits the same entry and a rewritten one misses.
+
+Only compressed formats are cached by default (`formats`), and files under
+the temp dir never are. Entries not read for max_age_days are deleted, then
+the least recently used ones until the cache fits max_gb; this runs after
+each new entry is written.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.content_index import file_hash
+
+_CFG = None
+_HASHES = {}  # (abspath, size, mtime_ns) -> content hash
+
+
+def configure(cfg):
+    """
+    Set the decode_cache config section (None or enabled: false = off).
+    """
+    global _CFG
+    _CFG = cfg if cfg and cfg.get("enabled", True) else None
+
+
+def enabled() -> bool:
+    return _CFG is not None
+
+
+def _dir() -> str:
+    return _CFG.get("dir") or "data/cache/decode"
+
+
+_DEFAULT_FORMATS = (".mp3", ".m4a", ".aac", ".flac", ".ogg")
+
+
+def _wanted(path: str) -> bool:
+    """
+    Compressed sources only (WAV stems are cheap to re-read), and never the
+    short-lived files stages write under the temp dir (e.g. *_active.wav).
+    """
+    formats = _CFG.get("formats", _DEFAULT_FORMATS)
+    if formats and os.path.splitext(str(path))[1].lower() not in {f.lower() for f in formats}:
+        return False
+    path = os.path.realpath(str(path))
+    for tmp in {tempfile.gettempdir(), "/dev/shm"}:
+        tmp = os.path.realpath(tmp)
+        if path.startswith(tmp + os.sep):
+            return False
+    return True
+
+
+def _hash(path: str) -> str:
+    st = os.stat(path)
+    memo = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo not in _HASHES:
+        _HASHES[memo] = file_hash(path)
+    return _HASHES[memo]
+
+
+def _entry(path: str, sr: int, duration=None) -> str:
+    name = f"{_hash(path)}.{int(sr)}"
+    if duration is not None:
+        name += f".{float(duration):g}s"
+    return os.path.join(_dir(), name + ".f32")
+
+
+def _map(entry: str):
+    try:
+        if os.path.getsize(entry) == 0:
+            return np.zeros(0, dtype=np.float32)
+        y = np.asarray(np.memmap(entry, dtype=np.float32, mode="r"))
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    try:
+        os.utime(entry)  # last use, for prune()
+    except OSError:
+        pass
+    return y
+
+
+def lookup(path: str, sr: int, duration=None):
+    """
+    The cached mono decode of `path` at `sr` (first `duration` seconds), as a
+    read-only memmap, or None. A full decode serves any duration.
+    """
+    if _CFG is None or not sr or not _wanted(path):
+        return None
+    y = _map(_entry(path, sr))
+    if y is not None:
+        return y if duration is None else y[: int(round(float(duration) * sr))]
+    if duration is not None:
+        return _map(_entry(path, sr, duration))
+    return None
+
+
+def store(path: str, sr: int, y, duration=None):
+    """
+    Save a decode of `path` made with librosa.load(path, sr=sr, duration=duration).
+    Returns the entry path, or None when the cache is off or the write failed.
+    """
+    if _CFG is None or not sr or not _wanted(path):
+        return None
+    entry = _entry(path, sr, duration)
+    if os.path.exists(entry):
+        return entry
+    tmp = f"{entry}.{os.getpid()}.partial"
+    try:
+        os.makedirs(_dir(), exist_ok=True)
+        np.ascontiguousarray(y, dtype=np.float32).tofile(tmp)
+        os.replace(tmp, entry)
+    except OSError as e:
+        print(f"[decode_cache] could not store {os.path.basename(str(path))}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    prune()
+    return entry
+
+
+def prune(max_gb=None, max_age_days=None):
+    """
+    Delete entries unused for max_age_days, then least recently used ones
+    beyond max_gb. Returns (files removed, bytes removed).
+    """
+    if _CFG is None or not os.path.isdir(_dir()):
+        return 0, 0
+    max_gb = _CFG.get("max_gb", 20) if max_gb is None else max_gb
+    max_age_days = _CFG.get("max_age_days", 30) if max_age_days is None else max_age_days
+    entries = []
+    for e in os.scandir(_dir()):
+        if not e.name.endswith(".f32"):
+            continue
+        try:
+            st = e.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, e.path))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    max_bytes = float(max_gb or 0) * 1e9
+    cutoff = time.time() - float(max_age_days) * 86400 if max_age_days else None
+    removed = n_bytes = 0
+    for mtime, size, entry in entries:
+        too_old = cutoff is not None and mtime < cutoff
+        too_big = max_bytes and total > max_bytes
+        if not (too_old or too_big):
+            break
+        try:
+            os.remove(entry)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+        n_bytes += size
+    return removed, n_bytes
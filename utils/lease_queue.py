@@ -0,0 +1,180 @@
+"""
+Broker-free work queue on a shared filesystem (NFS-safe).
+
+Every song gets at most one lease file under `lease_dir`. A worker claims a song
+by hard-linking a private temp file onto `<sid>.lease` (link() is atomic on NFS,
+unlike O_EXCL on older clients), then keeps the lease alive by touching it from a
+heartbeat thread. A lease whose mtime is older than `ttl` is considered abandoned
+(crashed worker, dead host) and can be reclaimed by anyone.
+
+Staleness is judged against the *filesystem's* clock (we touch a probe file and
+read back its mtime), so clock skew between hosts doesn't cause early steals.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """
+    A claimed song. Call start() to begin heartbeating and release() when done.
+    `lost` flips to True if someone reclaimed the lease from under us.
+    """
+
+    def __init__(self, path: str, token: str, heartbeat_s: float):
+        self.path = path
+        self.token = token
+        self.heartbeat_s = heartbeat_s
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _still_ours(self) -> bool:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get("token") == self.token
+        except (OSError, ValueError):
+            return False
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat_s):
+            if not self._still_ours():
+                self.lost = True
+                print(f"[queue] Lost lease {self.path}; another worker reclaimed it")
+                return
+            try:
+                os.utime(self.path, None)
+            except OSError:
+                self.lost = True
+                return
+
+    def start(self):
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+        return self
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.heartbeat_s)
+        if self._still_ours():
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class LeaseQueue:
+    def __init__(self, lease_dir: str, ttl_s: float = 300.0, heartbeat_s: float = 30.0):
+        if heartbeat_s >= ttl_s:
+            raise ValueError(f"heartbeat ({heartbeat_s}s) must be shorter than lease ttl ({ttl_s}s)")
+        self.lease_dir = lease_dir
+        self.ttl_s = float(ttl_s)
+        self.heartbeat_s = float(heartbeat_s)
+        self.worker = worker_id()
+        os.makedirs(lease_dir, exist_ok=True)
+
+    def _lease_path(self, sid: str) -> str:
+        return os.path.join(self.lease_dir, f"{sid}.lease")
+
+    def _fs_now(self) -> float:
+        """
+        Current time as seen by the shared filesystem. One probe file per
+        host, shared by all its workers, so the lease dir doesn't fill up with
+        one per worker process.
+        """
+        probe = os.path.join(self.lease_dir, f".clock-{socket.gethostname()}")
+        with open(probe, "a"):
+            os.utime(probe, None)
+        return os.stat(probe).st_mtime
+
+    def _link_claim(self, path: str, payload: dict):
+        """
+        Atomically create `path` with `payload`. Returns the token or None.
+        """
+        token = uuid.uuid4().hex
+        tmp = f"{path}.{token}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({**payload, "token": token}, f)
+        try:
+            os.link(tmp, path)
+            claimed = True
+        except FileExistsError:
+            claimed = False
+        except OSError:
+            # NFS may report failure even if the link went through; trust the link count.
+            claimed = os.stat(tmp).st_nlink == 2
+        finally:
+            os.unlink(tmp)
+        return token if claimed else None
+
+    def _reclaim_if_expired(self, path: str) -> bool:
+        """
+        Remove an expired lease. Only one worker wins the rename, so two
+        reclaimers can't both delete a freshly re-claimed lease.
+        """
+        try:
+            age = self._fs_now() - os.stat(path).st_mtime
+        except FileNotFoundError:
+            return True
+        if age <= self.ttl_s:
+            return False
+
+        stale = f"{path}.stale-{uuid.uuid4().hex}"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return True
+        # Re-check: the holder may have heartbeated between stat and rename.
+        if self._fs_now() - os.stat(stale).st_mtime <= self.ttl_s:
+            # Put it back with link(), not rename(): if another worker has
+            # claimed `path` meanwhile, link fails instead of overwriting its lease.
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            os.unlink(stale)
+            return False
+
+        try:
+            with open(stale, "r") as f:
+                holder = json.load(f).get("worker")
+        except (OSError, ValueError):
+            holder = None
+        os.unlink(stale)
+        print(f"[queue] Reclaimed expired lease {os.path.basename(path)} (holder: {holder}, age: {age:.0f}s)")
+        return True
+
+    def try_claim(self, sid: str):
+        """
+        Claim `sid` for this worker. Returns a started Lease, or None if another
+        live worker holds it.
+        """
+        path = self._lease_path(sid)
+        payload = {"song_id": sid, "worker": self.worker, "claimed_at": time.time()}
+
+        token = self._link_claim(path, payload)
+        if token is None:
+            if not self._reclaim_if_expired(path):
+                return None
+            token = self._link_claim(path, payload)
+            if token is None:
+                return None
+        return Lease(path, token, self.heartbeat_s).start()
+
+    def is_leased(self, sid: str) -> bool:
+        """
+        True if a non-expired lease exists for `sid`.
+        """
+        try:
+            mtime = os.stat(self._lease_path(sid)).st_mtime
+        except FileNotFoundError:
+            return False
+        return self._fs_now() - mtime <= self.ttl_s
@@ -1,9 +1,40 @@
-import json, os, pathlib, yaml
+import copy, json, os, pathlib, sqlite3, time, yaml
+from contextlib import contextmanager
+
+from utils import corpus_index
+
+# SQLite mirror updated on every write_manifest(); set via configure_corpus_index().
+_INDEX_PATH = None
+_INDEX_CON = None  # (pid, connection)
 
 def load_config(path: str):
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
+def merge_config(base: dict, over: dict) -> dict:
+    """
+    Deep copy of `base` with the nested overrides in `over` applied.
+    """
+    out = copy.deepcopy(base)
+    for k, v in (over or {}).items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = merge_config(out[k], v)
+        else:
+            out[k] = copy.deepcopy(v)
+    return out
+
+def configure_corpus_index(db_path):
+    global _INDEX_PATH, _INDEX_CON
+    _INDEX_PATH = db_path
+    _INDEX_CON = None
+
+def _index_connection():
+    global _INDEX_CON
+    # connections must not cross fork boundaries
+    if _INDEX_CON is None or _INDEX_CON[0] != os.getpid():
+        _INDEX_CON = (os.getpid(), corpus_index.connect(_INDEX_PATH))
+    return _INDEX_CON[1]
+
 def song_id_from_path(audio_path: str):
     base = os.path.basename(audio_path)
     return os.path.splitext(base)[0]
@@ -15,5 +46,76 @@ def read_manifest(path: str):
     return {}
 
 def write_manifest(path: str, obj: dict):
-    with open(path, "w") as f:
+    # write-then-rename so readers on other hosts never see a half-written file
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
         json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+    if _INDEX_PATH:
+        try:
+            corpus_index.upsert_manifest(_index_connection(), path, obj)
+        except sqlite3.Error as e:
+            # the index is derived data; never fail a song over it
+            print(f"[corpus_index] update failed for {path}: {e}")
+
+@contextmanager
+def timed(manifest: dict, stage: str):
+    """
+    Record wall time of a pipeline stage under manifest["timings"][stage] and
+    its peak memory (MB, where the OS reports it) under manifest["memory_mb"][stage].
+    """
+    t0 = time.perf_counter()
+    own_reset = _reset_peak_rss()
+    _, children_before = _peak_rss_mb()
+    try:
+        yield
+    finally:
+        manifest.setdefault("timings", {})[stage] = round(time.perf_counter() - t0, 3)
+        own, children = _peak_rss_mb()
+        # the children's figure only covers this stage if it grew during it
+        # (a stage child / Demucs larger than every earlier one)
+        peaks = [own if own_reset else None, children if children > children_before else None]
+        peaks = [p for p in peaks if p]
+        if peaks:
+            manifest.setdefault("memory_mb", {})[stage] = round(max(peaks))
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Linux: restart this process's peak-RSS counter (VmHWM) so the next
+    reading covers only what runs after it.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """
+    (this process's peak RSS, largest reaped child's peak RSS) in MB; 0 where unknown.
+    """
+    own = 0.0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    own = int(line.split()[1]) / 1024.0
+                    break
+    except OSError:
+        pass
+    try:
+        import resource
+        import sys
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+        if not own:
+            own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        children = 0.0
+    return own, children
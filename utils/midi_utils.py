@@ -18,3 +18,21 @@ def add_tempo_changes(pm: pretty_midi.PrettyMIDI, times, bpms):
 def add_time_signature_meta(mf, numerator=4, denominator=4):
     # pretty_midi has limited TS support; for exact meta events, assemble with mido at write time.
     pass
+
+
+def load_drum_track(mid_path):
+    """
+    Merge all drum instruments of an existing MIDI file into one 'drums' kit.
+    Returns None if the file is missing or has no drum notes.
+    """
+    if not mid_path:
+        return None
+    try:
+        pm = pretty_midi.PrettyMIDI(mid_path)
+    except (OSError, IOError):
+        return None
+    kit = pretty_midi.Instrument(program=0, is_drum=True, name="drums")
+    for inst in pm.instruments:
+        if inst.is_drum:
+            kit.notes.extend(inst.notes)
+    return kit if kit.notes else None
@@ -0,0 +1,113 @@
+"""
+Compact per-song store of post-transcription notes (input to steps 4-8).
+
+One .npz per song with flat columns: track index (uint8), start/end (float32
+seconds), pitch/velocity (uint8), plus per-track name/program/is_drum. A
+typical song is a few tens of KB and loads in well under a millisecond, so
+`refinish` can re-run the symbolic stages without touching audio or models.
+"""
+import os
+
+import numpy as np
+import pretty_midi
+
+DRUM_TRACK = "drums"
+
+
+def note_store_path(CFG: dict, sid: str) -> str:
+    note_dir = (CFG.get("refinish") or {}).get("note_dir", "data/notes")
+    return os.path.join(note_dir, f"{sid}.npz")
+
+
+def _columns(inst):
+    notes = inst.notes
+    if not notes:
+        return np.zeros((0, 4))
+    return np.array([(n.start, n.end, n.pitch, n.velocity) for n in notes], dtype=np.float64)
+
+
+def instrument_from_columns(start, end, pitch, velocity, program=0, is_drum=False, name=""):
+    """
+    Build a pretty_midi.Instrument from note columns, dropping empty/invalid notes.
+    """
+    keep = (end > start) & (pitch > 0) & (pitch < 128)
+    inst = pretty_midi.Instrument(program=int(program), is_drum=bool(is_drum), name=name)
+    inst.notes = [
+        pretty_midi.Note(velocity=int(v), pitch=int(p), start=float(s), end=float(e))
+        for s, e, p, v in zip(start[keep].tolist(), end[keep].tolist(),
+                              pitch[keep].tolist(), velocity[keep].tolist())
+    ]
+    return inst
+
+
+def save_notes(path: str, pitched: dict, drums=None) -> int:
+    """
+    Write {name: Instrument} + drum kit to `path` (atomic). Returns #notes.
+    """
+    tracks = [(name, inst) for name, inst in (pitched or {}).items() if inst is not None]
+    if drums is not None:
+        tracks.append((DRUM_TRACK, drums))
+
+    cols = [_columns(inst) for _, inst in tracks]
+    allc = np.concatenate(cols) if cols else np.zeros((0, 4))
+    track_idx = np.repeat(np.arange(len(tracks), dtype=np.uint8), [len(c) for c in cols])
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(
+        tmp,
+        names=np.array([name for name, _ in tracks], dtype=str),
+        programs=np.array([inst.program for _, inst in tracks], dtype=np.uint8),
+        is_drum=np.array([bool(inst.is_drum) for _, inst in tracks], dtype=bool),
+        track=track_idx,
+        start=allc[:, 0].astype(np.float32),
+        end=allc[:, 1].astype(np.float32),
+        pitch=allc[:, 2].astype(np.uint8),
+        velocity=allc[:, 3].astype(np.uint8),
+    )
+    os.replace(tmp, path)
+    return int(len(allc))
+
+
+def load_notes(path: str):
+    """
+    Returns (pitched {name: Instrument}, drums Instrument or None).
+    """
+    with np.load(path) as z:
+        names = z["names"].tolist()
+        programs, is_drum, track = z["programs"], z["is_drum"], z["track"]
+        start = z["start"].astype(np.float64)
+        end = z["end"].astype(np.float64)
+        pitch, velocity = z["pitch"], z["velocity"]
+
+    # notes are stored grouped by track, so each track is one contiguous slice
+    bounds = np.searchsorted(track, np.arange(len(names) + 1))
+    pitched, drums = {}, None
+    for i, name in enumerate(names):
+        sl = slice(bounds[i], bounds[i + 1])
+        inst = instrument_from_columns(
+            start[sl], end[sl], pitch[sl], velocity[sl],
+            program=programs[i], is_drum=is_drum[i], name=name,
+        )
+        if name == DRUM_TRACK and inst.is_drum:
+            drums = inst
+        else:
+            pitched[name] = inst
+    return pitched, drums
+
+
+def notes_from_midi(mid_path: str):
+    """
+    Bootstrap (pitched, drums) from a finished MIDI file. Only equivalent to
+    the transcription output when the song was not key-normalized.
+    """
+    pm = pretty_midi.PrettyMIDI(mid_path)
+    pitched, drums = {}, None
+    for inst in pm.instruments:
+        if inst.is_drum:
+            if drums is None:
+                drums = pretty_midi.Instrument(program=0, is_drum=True, name=DRUM_TRACK)
+            drums.notes.extend(inst.notes)
+        else:
+            pitched[inst.name or f"track{len(pitched)}"] = inst
+    return pitched, drums
@@ -0,0 +1,225 @@
+"""
+Shared-memory transport for decoded audio and feature arrays.
+
+Once stages (isolation.enabled) or the Basic Pitch segment pool run in
+separate processes, each of them would decode the same stems again, or get
+them pickled through a pipe. Instead, a decoded array is published once as a
+float32 .npy file in a RAM-backed directory (/dev/shm on Linux) and every
+process working on the song maps it read-only: a zero-copy view, no decode,
+no pickling.
+
+Handles are plain paths derived from a per-song scope and a key (stem path,
+its mtime/size, the analysis rate), so any process that knows the scope can
+look an array up. The scope is exported through the environment, which
+supervised stage children, segment-pool workers and subprocesses inherit:
+
+    with stage_scope(sid, CFG):         # pipeline.process_one, with isolation.enabled
+        y = lookup(key)                 # None -> decode, then publish(key, y)
+
+The Basic Pitch segment pool opens its own scope (song_scope) for the stem it
+hands to its workers. Without either, nothing is published.
+
+Cleanup: song_scope() deletes the scope directory when the song finishes
+(including arrays published by children). Scopes left behind by a killed
+process are swept the next time a scope opens in the same root.
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+ENV_SCOPE = "MIDIPL_SHM_SCOPE"
+ENV_MAX_MB = "MIDIPL_SHM_MAX_MB"
+
+
+def _cfg(CFG: dict) -> dict:
+    return (CFG or {}).get("shm_transport") or {}
+
+
+def _root(scfg: dict) -> str:
+    base = scfg.get("dir")
+    if not base:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "midipl-shm")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_stale(root: str) -> int:
+    """
+    Remove scopes whose owning process is gone. Returns the number removed.
+    """
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    for name in os.listdir(root):
+        try:
+            pid = int(name.rsplit(".", 1)[-1])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def active_scope():
+    scope = os.environ.get(ENV_SCOPE)
+    return scope if scope and os.path.isdir(scope) else None
+
+
+def _remove_scope(path: str):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def song_scope(name: str, CFG: dict = None):
+    """
+    Open a transport scope for one song; yields its directory (None when
+    disabled). Nested calls reuse the enclosing scope.
+    """
+    scfg = _cfg(CFG)
+    if active_scope() or not scfg.get("enabled", True):
+        yield active_scope()
+        return
+
+    root = _root(scfg)
+    try:
+        sweep_stale(root)
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(name))[:48]
+        path = os.path.join(root, f"{safe}.{os.getpid()}")
+        os.makedirs(path, exist_ok=True)
+    except OSError as e:
+        print(f"[shm] transport disabled: {e}")
+        yield None
+        return
+
+    prev_max = os.environ.get(ENV_MAX_MB)
+    os.environ[ENV_SCOPE] = path
+    os.environ[ENV_MAX_MB] = str(scfg.get("max_mb", 2048))
+    # safety net if the process exits without unwinding (sys.exit in a stage, etc.)
+    atexit.register(_remove_scope, path)
+    try:
+        yield path
+    finally:
+        os.environ.pop(ENV_SCOPE, None)
+        if prev_max is None:
+            os.environ.pop(ENV_MAX_MB, None)
+        else:
+            os.environ[ENV_MAX_MB] = prev_max
+        _remove_scope(path)
+        atexit.unregister(_remove_scope)
+
+
+def stage_scope(name: str, CFG: dict = None):
+    """
+    song_scope() when stages run in supervised child processes
+    (isolation.enabled); otherwise a no-op, since within one process a
+    published copy would only double the memory a decode takes.
+    """
+    if not ((CFG or {}).get("isolation") or {}).get("enabled", False):
+        return nullcontext(active_scope())
+    return song_scope(name, CFG)
+
+
+def key_for(*parts) -> str:
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def file_key(path: str, *parts) -> str:
+    """
+    Key for an array derived from a file; changes when the file is rewritten.
+    """
+    st = os.stat(path)
+    return key_for(os.path.abspath(path), st.st_mtime_ns, st.st_size, *parts)
+
+
+def _scope_bytes(scope: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(scope) if e.is_file())
+
+
+def attach(handle: str):
+    """
+    Read-only, zero-copy view of a published array.
+    """
+    return np.asarray(np.load(handle, mmap_mode="r"))
+
+
+def lookup(key: str):
+    """
+    The array published under `key` in the active scope, or None.
+    """
+    scope = active_scope()
+    if scope is None:
+        return None
+    handle = os.path.join(scope, key + ".npy")
+    try:
+        return attach(handle)
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+
+
+def publish(key: str, array):
+    """
+    Publish `array` under `key` in the active scope. Returns the handle (a
+    path any process can attach) or None when there is no scope or the
+    song's budget (shm_transport.max_mb) is used up.
+    """
+    scope = active_scope()
+    if scope is None:
+        return None
+    array = np.ascontiguousarray(array)
+    handle = os.path.join(scope, key + ".npy")
+    if os.path.exists(handle):
+        return handle
+    max_bytes = float(os.environ.get(ENV_MAX_MB) or 0) * 1e6
+    if max_bytes and _scope_bytes(scope) + array.nbytes > max_bytes:
+        return None
+    tmp = f"{handle}.{os.getpid()}.partial"
+    try:
+        np.save(tmp, array, allow_pickle=False)
+        # np.save appends .npy to names without it
+        os.replace(tmp + ".npy", handle)
+    except OSError as e:
+        print(f"[shm] could not publish {key}: {e}")
+        for p in (tmp, tmp + ".npy"):
+            if os.path.exists(p):
+                os.remove(p)
+        return None
+    return handle
+
+
+def share(array, key: str = None):
+    """
+    Handle for `array`, publishing it if needed (key defaults to a content
+    hash). None when there is no active scope.
+    """
+    if active_scope() is None:
+        return None
+    if key is None:
+        array = np.ascontiguousarray(array)
+        key = hashlib.blake2b(array.view(np.uint8).data, digest_size=12).hexdigest()
+    return publish(key, array)
+
+
+def release(handle):
+    """
+    Drop a published array early. Processes that already mapped it keep their view.
+    """
+    if handle:
+        try:
+            os.remove(handle)
+        except OSError:
+            pass
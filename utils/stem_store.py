@@ -0,0 +1,232 @@
+"""
+Size-budgeted stem store.
+
+Separated stems live in data/stems/<model>/<sid>/. After separation they can
+be rewritten as FLAC (lossless) and/or as mono at a lower rate (the analysis
+rate the transcribers resample to anyway), and a SQLite registry next to them
+tracks each song's size and last use:
+
+    store.sqlite
+      stems   (song_id, model, path, bytes, created_at, last_used, evicted_at, regenerations)
+      events  (ts, song_id, action, bytes)    action: store | evict | regenerate
+
+When the total exceeds `budget_gb`, the least recently used songs' stem
+folders are deleted (never the song being worked on). A stage that later
+needs an evicted song's stems re-runs separation (steps.separate.ensure_stems),
+which is recorded as a regeneration.
+"""
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+import soundfile as sf
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stems (
+    song_id        TEXT PRIMARY KEY,
+    model          TEXT,
+    path           TEXT,
+    bytes          INTEGER,
+    created_at     REAL,
+    last_used      REAL,
+    evicted_at     REAL,
+    regenerations  INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS events (
+    ts       REAL,
+    song_id  TEXT,
+    action   TEXT,
+    bytes    INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_stems_last_used ON stems(last_used);
+"""
+
+STEM_EXTS = (".flac", ".wav")
+
+
+def stem_file(song_dir, name: str):
+    """
+    Path of stem `name` in `song_dir` in whatever format it is stored, or None.
+    """
+    for ext in STEM_EXTS:
+        p = os.path.join(str(song_dir), name + ext)
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def has_stems(song_dir) -> bool:
+    if not os.path.isdir(str(song_dir)):
+        return False
+    return any(f.endswith(STEM_EXTS) for f in os.listdir(str(song_dir)))
+
+
+def _dir_bytes(song_dir) -> int:
+    total = 0
+    for entry in os.scandir(str(song_dir)):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+class StemStore:
+    def __init__(self, root: str = "data/stems", fmt: str = "wav", mono_sr=None, budget_gb: float = 0.0,
+                 db_path: str = None):
+        self.root = root
+        self.fmt = (fmt or "wav").lower()
+        if self.fmt not in ("wav", "flac"):
+            raise ValueError(f"stem_store.format must be wav or flac, got {fmt!r}")
+        self.mono_sr = int(mono_sr) if mono_sr else None
+        self.budget_bytes = int(float(budget_gb or 0) * 1e9)
+        self.db_path = db_path or os.path.join(root, "store.sqlite")
+
+    @classmethod
+    def from_cfg(cls, CFG: dict):
+        scfg = CFG.get("stem_store") or {}
+        root = (CFG.get("separation") or {}).get("out_dir", "data/stems")
+        return cls(
+            root=root,
+            fmt=scfg.get("format", "wav"),
+            mono_sr=scfg.get("mono_sr"),
+            budget_gb=scfg.get("budget_gb", 0),
+            db_path=scfg.get("db"),
+        )
+
+    # ------------------------------------------------------------------
+    # registry
+    # ------------------------------------------------------------------
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        con = sqlite3.connect(self.db_path, timeout=30.0)
+        # rollback journal: data/stems may be on the shared volume lease-queue
+        # workers use, and WAL needs shared memory, which network filesystems lack
+        con.execute("PRAGMA journal_mode=DELETE")
+        con.executescript(_SCHEMA)
+        return con
+
+    def _event(self, con, sid: str, action: str, n_bytes: int):
+        con.execute("INSERT INTO events VALUES (?, ?, ?, ?)", (time.time(), sid, action, int(n_bytes)))
+
+    def was_evicted(self, sid: str):
+        con = self._connect()
+        try:
+            row = con.execute("SELECT evicted_at FROM stems WHERE song_id = ?", (sid,)).fetchone()
+        finally:
+            con.close()
+        return row[0] if row else None
+
+    def register(self, sid: str, model: str, song_dir, regenerated: bool = False) -> dict:
+        """
+        Record the song's stems (size, last use). Returns the song's row as a dict.
+        """
+        n_bytes = _dir_bytes(song_dir)
+        now = time.time()
+        con = self._connect()
+        try:
+            with con:
+                con.execute(
+                    "INSERT INTO stems (song_id, model, path, bytes, created_at, last_used, evicted_at, regenerations) "
+                    "VALUES (?, ?, ?, ?, ?, ?, NULL, 0) "
+                    "ON CONFLICT(song_id) DO UPDATE SET model = excluded.model, path = excluded.path, "
+                    "bytes = excluded.bytes, last_used = excluded.last_used, evicted_at = NULL, "
+                    "regenerations = regenerations + ?",
+                    (sid, model, str(song_dir), n_bytes, now, now, int(regenerated)),
+                )
+                self._event(con, sid, "regenerate" if regenerated else "store", n_bytes)
+            row = con.execute(
+                "SELECT bytes, created_at, regenerations FROM stems WHERE song_id = ?", (sid,)
+            ).fetchone()
+        finally:
+            con.close()
+        return {"bytes": row[0], "created_at": row[1], "regenerations": row[2]}
+
+    def touch(self, sid: str) -> bool:
+        """
+        Mark the song's stems as just used. False if the song is not registered.
+        """
+        con = self._connect()
+        try:
+            with con:
+                cur = con.execute("UPDATE stems SET last_used = ? WHERE song_id = ?", (time.time(), sid))
+            return cur.rowcount > 0
+        finally:
+            con.close()
+
+    def total_bytes(self) -> int:
+        con = self._connect()
+        try:
+            return int(con.execute("SELECT COALESCE(SUM(bytes), 0) FROM stems").fetchone()[0])
+        finally:
+            con.close()
+
+    def enforce_budget(self, keep=()):
+        """
+        Evict least recently used songs until the store fits the budget.
+        Returns [(song_id, bytes)] evicted.
+        """
+        if not self.budget_bytes:
+            return []
+        keep = set(keep)
+        evicted = []
+        con = self._connect()
+        try:
+            total = int(con.execute("SELECT COALESCE(SUM(bytes), 0) FROM stems").fetchone()[0])
+            if total <= self.budget_bytes:
+                return []
+            rows = con.execute(
+                "SELECT song_id, path, bytes FROM stems WHERE bytes > 0 ORDER BY last_used ASC"
+            ).fetchall()
+            for sid, path, n_bytes in rows:
+                if total <= self.budget_bytes:
+                    break
+                if sid in keep:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                with con:
+                    con.execute(
+                        "UPDATE stems SET bytes = 0, evicted_at = ? WHERE song_id = ?", (time.time(), sid)
+                    )
+                    self._event(con, sid, "evict", n_bytes)
+                total -= n_bytes
+                evicted.append((sid, n_bytes))
+        finally:
+            con.close()
+        for sid, n_bytes in evicted:
+            print(f"[stem_store] evicted {sid} ({n_bytes / 1e6:.0f} MB)")
+        return evicted
+
+    # ------------------------------------------------------------------
+    # storage format
+    # ------------------------------------------------------------------
+    def compact(self, song_dir) -> int:
+        """
+        Rewrite the WAV stems in `song_dir` in the configured format (FLAC
+        and/or mono at mono_sr). Returns the number of files rewritten.
+        """
+        if self.fmt == "wav" and not self.mono_sr:
+            return 0
+        n = 0
+        # derived stems last, so they stay newer than their inputs (see separate._is_fresh)
+        names = sorted(os.listdir(str(song_dir)), key=lambda f: (f.startswith("other_merged"), f))
+        for fname in names:
+            if not fname.endswith(".wav"):
+                continue
+            src = os.path.join(str(song_dir), fname)
+            dst = os.path.join(str(song_dir), fname[:-4] + "." + self.fmt)
+            info = sf.info(src)
+            if self.mono_sr:
+                import librosa
+                y, sr = librosa.load(src, sr=self.mono_sr, mono=True)
+            else:
+                y, sr = sf.read(src, dtype="float32", always_2d=True)
+            y = np.clip(y, -1.0, 1.0)
+            subtype = "PCM_24" if self.fmt == "flac" else info.subtype
+            tmp = dst + ".partial"
+            sf.write(tmp, y, sr, format=self.fmt.upper(), subtype=subtype)
+            os.replace(tmp, dst)
+            if dst != src:
+                os.remove(src)
+            n += 1
+        return n
@@ -0,0 +1,119 @@
+"""
+Run a pipeline stage in a supervised child process.
+
+The child becomes its own process-group leader, so on timeout we can kill it
+together with anything it spawned (e.g. the Demucs subprocess). Native crashes
+and OOM kills show up as the child dying without a result.
+"""
+import multiprocessing as mp
+import os
+import signal
+import time
+import traceback
+
+
+class StageFailed(RuntimeError):
+    def __init__(self, stage: str, kind: str, detail: str):
+        super().__init__(f"{stage} failed ({kind}): {detail}")
+        self.stage = stage
+        self.kind = kind
+        self.detail = detail
+
+
+def _child(conn, fn, args):
+    try:
+        os.setpgid(0, 0)
+    except OSError:
+        pass
+    try:
+        # stage functions take the manifest as their last argument and mutate it
+        result = fn(*args)
+        conn.send(("ok", (result, args[-1])))
+    except BaseException as e:
+        conn.send(("exception", f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"))
+    finally:
+        conn.close()
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, ProcessLookupError):
+        proc.kill()
+
+
+def run_in_child(fn, args, timeout_s: float, start_method: str = "spawn"):
+    """
+    Returns (kind, payload) with kind in {"ok", "exception", "timeout", "crash"}.
+    """
+    ctx = mp.get_context(start_method)
+    recv, send = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(send, fn, args))
+    proc.start()
+    send.close()
+
+    try:
+        if recv.poll(timeout_s):
+            try:
+                kind, payload = recv.recv()
+            except EOFError:
+                proc.join(5)
+                kind, payload = "crash", f"child exited with code {proc.exitcode} and no result"
+        else:
+            _kill_group(proc)
+            kind, payload = "timeout", f"no result after {timeout_s:.0f}s"
+    finally:
+        recv.close()
+        proc.join(5)
+        if proc.is_alive():
+            _kill_group(proc)
+            proc.join()
+    return kind, payload
+
+
+def stage_timeout(stage: str, icfg: dict, duration_s: float) -> float:
+    scfg = (icfg.get("stages") or {}).get(stage) or {}
+    base = float(scfg.get("base_s", icfg.get("base_s", 120.0)))
+    per_audio = float(scfg.get("per_audio_s", icfg.get("per_audio_s", 2.0)))
+    return base + per_audio * max(0.0, float(duration_s or 0.0))
+
+
+def run_stage_supervised(stage: str, fn, args, manifest: dict, icfg: dict, duration_s: float):
+    """
+    Run fn(*args) (manifest is args[-1]) in a child with a duration-scaled
+    timeout and bounded retries with exponential backoff.
+
+    On success the child's manifest replaces `manifest` in place and the
+    stage result is returned. On final failure the attempt log is recorded
+    under manifest["failures"][stage] and StageFailed is raised.
+    """
+    timeout_s = stage_timeout(stage, icfg, duration_s)
+    retries = int(icfg.get("retries", 1))
+    backoff_s = float(icfg.get("backoff_s", 5.0))
+    start_method = icfg.get("start_method", "spawn")
+
+    attempts = []
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_s * (2 ** (attempt - 1)))
+        t0 = time.time()
+        kind, payload = run_in_child(fn, args, timeout_s, start_method=start_method)
+        if kind == "ok":
+            result, child_manifest = payload
+            manifest.clear()
+            manifest.update(child_manifest)
+            manifest.setdefault("isolation", {})[stage] = {
+                "attempts": attempt + 1,
+                "timeout_s": round(timeout_s, 1),
+            }
+            manifest.get("failures", {}).pop(stage, None)
+            return result
+        attempts.append({"kind": kind, "detail": str(payload)[-2000:], "seconds": round(time.time() - t0, 1)})
+        print(f"[supervise] {stage} attempt {attempt + 1}/{retries + 1} failed ({kind})")
+
+    manifest.setdefault("failures", {})[stage] = {
+        "kind": attempts[-1]["kind"],
+        "timeout_s": round(timeout_s, 1),
+        "attempts": attempts,
+    }
+    raise StageFailed(stage, attempts[-1]["kind"], attempts[-1]["detail"].splitlines()[0])
@@ -0,0 +1,147 @@
+"""
+Tiny NumPy synth for rendering note lists to audio (no FluidSynth).
+
+Pitched notes: a few decaying harmonics with short attack/release ramps.
+Drums: kick = pitch-dropping sine, snare/toms/hats/cymbals = shaped noise.
+Good enough for listening checks and for synthetic ground truth.
+"""
+import numpy as np
+
+_ATTACK_S = 0.005
+_RELEASE_S = 0.03
+_HARMONICS = np.array([1.0, 0.5, 0.25, 0.125])
+
+# GM drum pitch -> (kind, decay_s, brightness)
+_DRUM_VOICES = {
+    35: ("kick", 0.25, 0.0), 36: ("kick", 0.25, 0.0),
+    37: ("noise", 0.08, 0.6), 38: ("snare", 0.18, 0.5), 40: ("snare", 0.18, 0.5),
+    41: ("tom", 0.3, 0.0), 43: ("tom", 0.3, 0.0), 45: ("tom", 0.28, 0.0),
+    47: ("tom", 0.25, 0.0), 48: ("tom", 0.22, 0.0), 50: ("tom", 0.2, 0.0),
+    42: ("noise", 0.05, 0.95), 44: ("noise", 0.05, 0.95), 46: ("noise", 0.3, 0.9),
+    49: ("noise", 1.2, 0.85), 51: ("noise", 0.9, 0.9), 52: ("noise", 1.0, 0.85),
+    55: ("noise", 0.8, 0.9), 57: ("noise", 1.2, 0.85), 59: ("noise", 0.9, 0.9),
+}
+
+
+def _midi_to_hz(pitch):
+    return 440.0 * 2.0 ** ((np.asarray(pitch, dtype=np.float64) - 69.0) / 12.0)
+
+
+def _as_note_array(notes):
+    """
+    Accepts pretty_midi.Note objects or (start, end, pitch, velocity) tuples.
+    Returns float array [N, 4].
+    """
+    rows = []
+    for n in notes:
+        if hasattr(n, "start"):
+            rows.append((n.start, n.end, n.pitch, n.velocity))
+        else:
+            rows.append(tuple(n[:4]))
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 4)
+
+
+def _pitched_voice(freq, n_samples, sr, n_release):
+    t = np.arange(n_samples + n_release) / sr
+    partials = np.arange(1, len(_HARMONICS) + 1)[:, None]
+    keep = (freq * partials[:, 0] < sr / 2)[:, None]
+    tone = (_HARMONICS[:, None] * keep * np.sin(2 * np.pi * freq * partials * t)).sum(axis=0)
+    env = np.exp(-t * 1.5)
+    n_att = max(1, int(_ATTACK_S * sr))
+    env[:n_att] *= np.linspace(0.0, 1.0, n_att)
+    if n_release:
+        env[n_samples:] *= np.linspace(1.0, 0.0, n_release)
+    return tone * env / _HARMONICS.sum()
+
+
+def _drum_voice(pitch, sr, rng):
+    kind, decay, bright = _DRUM_VOICES.get(int(pitch), ("noise", 0.15, 0.6))
+    n = int(decay * 4 * sr)
+    t = np.arange(n) / sr
+    env = np.exp(-t / decay)
+    if kind == "kick":
+        f = 50.0 + 100.0 * np.exp(-t * 30.0)
+        return np.sin(2 * np.pi * np.cumsum(f) / sr) * env
+    if kind == "tom":
+        f = _midi_to_hz(pitch - 12) * (1.0 + 0.3 * np.exp(-t * 20.0))
+        return np.sin(2 * np.pi * np.cumsum(f) / sr) * env
+    noise = rng.standard_normal(n)
+    if bright > 0:
+        # first-difference high-pass, mixed by brightness
+        noise = (1.0 - bright) * noise + bright * np.diff(noise, prepend=0.0)
+    body = np.sin(2 * np.pi * 190.0 * t) * 0.5 if kind == "snare" else 0.0
+    return (noise + body) * env * 0.6
+
+
+def render_notes(notes, sr: int = 22050, is_drum: bool = False, duration_s=None, seed: int = 0):
+    """
+    Render notes to a mono float32 buffer. Voices are cached per pitch (and per
+    duration for pitched notes), so dense tracks cost one vector add per note.
+    """
+    arr = _as_note_array(notes)
+    if duration_s is None:
+        duration_s = float(arr[:, 1].max()) + 1.0 if len(arr) else 0.0
+    total = int(np.ceil(duration_s * sr))
+    out = np.zeros(total, dtype=np.float64)
+    if not len(arr) or total == 0:
+        return out.astype(np.float32)
+
+    rng = np.random.default_rng(seed)
+    n_release = int(_RELEASE_S * sr)
+    cache = {}
+    starts = np.round(arr[:, 0] * sr).astype(np.int64)
+    lengths = np.maximum(1, np.round((arr[:, 1] - arr[:, 0]) * sr).astype(np.int64))
+    gains = (arr[:, 3] / 127.0) ** 1.5
+
+    for start, length, pitch, gain in zip(starts, lengths, arr[:, 2].astype(int), gains):
+        if start >= total:
+            continue
+        if is_drum:
+            key = pitch
+            if key not in cache:
+                cache[key] = _drum_voice(pitch, sr, rng)
+        else:
+            key = (pitch, int(length))
+            if key not in cache:
+                cache[key] = _pitched_voice(float(_midi_to_hz(pitch)), int(length), sr, n_release)
+        voice = cache[key]
+        end = min(total, start + len(voice))
+        out[start:end] += gain * voice[: end - start]
+
+    return out.astype(np.float32)
+
+
+def track_names(instruments) -> list:
+    """
+    One name per instrument, unique: inst.name (or track<i>), with repeats
+    of a name (two "Guitar" tracks) suffixed -2, -3, ...
+    """
+    names, seen = [], {}
+    for i, inst in enumerate(instruments):
+        name = inst.name or f"track{i}"
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name}-{seen[name]}")
+    return names
+
+
+def render_instruments(instruments, sr: int = 22050, duration_s=None):
+    """
+    Mix a list/dict of pretty_midi.Instruments. Returns (mix, {name: stem});
+    every instrument is in the mix, whatever its name.
+    """
+    if isinstance(instruments, dict):
+        items = list(instruments.items())
+    else:
+        instruments = list(instruments)
+        items = list(zip(track_names(instruments), instruments))
+    if duration_s is None:
+        ends = [n.end for _, inst in items for n in inst.notes]
+        duration_s = (max(ends) + 1.0) if ends else 0.0
+    stems = {}
+    mix = None
+    for name, inst in items:
+        stems[name] = render_notes(inst.notes, sr=sr, is_drum=inst.is_drum, duration_s=duration_s)
+        mix = stems[name].copy() if mix is None else mix + stems[name]
+    if mix is None:
+        mix = np.zeros(0, dtype=np.float32)
+    return mix.astype(np.float32), stems
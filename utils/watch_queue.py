@@ -0,0 +1,131 @@
+"""
+Watch-folder bookkeeping: debounce files still being written and hand out
+ready files in priority order.
+
+Priority (lower sorts first):
+  0 = flagged (sidecar `<file>.priority` exists, or song ID listed in config)
+  1 = everything else
+then shorter audio first, then arrival order.
+"""
+import heapq
+import itertools
+import os
+import time
+
+import soundfile as sf
+
+AUDIO_EXTS = (".wav", ".flac", ".mp3", ".aiff", ".aif", ".ogg", ".m4a")
+
+
+def _duration_hint(path: str, size: int) -> float:
+    """
+    Duration from the header when soundfile can read it; else a size-based guess.
+    """
+    try:
+        return float(sf.info(path).duration)
+    except Exception:
+        return size / (44100 * 2 * 2)
+
+
+class WatchQueue:
+    def __init__(self, watch_dir: str, settle_s: float = 10.0, priority_songs=None, exts=AUDIO_EXTS):
+        self.watch_dir = watch_dir
+        self.settle_s = float(settle_s)
+        self.priority_songs = set(priority_songs or [])
+        self.exts = tuple(e.lower() for e in exts)
+        self._pending = {}   # path -> (size, mtime, first_seen_unchanged)
+        self._queued = {}    # path -> (size, mtime) currently in the heap
+        self._heap = []
+        self._seq = itertools.count()
+
+    def _is_flagged(self, path: str, sid: str) -> bool:
+        return sid in self.priority_songs or os.path.exists(path + ".priority")
+
+    def scan(self, is_done):
+        """
+        Look for new/changed files. `is_done(path, size, mtime)` tells us whether
+        a file's current version has already been processed.
+        Returns the number of files newly enqueued.
+        """
+        now = time.time()
+        seen = set()
+        added = 0
+        try:
+            entries = list(os.scandir(self.watch_dir))
+        except FileNotFoundError:
+            return 0
+
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(self.exts):
+                continue
+            path = entry.path
+            seen.add(path)
+            st = entry.stat()
+            sig = (st.st_size, st.st_mtime)
+
+            if self._queued.get(path) == sig:
+                continue
+            if is_done(path, st.st_size, st.st_mtime):
+                self._pending.pop(path, None)
+                continue
+
+            prev = self._pending.get(path)
+            if prev is None or prev[:2] != sig:
+                # new file, or still growing: restart the settle timer
+                self._pending[path] = (sig[0], sig[1], now)
+                continue
+            if now - prev[2] < self.settle_s or now - st.st_mtime < self.settle_s:
+                continue
+
+            del self._pending[path]
+            sid = os.path.splitext(entry.name)[0]
+            prio = 0 if self._is_flagged(path, sid) else 1
+            heapq.heappush(self._heap, (prio, _duration_hint(path, st.st_size), next(self._seq), path, sig))
+            self._queued[path] = sig
+            added += 1
+
+        for gone in set(self._pending) - seen:
+            del self._pending[gone]
+        return added
+
+    def pop(self):
+        """
+        Highest-priority ready file as (path, (size, mtime)), or None. Entries
+        whose file changed or vanished since enqueueing are dropped.
+        """
+        while self._heap:
+            _, _, _, path, sig = heapq.heappop(self._heap)
+            if self._queued.get(path) != sig:
+                continue
+            del self._queued[path]
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if (st.st_size, st.st_mtime) != sig:
+                continue  # rewritten after it settled; next scan picks it up again
+            return path, sig
+        return None
+
+    def __len__(self):
+        return len(self._queued)
+
+
+def make_waiter(watch_dir: str):
+    """
+    Returns wait(timeout_s). Uses inotify (via the optional `inotify_simple`
+    package) to wake up as soon as something lands in `watch_dir`; otherwise
+    plain polling.
+    """
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return time.sleep
+
+    inotify = INotify()
+    inotify.add_watch(watch_dir, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+
+    def wait(timeout_s: float):
+        inotify.read(timeout=int(timeout_s * 1000))
+
+    return wait